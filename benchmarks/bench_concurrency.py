@@ -0,0 +1,43 @@
+"""
+Benchmark the wall-clock time of collect_repositories with 1 to N concurrent workers against a local stub server.
+
+Usage: python -m benchmarks.bench_concurrency --size 20000 --latency 0.05 --workers 1 2 4 8
+"""
+
+import argparse
+import time
+
+from datetime import datetime
+
+from benchmarks.stub_server import serve
+from repocollector.github import GithubRepositoriesCollector
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent shard fetching.')
+    parser.add_argument('--size', type=int, default=20000, help='number of repositories (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request (default: %(default)s)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='concurrency levels to run')
+    args = parser.parse_args()
+
+    stub = serve(size=args.size, latency=args.latency)
+    baseline = None
+
+    for workers in args.workers:
+        github = GithubRepositoriesCollector('token', concurrency=workers, api_url=stub.url)
+
+        start = time.perf_counter()
+        collected = sum(1 for _ in github.collect_repositories(since=datetime(2020, 1, 1),
+                                                               until=datetime(2021, 1, 1),
+                                                               pushed_after=datetime(2014, 1, 1),
+                                                               records=True))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+
+        print(f'workers={workers:<3} repositories={collected:<8} time={elapsed:.2f}s speedup={baseline / elapsed:.2f}x')
+
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
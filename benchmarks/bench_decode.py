@@ -0,0 +1,94 @@
+"""
+Benchmark the decoding of the responses: CPU time and peak memory per page, for the pages of the search (with every
+field, and with the light fields of the thresholds) and of the enrichment (heavy fields and root directories), decoded
+as requests did (Response.json()), with the standard library from the raw bytes, and with orjson when it is installed.
+
+Usage: python -m benchmarks.bench_decode --pages 1000
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from datetime import datetime
+
+import requests
+
+from benchmarks.stub_server import _node, generate
+from repocollector.queries import DIRS_FIELDS, HEAVY_FIELDS, LIGHT_SEARCH_FIELD, SEARCH_FIELD
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def pages(size: int) -> dict:
+    """
+    :param size: the number of repositories per page
+    :return: the body of a page of each kind, as sent by the stub server
+    """
+    repos = generate(size, datetime(2020, 1, 1), datetime(2021, 1, 1))
+    page_info = {'endCursor': 'Y3Vyc29yOjEwMA==', 'startCursor': None, 'hasNextPage': True}
+    rate_limit = {'cost': 1, 'remaining': 4999, 'resetAt': '2021-01-01T00:00:00Z'}
+
+    def search(selection):
+        return {'data': {'search': {'repositoryCount': 100000, 'pageInfo': page_info,
+                                    'edges': [{'node': _node(repo, selection)} for repo in repos]},
+                         'rateLimit': rate_limit}}
+
+    nodes = {'data': {'nodes': [_node(repo, HEAVY_FIELDS + DIRS_FIELDS) for repo in repos], 'rateLimit': rate_limit}}
+
+    return {name: json.dumps(page).encode('utf-8')
+            for name, page in (('search', search(SEARCH_FIELD)), ('light search', search(LIGHT_SEARCH_FIELD)),
+                               ('nodes', nodes))}
+
+
+def response_json(body: bytes):
+    response = requests.Response()
+    response._content = body
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    return response.json()
+
+
+def measure(decode, body: bytes, pages: int) -> tuple:
+    """
+    :return: the CPU seconds per page, and the peak bytes allocated while decoding a page
+    """
+    start = time.process_time()
+    for _ in range(pages):
+        decode(body)
+    seconds = (time.process_time() - start) / pages
+
+    tracemalloc.start()
+    decode(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the decoding of the responses.')
+    parser.add_argument('--pages', type=int, default=1000, help='pages to decode per measure (default: %(default)s)')
+    parser.add_argument('--page-size', type=int, default=100, help='repositories per page (default: %(default)s)')
+    args = parser.parse_args()
+
+    decoders = [('Response.json()', response_json), ('json.loads(bytes)', json.loads)]
+    if orjson:
+        decoders.append(('orjson.loads', orjson.loads))
+
+    for name, body in pages(args.page_size).items():
+        baseline = None
+
+        for decoder, decode in decoders:
+            seconds, peak = measure(decode, body, args.pages)
+            baseline = baseline or seconds
+
+            print(f'{name:<13} {len(body) / 1024:6.1f} KiB {decoder:<18} {seconds * 1e6:8.0f} us/page '
+                  f'{baseline / seconds:5.2f}x peak={peak / 1024:7.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
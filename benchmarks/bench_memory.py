@@ -0,0 +1,66 @@
+"""
+Benchmark the memory held by N collected repositories: as dictionaries (the former output of filter_repositories), as
+Repository records, and as columnar RepositoryBatch.
+
+Usage: python -m benchmarks.bench_memory --size 100000 1000000
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from datetime import datetime
+
+from benchmarks.stub_server import generate, _node
+from repocollector.github import GithubRepositoriesCollector
+from repocollector.queries import DIRS_FIELDS, SEARCH_FIELD
+from repocollector.records import RepositoryBatch
+
+
+def measure(build) -> int:
+    """
+    :param build: a function building the representation to measure
+    :return: the bytes allocated by build and still held by its result
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory footprint of collected repositories.')
+    parser.add_argument('--size', type=int, nargs='+', default=[100000], help='numbers of repositories to hold')
+    args = parser.parse_args()
+
+    for size in args.size:
+        edges = [{'node': _node(repo, SEARCH_FIELD + DIRS_FIELDS)}
+                 for repo in generate(size, datetime(2020, 1, 1), datetime(2021, 1, 1))]
+
+        def records():
+            return list(GithubRepositoriesCollector.filter_repositories(edges))
+
+        def dicts():
+            return [dict(repo, dirs=list(repo['dirs'])) for repo in records()]
+
+        def batch():
+            return RepositoryBatch(GithubRepositoriesCollector.filter_repositories(edges))
+
+        baseline = None
+
+        for name, build in (('dict', dicts), ('Repository', records), ('RepositoryBatch', batch)):
+            held = measure(build)
+            baseline = baseline or held
+
+            print(f'size={size:<8} {name:<16} {held / 2 ** 20:8.1f} MiB {held / size:7.0f} B/repo '
+                  f'{held / baseline:6.2f}x')
+
+        del edges
+
+
+if __name__ == '__main__':
+    main()
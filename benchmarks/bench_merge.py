@@ -0,0 +1,126 @@
+"""
+Benchmark the merge of several outputs: the disk-backed MergeIndex of repocollector.dataset, against keeping the most
+recent version of every repository in a dictionary. The outputs are JSON lines files of synthetic repositories, a share
+of which appear in several outputs with different push dates. Every merge runs in a fresh process, so that its peak RSS
+is its own.
+
+Usage: python -m benchmarks.bench_merge --sizes 100000 1000000 --outputs 4 --overlap 0.3
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.suite import peak_rss
+from repocollector import codec, dataset
+
+MODES = ('index', 'dict')
+
+
+def write_outputs(folder: str, size: int, outputs: int, overlap: float, seed: int = 0) -> list:
+    """
+    Write <size> distinct repositories across <outputs> JSON lines files. A share <overlap> of the lines are versions
+    of repositories already written, pushed at another date.
+
+    :return: the paths to the outputs
+    """
+    rnd = random.Random(seed)
+    paths = [os.path.join(folder, f'run{i}.jsonl') for i in range(outputs)]
+    files = [open(path, 'wb') for path in paths]
+    written = 0
+
+    while written < size:
+        if written and rnd.random() < overlap:
+            repository_id = rnd.randrange(1, written + 1)
+        else:
+            written += 1
+            repository_id = written
+
+        name = f'repository-{repository_id}'
+        repository = dict(id=repository_id, default_branch='main', owner='owner', name=name,
+                          full_name=f'owner/{name}', url=f'https://github.com/owner/{name}',
+                          description='A synthetic repository to benchmark merges', issues=rnd.randrange(100),
+                          releases=rnd.randrange(20), stars=rnd.randrange(1000), watchers=rnd.randrange(50),
+                          primary_language='python', created_at='2020-01-01T00:00:00Z',
+                          pushed_at=f'2021-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}T00:00:00Z',
+                          dirs=['src', 'tests'])
+
+        rnd.choice(files).write(codec.dumps(repository) + b'\n')
+
+    for f in files:
+        f.close()
+
+    return paths
+
+
+def merge_dict(paths: list, **thresholds):
+    """
+    Merge the outputs in memory: the most recent version of every repository, in a dictionary
+    """
+    latest = {}
+
+    for path in paths:
+        for repository in dataset.read(path):
+            previous = latest.get(repository['id'])
+
+            if previous is None or repository['pushed_at'] >= previous['pushed_at']:
+                latest[repository['id']] = repository
+
+    for repository_id in sorted(latest):
+        if dataset.matches(latest[repository_id], **thresholds):
+            yield latest[repository_id]
+
+
+def run_merge(mode: str, paths: list, folder: str) -> dict:
+    thresholds = dict(min_stars=10, min_releases=1)
+    merged = dataset.merge_outputs(paths, directory=folder, **thresholds) if mode == 'index' \
+        else merge_dict(paths, **thresholds)
+
+    start = time.perf_counter()
+    repositories = sum(1 for _ in merged)
+
+    return dict(repositories=repositories, seconds=time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the merge of several outputs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000],
+                        help='numbers of distinct repositories (default: %(default)s)')
+    parser.add_argument('--outputs', type=int, default=4, help='number of outputs to merge (default: %(default)s)')
+    parser.add_argument('--overlap', type=float, default=0.3,
+                        help='share of the lines that are other versions of a repository (default: %(default)s)')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES),
+                        help='merges to run (default: all)')
+    parser.add_argument('--run', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--folder', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # A merge, run by main() in a fresh process
+        paths = sorted(os.path.join(args.folder, filename) for filename in os.listdir(args.folder)
+                       if filename.endswith('.jsonl'))
+        print(json.dumps(dict(run_merge(args.run, paths, args.folder), peak_rss=peak_rss())))
+        return
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            paths = write_outputs(folder, size, args.outputs, args.overlap)
+            lines = sum(1 for path in paths for _ in open(path, 'rb'))
+
+            for mode in args.modes:
+                command = [sys.executable, '-m', 'benchmarks.bench_merge', '--run', mode, '--folder', folder]
+                output = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+
+                print(f'size={size:<9} lines={lines:<9} {mode:<6} merged={result["repositories"]:<9} '
+                      f'time={result["seconds"]:7.2f}s {lines / result["seconds"]:8.0f} lines/s '
+                      f'peak_rss={result["peak_rss"] / 2 ** 20:6.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark the fixed costs of the collector: the cold start of the command line (--version, --help, query --help), in
+fresh processes, and the CPU time spent building the request of a search page, for batches of 1 and 10 shards.
+
+Usage: python -m benchmarks.bench_startup --runs 20
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+from repocollector import codec, queries
+from repocollector.github import GithubRepositoriesCollector
+
+COMMANDS = {
+    'python': ['-c', 'pass'],
+    'import repocollector.cli': ['-c', 'import repocollector.cli'],
+    '--version': ['-c', 'import sys; from repocollector.cli import main; sys.argv[1:] = ["--version"]; main()'],
+    '--help': ['-c', 'import sys; from repocollector.cli import main; sys.argv[1:] = ["--help"]; main()'],
+    'query --help': ['-c', 'import sys; from repocollector.cli import main; sys.argv[1:] = ["query", "--help"]; main()'],
+}
+
+
+def cold_start(arguments: list, runs: int) -> float:
+    """
+    :return: the median wall time of a fresh interpreter running the arguments, in seconds
+    """
+    times = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def page_request(shards: list, page_size: int = 100) -> bytes:
+    """
+    Build the body of the request of a search page, as GithubRepositoriesCollector._pages() does
+
+    :param shards: a list of (search, end_cursor, light) tuples
+    :return: the body of the request
+    """
+    query = queries.search_query(tuple(light for _, _, light in shards))
+    variables = {'first': page_size}
+
+    for i, (search, end_cursor, _) in enumerate(shards):
+        variables[f'query{i}'] = search
+        variables[f'after{i}'] = end_cursor
+
+    return codec.dumps({'query': query, 'variables': variables})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cold start and the per-page overhead.')
+    parser.add_argument('--runs', type=int, default=20, help='runs per command (default: %(default)s)')
+    parser.add_argument('--pages', type=int, default=20000, help='pages per measure (default: %(default)s)')
+    args = parser.parse_args()
+
+    baseline = None
+    for name, arguments in COMMANDS.items():
+        seconds = cold_start(arguments, args.runs)
+        baseline = baseline if baseline is not None else seconds
+
+        print(f'{name:<26} {seconds * 1000:7.1f} ms ({(seconds - baseline) * 1000:+.1f} ms over the interpreter)')
+
+    day = datetime(2020, 1, 1)
+
+    for size in (1, 10):
+        # The search strings are built once per shard: pages only change the cursors
+        searches = [GithubRepositoriesCollector.search_string(since=day + timedelta(days=i),
+                                                              until=day + timedelta(days=i + 1),
+                                                              pushed_after=datetime(2014, 1, 1),
+                                                              min_stars=10,
+                                                              primary_language='python') for i in range(size)]
+        start = time.process_time()
+
+        for page in range(args.pages):
+            page_request([(search, f'Y3Vyc29yOj{page}' if page % 10 else None, False) for search in searches])
+
+        seconds = (time.process_time() - start) / args.pages
+        print(f'page of {size:>2} shard(s)          {seconds * 1e6:7.1f} us of CPU to build the request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark the per-request latency of the pooled Transport against a new connection per request (the transport before
+pooling), collecting the same repositories from a local stub server.
+
+The stub server speaks plain HTTP: --handshake simulates the cost of the TLS handshake of a new connection to
+api.github.com (two round trips).
+
+Usage: python -m benchmarks.bench_transport --size 20000 --concurrency 1 --handshake 0.06
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+
+from datetime import datetime
+
+from benchmarks.stub_server import serve
+from repocollector.github import GithubRepositoriesCollector, Transport
+
+
+class UnpooledTransport(Transport):
+    """
+    A new connection for every request, without timeouts nor explicit compression
+    """
+
+    def post(self, body: bytes, headers: dict):
+        return requests.post(self.url, data=body, headers=dict(headers, **{'Content-Type': 'application/json'}))
+
+
+class TimedTransport:
+    """
+    Record the latency of every request of a transport
+    """
+
+    def __init__(self, transport: Transport):
+        self.url = transport.url
+        self.latencies = []
+        self._transport = transport
+
+    def post(self, body: bytes, headers: dict):
+        start = time.perf_counter()
+        response = self._transport.post(body, headers)
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the HTTP transport.')
+    parser.add_argument('--size', type=int, default=20000, help='number of repositories (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=1, help='concurrent shards (default: %(default)s)')
+    parser.add_argument('--handshake', type=float, default=0.06,
+                        help='seconds to set up a new connection (default: %(default)s)')
+    args = parser.parse_args()
+
+    stub = serve(size=args.size, handshake=args.handshake)
+
+    for name, transport in (('unpooled', UnpooledTransport(url=stub.url)),
+                            ('pooled', Transport(url=stub.url, pool_size=args.concurrency))):
+        timed = TimedTransport(transport)
+        github = GithubRepositoriesCollector('token', concurrency=args.concurrency, transport=timed)
+
+        start = time.perf_counter()
+        collected = sum(1 for _ in github.collect_repositories(since=datetime(2020, 1, 1),
+                                                               until=datetime(2021, 1, 1),
+                                                               pushed_after=datetime(2014, 1, 1),
+                                                               records=True))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(timed.latencies)
+        print(f'{name:<9} repositories={collected:<7} requests={len(latencies):<5} time={elapsed:.2f}s '
+              f'mean={statistics.mean(latencies) * 1000:.2f}ms p50={latencies[len(latencies) // 2] * 1000:.2f}ms '
+              f'p95={latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms')
+
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
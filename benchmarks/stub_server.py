@@ -0,0 +1,390 @@
+"""
+A local stand-in for the GitHub GraphQL endpoint serving synthetic, paginated search results.
+
+It understands the subset of the GitHub search syntax used by the collector (created, pushed, stars, language, fork
+and template qualifiers), caps paging at 1,000 results like GitHub does, and decrements a rateLimit budget. It can
+inject failures: 502s, and 403s of the secondary rate limit. The repositories are synthetic, or loaded from a fixture
+file of Repository nodes (one JSON object per line) so that runs can be reproduced across versions.
+GET /stats returns the number of requests served and of failures injected.
+
+Usage: python -m benchmarks.stub_server --size 100000 --latency 0.05 --port 8000
+       python -m benchmarks.stub_server --size 100000 --dump fixtures.jsonl
+       python -m benchmarks.stub_server --fixtures fixtures.jsonl --error-rate 0.01 --secondary-rate 0.001
+"""
+
+import base64
+import bisect
+import functools
+import gzip
+import json
+import random
+import re
+import threading
+import time
+
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LANGUAGES = ('Python', 'Java', 'Go', 'JavaScript', 'Ruby', 'Shell')
+DIRS = ('src', 'tests', 'docs', 'scripts', 'lib', 'bin', '.github', 'examples')
+
+# The arguments of search() and nodes() are literals, or GraphQL variables ($name)
+SEARCH_RE = re.compile(r'(?:(\w+)\s*:\s*)?search\(\s*query:\s*("(?:[^"\\]|\\.)*"|\$\w+)\s*,\s*type:\s*REPOSITORY\s*,'
+                       r'\s*first:\s*(\d+|\$\w+)\s*(?:,\s*after:\s*("[^"]*"|\$\w+))?\s*\)')
+NODES_RE = re.compile(r'nodes\(\s*ids:\s*(\[[^\]]*\]|\$\w+)\s*\)')
+
+
+def generate(size: int, since: datetime, until: datetime, seed: int = 0) -> list:
+    """
+    Generate <size> synthetic repository nodes created between since and until
+
+    :return: a list of GraphQL Repository nodes, sorted by creation date
+    """
+    rnd = random.Random(seed)
+    span = int((until - since).total_seconds())
+    repos = []
+    for i in range(1, size + 1):
+        created = since + timedelta(seconds=rnd.randrange(span))
+        pushed = created + timedelta(days=rnd.randrange(400))
+        branch = 'master' if rnd.random() < 0.7 else 'main'
+        repos.append({
+            'id': f'R_{i}',
+            'databaseId': i,
+            'defaultBranchRef': {'name': branch},
+            'owner': {'login': f'owner{i % 997}'},
+            'name': f'repo{i}',
+            'url': f'https://github.com/owner{i % 997}/repo{i}',
+            'description': f'Synthetic repository number {i}',
+            'primaryLanguage': {'name': rnd.choice(LANGUAGES)},
+            'stargazers': {'totalCount': int(rnd.paretovariate(1.2)) - 1},
+            'watchers': {'totalCount': int(rnd.paretovariate(1.5)) - 1},
+            'releases': {'totalCount': int(rnd.paretovariate(1.5)) - 1},
+            'issues': {'totalCount': int(rnd.paretovariate(1.1)) - 1},
+            'createdAt': created.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'pushedAt': pushed.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'updatedAt': pushed.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'hasIssuesEnabled': rnd.random() < 0.95,
+            'isArchived': False,
+            'isDisabled': False,
+            'isMirror': False,
+            'isFork': rnd.random() < 0.1,
+            'isLocked': False,
+            'isTemplate': rnd.random() < 0.02,
+            'entries': [{'name': d, 'type': 'tree'} for d in rnd.sample(DIRS, rnd.randrange(len(DIRS)))]
+                       + [{'name': 'README.md', 'type': 'blob'}],
+        })
+    repos.sort(key=lambda r: r['createdAt'])
+    return repos
+
+
+def dump_fixtures(repos: list, path: str):
+    """
+    Write repository nodes to a fixture file, one JSON object per line
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for repo in repos:
+            f.write(json.dumps(repo) + '\n')
+
+
+def load_fixtures(path: str) -> list:
+    """
+    :param path: a fixture file, as written by dump_fixtures()
+    :return: the repository nodes, sorted by creation date
+    """
+    with open(path, encoding='utf-8') as f:
+        repos = [json.loads(line) for line in f if line.strip()]
+
+    repos.sort(key=lambda r: r['createdAt'])
+    return repos
+
+
+def _parse_date(value: str) -> str:
+    if 'T' not in value:
+        value += 'T00:00:00Z'
+    return value
+
+
+class Index:
+    """
+    The synthetic repositories, indexed by creation date
+    """
+
+    def __init__(self, repos: list):
+        self.repos = repos
+        self.created = [r['createdAt'] for r in repos]
+        self.by_node_id = {r['id']: r for r in repos}
+
+        # Consecutive pages of a search match the same repositories
+        self.search = functools.lru_cache(maxsize=256)(self.search)
+
+    def search(self, search: str) -> list:
+        """
+        :param search: a GitHub search string
+        :return: the repositories matching the search
+        """
+        qualifiers = dict(q.split(':', 1) for q in search.split() if ':' in q)
+        lo, hi = 0, len(self.repos)
+        if 'created' in qualifiers:
+            since, until = qualifiers['created'].split('..')
+            lo = bisect.bisect_left(self.created, _parse_date(since))
+            hi = bisect.bisect_right(self.created, _parse_date(until))
+
+        stars = int(qualifiers.get('stars', '>=0').lstrip('>='))
+        pushed = _parse_date(qualifiers.get('pushed', '>=1970-01-01').lstrip('>='))
+        language = qualifiers.get('language', '').lower()
+        no_forks = qualifiers.get('fork') == 'false'
+        no_templates = qualifiers.get('template') == 'false'
+
+        return [r for r in self.repos[lo:hi]
+                if r['stargazers']['totalCount'] >= stars
+                and r['pushedAt'] >= pushed
+                and (not language or r['primaryLanguage']['name'].lower() == language)
+                and not (no_forks and r['isFork'])
+                and not (no_templates and r['isTemplate'])]
+
+
+def _argument(value: str, variables: dict):
+    """
+    :param value: the text of an argument: a JSON literal, or a variable
+    :param variables: the variables of the request
+    :return: the value of the argument; None if it is missing
+    """
+    if value is None:
+        return None
+
+    return variables.get(value[1:]) if value.startswith('$') else json.loads(value)
+
+
+def _node(repo: dict, selection: str) -> dict:
+    """
+    :return: the fields of a repository that appear in the selection of the query
+    """
+    node = {k: v for k, v in repo.items() if k != 'entries' and re.search(rf'\b{k}\b', selection)}
+    if 'entries' in selection:
+        tree = {'entries': repo['entries']}
+        node['object'] = tree if repo['defaultBranchRef']['name'] == 'master' else None
+        node['defaultBranchRef'] = dict(repo['defaultBranchRef'], target={'tree': tree})
+    return node
+
+
+class StubGraphQLServer(ThreadingHTTPServer):
+    """
+    A threaded HTTP server answering GraphQL search queries with a fixed latency per request, and failing a random
+    (but reproducible) share of them
+    """
+    daemon_threads = True
+
+    def __init__(self, address, index: Index, latency: float = 0.0, limit: int = 1000000, handshake: float = 0.0,
+                 max_page_size: int = None, error_rate: float = 0.0, secondary_rate: float = 0.0,
+                 retry_after: int = 1, seed: int = 0):
+        super().__init__(address, StubHandler)
+        self.index = index
+        self.latency = latency
+        self.handshake = handshake
+        self.max_page_size = max_page_size
+        self.error_rate = error_rate
+        self.secondary_rate = secondary_rate
+        self.retry_after = retry_after
+        self.limit = limit
+        self.remaining = limit
+        self.requests = 0
+        self.failures = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/graphql'
+
+    def inject(self):
+        """
+        :return: the status code of the failure to answer the next request with; None to answer it
+        """
+        with self.lock:
+            draw = self.random.random()
+
+        if draw < self.error_rate:
+            return 502
+
+        if draw < self.error_rate + self.secondary_rate:
+            return 403
+
+        return None
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'requests': self.requests, 'remaining': self.remaining,
+                    'failures': {str(status): count for status, count in self.failures.items()}}
+
+    def rate_limit(self, cost: int) -> dict:
+        with self.lock:
+            self.requests += 1
+            self.remaining = max(self.remaining - cost, 0)
+            return {'limit': self.limit, 'cost': cost, 'remaining': self.remaining,
+                    'resetAt': (datetime.utcnow() + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep connections alive, like GitHub does
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+
+        # Simulate the cost of setting up a new (TLS) connection
+        if self.server.handshake:
+            time.sleep(self.server.handshake)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, status: int):
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.failures[status] += 1
+
+        if status == 403:
+            body = json.dumps({'message': 'You have exceeded a secondary rate limit. Please wait a few minutes before '
+                                          'you try again.'}).encode()
+            self._send(403, body, {'Content-Type': 'application/json', 'Retry-After': str(self.server.retry_after)})
+        else:
+            self._send(status, b'')
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send(200, json.dumps(self.server.stats()).encode(), {'Content-Type': 'application/json'})
+        else:
+            self._send(404, b'')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length))
+        document, variables = request['query'], request.get('variables') or {}
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        failure = self.server.inject()
+        if failure:
+            self._fail(failure)
+            return
+
+        # Simulate GitHub timing out on heavy pages
+        if self.server.max_page_size and any(int(_argument(match.group(3), variables)) > self.server.max_page_size
+                                             for match in SEARCH_RE.finditer(document)):
+            self._fail(502)
+            return
+
+        data = {}
+        connections = 0
+        matches = list(SEARCH_RE.finditer(document))
+        for match, following in zip(matches, matches[1:] + [None]):
+            alias, search, first, after = match.groups()
+            search, first, after = (_argument(value, variables) for value in (search, first, after))
+            results = self.server.index.search(search)
+            count, results = len(results), results[:1000]
+            offset = int(base64.b64decode(after).decode().split(':')[1]) if after else 0
+            page = results[offset:offset + int(first)]
+            end = offset + len(page)
+            selection = document[match.end():following.start() if following else None]
+            data[alias or 'search'] = {
+                'repositoryCount': count,
+                'pageInfo': {'endCursor': base64.b64encode(f'cursor:{end}'.encode()).decode(),
+                             'startCursor': None,
+                             'hasNextPage': end < len(results)},
+                'edges': [{'node': _node(r, selection)} for r in page]}
+            connections += 1
+
+        for match in NODES_RE.finditer(document):
+            selection = document[match.end():]
+            data['nodes'] = [_node(self.server.index.by_node_id[i], selection) if i in self.server.index.by_node_id
+                             else None for i in _argument(match.group(1), variables)]
+            connections += 1
+
+        # Like GitHub, charge a point per 100 connections requested, and at least one point per request
+        data['rateLimit'] = self.server.rate_limit(max(round(connections / 100), 1))
+        body = json.dumps({'data': data}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header('Content-Encoding', 'gzip')
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(size: int = 10000, since: datetime = datetime(2020, 1, 1), until: datetime = datetime(2021, 1, 1),
+          latency: float = 0.0, port: int = 0, limit: int = 1000000, handshake: float = 0.0,
+          max_page_size: int = None, error_rate: float = 0.0, secondary_rate: float = 0.0, retry_after: int = 1,
+          seed: int = 0, repos: list = None) -> StubGraphQLServer:
+    """
+    Start a stub server in a background thread
+
+    :param size: the number of synthetic repositories
+    :param since: the earliest creation date of the repositories
+    :param until: the latest creation date of the repositories
+    :param latency: seconds to wait before answering each request
+    :param port: the port to listen to (default: a free port)
+    :param limit: the rateLimit budget, in points (default: large enough not to pace the benchmarks)
+    :param handshake: seconds to wait when a new connection is accepted, to simulate a TLS handshake
+    :param max_page_size: answer 502 to the search pages larger than this, to simulate heavy queries timing out
+    :param error_rate: the share of requests answered with a 502
+    :param secondary_rate: the share of requests answered with a 403 of the secondary rate limit
+    :param retry_after: the Retry-After of the 403s, in seconds
+    :param seed: the seed of the synthetic repositories and of the failures
+    :param repos: serve these repository nodes (e.g., from load_fixtures()) instead of <size> synthetic ones
+    :return: the running server; its url attribute is the GraphQL endpoint
+    """
+    repos = repos if repos is not None else generate(size, since, until, seed=seed)
+    server = StubGraphQLServer(('127.0.0.1', port), Index(repos), latency=latency, limit=limit, handshake=handshake,
+                               max_page_size=max_page_size, error_rate=error_rate, secondary_rate=secondary_rate,
+                               retry_after=retry_after, seed=seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a stub GitHub GraphQL endpoint.')
+    parser.add_argument('--size', type=int, default=10000, help='number of repositories (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen to (default: %(default)s)')
+    parser.add_argument('--handshake', type=float, default=0.0, help='seconds per new connection (default: %(default)s)')
+    parser.add_argument('--max-page-size', type=int, help='answer 502 to larger search pages (default: no limit)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 502s (default: %(default)s)')
+    parser.add_argument('--secondary-rate', type=float, default=0.0,
+                        help='share of 403s of the secondary rate limit (default: %(default)s)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After of the 403s (default: %(default)s)')
+    parser.add_argument('--limit', type=int, default=1000000, help='rateLimit budget (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the repositories and failures')
+    parser.add_argument('--fixtures', help='serve the repositories of this fixture file instead of synthetic ones')
+    parser.add_argument('--dump', help='write the synthetic repositories to this fixture file and exit')
+    args = parser.parse_args()
+
+    if args.dump:
+        dump_fixtures(generate(args.size, datetime(2020, 1, 1), datetime(2021, 1, 1), seed=args.seed), args.dump)
+        exit(0)
+
+    stub = serve(size=args.size, latency=args.latency, port=args.port, handshake=args.handshake,
+                 max_page_size=args.max_page_size, error_rate=args.error_rate, secondary_rate=args.secondary_rate,
+                 retry_after=args.retry_after, limit=args.limit, seed=args.seed,
+                 repos=load_fixtures(args.fixtures) if args.fixtures else None)
+    print(f'Serving {len(stub.index.repos)} repositories at {stub.url}', flush=True)
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.shutdown()
@@ -0,0 +1,238 @@
+"""
+Run the benchmark suite: collect_repositories, filter_repositories, the HTML report and the command line, end to end,
+at several scales, against a stub GitHub GraphQL endpoint (benchmarks/stub_server.py) running in its own process.
+
+Every scenario runs in a fresh process, so that its peak RSS is its own. The results (throughput, peak RSS and time per
+stage of every scenario, and the requests and failures served by the stub) are printed and written as JSON, to be
+compared across versions.
+
+Usage: python -m benchmarks.suite --sizes 1000 100000 1000000 --output results.json
+       python -m benchmarks.suite --sizes 100000 --latency 0.05 --error-rate 0.01 --secondary-rate 0.001
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+import requests
+
+SCENARIOS = ('collect', 'filter', 'report', 'cli')
+
+SINCE = datetime(2020, 1, 1)
+UNTIL = datetime(2021, 1, 1)
+
+
+def peak_rss() -> int:
+    """
+    :return: the peak resident set size of the current process, in bytes
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_collect(size: int, api_url: str, concurrency: int, batch_size: int) -> dict:
+    from repocollector.github import GithubRepositoriesCollector
+    from repocollector.metrics import Metrics
+
+    metrics = Metrics()
+    github = GithubRepositoriesCollector('token', api_url=api_url, concurrency=concurrency, batch_size=batch_size,
+                                         hooks=[metrics])
+
+    start = time.perf_counter()
+    collected = sum(1 for _ in github.collect_repositories(since=SINCE, until=UNTIL, pushed_after=datetime(2014, 1, 1),
+                                                           records=True))
+    seconds = time.perf_counter() - start
+
+    summary = metrics.summary()
+    return dict(repositories=collected, seconds=seconds, stages=summary['stage_seconds'],
+                requests=summary['requests'], retries=summary['retries'], points=summary['points'])
+
+
+def run_filter(size: int, **_) -> dict:
+    from benchmarks.stub_server import _node, generate
+    from repocollector.github import GithubRepositoriesCollector
+    from repocollector.queries import DIRS_FIELDS, SEARCH_FIELD
+
+    edges = [{'node': _node(repo, SEARCH_FIELD + DIRS_FIELDS)} for repo in generate(size, SINCE, UNTIL)]
+
+    start = time.perf_counter()
+    kept = sum(1 for _ in GithubRepositoriesCollector.filter_repositories(edges))
+    seconds = time.perf_counter() - start
+
+    return dict(repositories=kept, seconds=seconds, stages={'filter': seconds})
+
+
+def run_report(size: int, **_) -> dict:
+    from benchmarks.stub_server import _node, generate
+    from repocollector.github import GithubRepositoriesCollector
+    from repocollector.queries import DIRS_FIELDS, SEARCH_FIELD
+    from repocollector.report import ReportWriter
+
+    edges = [{'node': _node(repo, SEARCH_FIELD + DIRS_FIELDS)} for repo in generate(size, SINCE, UNTIL)]
+    repositories = list(GithubRepositoriesCollector.filter_repositories(edges))
+    del edges
+
+    stages = {}
+
+    with tempfile.TemporaryDirectory() as dest:
+        for paginated in (False, True):
+            start = time.perf_counter()
+
+            with ReportWriter(os.path.join(dest, 'repositories.html'), paginated=paginated) as report:
+                for repository in repositories:
+                    report.write(repository)
+
+            stages['report_paginated' if paginated else 'report'] = time.perf_counter() - start
+
+    return dict(repositories=len(repositories), seconds=sum(stages.values()), stages=stages)
+
+
+def run_cli(size: int, api_url: str, concurrency: int, batch_size: int) -> dict:
+    from repocollector import cli
+
+    with tempfile.TemporaryDirectory() as dest:
+        os.environ['GITHUB_ACCESS_TOKEN'] = 'token'
+        sys.argv = ['repositories-collector', SINCE.strftime('%Y-%m-%d'), UNTIL.strftime('%Y-%m-%d'), dest,
+                    '--api-url', api_url, '--concurrency', str(concurrency), '--batch-size', str(batch_size),
+                    '--format', 'json', 'sqlite', '--metrics', 'json']
+
+        start = time.perf_counter()
+        try:
+            cli.main()
+        except SystemExit as e:
+            if e.code:
+                raise
+        seconds = time.perf_counter() - start
+
+        with open(os.path.join(dest, 'repositories.metrics.json')) as f:
+            summary = json.load(f)['summary']
+
+    return dict(repositories=summary['repositories_kept'], seconds=seconds, stages=summary['stage_seconds'],
+                requests=summary['requests'], retries=summary['retries'], points=summary['points'])
+
+
+RUNNERS = {'collect': run_collect, 'filter': run_filter, 'report': run_report, 'cli': run_cli}
+
+
+def start_stub(args, size: int):
+    """
+    Start the stub server in its own process
+
+    :return: the process and the GraphQL endpoint
+    """
+    command = [sys.executable, '-m', 'benchmarks.stub_server', '--size', str(size), '--port', '0',
+               '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+               '--secondary-rate', str(args.secondary_rate), '--retry-after', str(args.retry_after)]
+
+    if args.fixtures:
+        command += ['--fixtures', args.fixtures]
+
+    stub = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = stub.stdout.readline()
+    match = re.search(r'(http://\S+)', line)
+
+    if not match:
+        stub.kill()
+        raise RuntimeError(f'The stub server did not start: {line}')
+
+    return stub, match.group(1)
+
+
+def run_scenario(scenario: str, size: int, api_url: str, args) -> dict:
+    """
+    Run a scenario in a fresh process
+
+    :return: the results of the scenario
+    """
+    command = [sys.executable, '-m', 'benchmarks.suite', '--run', scenario, '--sizes', str(size),
+               '--concurrency', str(args.concurrency), '--batch-size', str(args.batch_size)]
+
+    if api_url:
+        command += ['--api-url', api_url]
+
+    output = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='numbers of repositories served by the stub (default: %(default)s)')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help='scenarios to run (default: all)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 502s (default: %(default)s)')
+    parser.add_argument('--secondary-rate', type=float, default=0.0,
+                        help='share of 403s of the secondary rate limit (default: %(default)s)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After of the 403s (default: %(default)s)')
+    parser.add_argument('--fixtures', help='serve the repositories of this fixture file instead of synthetic ones')
+    parser.add_argument('--concurrency', type=int, default=1, help='concurrency of the collector (default: 1)')
+    parser.add_argument('--batch-size', type=int, default=1, help='batch size of the collector (default: 1)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--run', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--api-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # A scenario, run by the suite in a fresh process
+        result = RUNNERS[args.run](size=args.sizes[0], api_url=args.api_url, concurrency=args.concurrency,
+                                   batch_size=args.batch_size)
+        print(json.dumps(dict(result, peak_rss=peak_rss())))
+        return
+
+    from repocollector.cli import VERSION
+
+    results = []
+
+    for size in args.sizes:
+        needs_stub = {'collect', 'cli'} & set(args.scenarios)
+        stub, api_url = start_stub(args, size) if needs_stub else (None, None)
+
+        try:
+            for scenario in args.scenarios:
+                served = requests.get(api_url.replace('/graphql', '/stats')).json() if stub else None
+                result = run_scenario(scenario, size, api_url if scenario in needs_stub else None, args)
+
+                if stub and scenario in needs_stub:
+                    stats = requests.get(api_url.replace('/graphql', '/stats')).json()
+                    result['stub_requests'] = stats['requests'] - served['requests']
+                    result['stub_failures'] = {status: count - served['failures'].get(status, 0)
+                                               for status, count in stats['failures'].items()}
+
+                result.update(scenario=scenario, size=size,
+                              repositories_per_second=result['repositories'] / result['seconds']
+                              if result['seconds'] else None)
+                results.append(result)
+
+                print(f'{scenario:<8} size={size:<8} repositories={result["repositories"]:<8} '
+                      f'time={result["seconds"]:.2f}s {result["repositories_per_second"] or 0:.0f} repositories/s '
+                      f'peak_rss={result["peak_rss"] / 2 ** 20:.0f} MiB', file=sys.stderr)
+        finally:
+            if stub:
+                stub.terminate()
+                stub.wait()
+
+    report = dict(version=VERSION,
+                  python=platform.python_version(),
+                  started_at=datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                  parameters={key: value for key, value in vars(args).items() if key not in ('run', 'api_url')},
+                  results=results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
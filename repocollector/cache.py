@@ -0,0 +1,142 @@
+"""
+A module to cache GraphQL responses on disk, so that re-running the same harvest costs no quota
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body BLOB, etag TEXT, created_at REAL, accessed_at REAL,
+                                      size INTEGER);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CachedResponse:
+    """
+    A cached response body, with its ETag (if any) and whether it is still within the TTL
+    """
+
+    __slots__ = ('body', 'etag', 'fresh')
+
+    def __init__(self, body: bytes, etag: str, fresh: bool):
+        self.body = body
+        self.etag = etag
+        self.fresh = fresh
+
+
+class ResponseCache:
+    """
+    A SQLite-backed cache of GraphQL response bodies, keyed on the endpoint and the normalized query text (which
+    includes the cursor of the page). Entries expire after a TTL, and the least recently used ones are evicted when the
+    cache grows over its maximum size. Expired entries with an ETag can be revalidated instead of downloaded again.
+    """
+
+    def __init__(self, directory: str, ttl: float = 86400, max_size: int = 1024 ** 3):
+        """
+        :param directory: the directory of the cache; it is created if it does not exist
+        :param ttl: the seconds a response is served without asking GitHub (default: one day)
+        :param max_size: the maximum size of the cached bodies, in bytes (default: 1 GiB)
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = os.path.join(directory, 'responses.sqlite')
+        self.hits = 0
+        self.misses = 0
+
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    @property
+    def size(self) -> int:
+        """
+        :return: the size of the cached bodies, in bytes
+        """
+        return self._size
+
+    @staticmethod
+    def key(url: str, query: str, variables: dict = None) -> str:
+        """
+        :param url: the GraphQL endpoint
+        :param query: the GraphQL query
+        :param variables: the values of the variables of the query
+        :return: the cache key of the query, insensitive to whitespace
+        """
+        variables = json.dumps(variables, sort_keys=True) if variables else ''
+        return hashlib.sha256(f'{url}\n{" ".join(query.split())}\n{variables}'.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """
+        :param key: a key, as returned by key()
+        :return: the CachedResponse; None if the key is not cached
+        """
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute('SELECT body, etag, created_at FROM responses WHERE key = ?',
+                                           (key,)).fetchone()
+
+            if not row:
+                self.misses += 1
+                return None
+
+            body, etag, created_at = row
+            fresh = now - created_at < self._ttl
+
+            if fresh:
+                self.hits += 1
+                with self._connection:
+                    self._connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            else:
+                self.misses += 1
+
+            return CachedResponse(body, etag, fresh)
+
+    def refresh(self, key: str):
+        """
+        Restart the TTL of an entry, e.g., after GitHub answered 304 Not Modified to its ETag
+        """
+        now = time.time()
+
+        with self._lock, self._connection:
+            self._connection.execute('UPDATE responses SET created_at = ?, accessed_at = ? WHERE key = ?',
+                                     (now, now, key))
+
+    def put(self, key: str, body: bytes, etag: str = None):
+        """
+        Cache a response body, then evict the least recently used entries if the cache is over its maximum size
+        """
+        now = time.time()
+
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._size -= row[0] if row else 0
+
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key, body, etag, now, now, len(body)))
+            self._size += len(body)
+
+            while self._size > self._max_size:
+                evicted = self._connection.execute('SELECT key, size FROM responses ORDER BY accessed_at '
+                                                   'LIMIT 100').fetchall()
+                if not evicted:
+                    break
+
+                for evicted_key, size in evicted:
+                    self._connection.execute('DELETE FROM responses WHERE key = ?', (evicted_key,))
+                    self._size -= size
+
+                    if self._size <= self._max_size:
+                        break
@@ -0,0 +1,153 @@
+"""
+A module to persist the progress of a harvest, so that an interrupted run can be resumed
+"""
+
+import json
+import sqlite3
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from repocollector.records import Repository
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS shards (id INTEGER PRIMARY KEY, job INTEGER, since TEXT, until TEXT, end_cursor TEXT,
+                                   done INTEGER);
+CREATE TABLE IF NOT EXISTS repositories (id INTEGER PRIMARY KEY, data TEXT);
+"""
+
+
+def criteria(jobs: list, dirs: bool) -> dict:
+    """
+    :param jobs: the jobs of a harvest, as accepted by GithubRepositoriesCollector.collect_many()
+    :param dirs: whether the root directories are collected
+    :return: the criteria of the harvest, JSON serializable, to bind a Checkpoint or a ShardQueue to
+    """
+    return dict(jobs=[{key: value.isoformat() if isinstance(value, datetime) else value for key, value in job.items()}
+                      for job in jobs],
+                dirs=dirs)
+
+
+class ShardJournal:
+    """
+    The criteria of a harvest and its shards, in a SQLite file with a meta and a shards table. It is the base of the
+    Checkpoint of a run and of the ShardQueue of a distributed harvest.
+    """
+
+    # The name of the journal, in the error messages
+    kind = 'journal'
+
+    def __init__(self, path: str, connection):
+        """
+        :param path: the path to the SQLite file
+        :param connection: the connection to the file, whose schema has a meta and a shards table
+        """
+        self.path = path
+        self._connection = connection
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection:
+            yield self._connection
+
+    def _check(self, connection, criteria: dict) -> bool:
+        row = connection.execute("SELECT value FROM meta WHERE key = 'criteria'").fetchone()
+
+        if row and row[0] != json.dumps(criteria, sort_keys=True):
+            raise ValueError(f'The {self.kind} at {self.path} belongs to a harvest with different criteria')
+
+        return bool(row)
+
+    def start(self, criteria: dict) -> bool:
+        """
+        Check the journal against the criteria of a harvest
+
+        :param criteria: the criteria of the harvest; values must be JSON serializable
+        :return: True if the journal already holds the shards of these criteria, False if it is not planned yet; raise
+        a ValueError if it belongs to a harvest with different criteria
+        """
+        with self._transaction() as connection:
+            return self._check(connection, criteria)
+
+    def criteria(self) -> dict:
+        """
+        :return: the criteria of the harvest, as passed to save_plans(); None if the journal is not planned yet
+        """
+        with self._transaction() as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'criteria'").fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def save_plans(self, criteria: dict, plans: list):
+        """
+        Record the criteria of the harvest and the shards of all its jobs, in a single transaction: a journal holding
+        criteria is always fully planned. Nothing is recorded if another process planned the same harvest meanwhile.
+
+        :param criteria: the criteria of the harvest, as passed to start()
+        :param plans: a list with the (since, until) created-at windows of each job, as returned by plan_many()
+        """
+        with self._transaction() as connection:
+            if self._check(connection, criteria):
+                return
+
+            connection.execute("INSERT INTO meta VALUES ('criteria', ?)", (json.dumps(criteria, sort_keys=True),))
+            connection.executemany('INSERT INTO shards (job, since, until, end_cursor, done) VALUES (?, ?, ?, NULL, 0)',
+                                   [(job, since.isoformat(), until.isoformat())
+                                    for job, windows in enumerate(plans) for since, until in windows])
+
+
+class Checkpoint(ShardJournal):
+    """
+    A SQLite journal of a harvest: its shards, the last endCursor of each shard, and the repositories already emitted.
+    Every page is recorded in a single transaction together with its repositories, so that no page is fetched twice.
+    """
+
+    kind = 'checkpoint'
+
+    def __init__(self, path: str):
+        """
+        :param path: the path to the SQLite file; it is created if it does not exist
+        """
+        super().__init__(path, sqlite3.connect(path))
+        self._connection.executescript(SCHEMA)
+
+    def shards(self) -> list:
+        """
+        :return: a list of (id, job, since, until, end_cursor, done) tuples, by job and in chronological order
+        """
+        return [(shard_id, job, datetime.fromisoformat(since), datetime.fromisoformat(until), end_cursor, bool(done))
+                for shard_id, job, since, until, end_cursor, done in
+                self._connection.execute('SELECT id, job, since, until, end_cursor, done FROM shards '
+                                         'ORDER BY job, since')]
+
+    def save_page(self, shard_id: int, end_cursor: str, has_next_page: bool, repositories: list):
+        """
+        Record a page and the repositories it emitted, atomically
+
+        :param shard_id: the shard the page belongs to
+        :param end_cursor: the endCursor of the page
+        :param has_next_page: whether the shard has more pages
+        :param repositories: the repositories emitted from the page
+        """
+        with self._connection:
+            self._connection.execute('UPDATE shards SET end_cursor = ?, done = ? WHERE id = ?',
+                                     (end_cursor, int(not has_next_page), shard_id))
+            self._connection.executemany('INSERT OR REPLACE INTO repositories VALUES (?, ?)',
+                                         [(repo['id'], json.dumps(dict(repo))) for repo in repositories])
+
+    def repositories(self):
+        """
+        :return: a generator of the repositories already emitted, as Repository records
+        """
+        for data, in self._connection.execute('SELECT data FROM repositories ORDER BY rowid'):
+            yield Repository(**json.loads(data))
@@ -1,16 +1,20 @@
 import argparse
-import copy
-import io
-import json
 import os
+import sys
 
 from datetime import datetime
-from getpass import getpass
 
-from repocollector.github import GithubRepositoriesCollector
-from repocollector.report import create_report
+# The other modules (and requests) are imported by the commands that use them, so that --help and --version, and the
+# subcommands that do not touch GitHub, start fast
+from repocollector.queries import GRAPHQL_URL
 
-VERSION = "0.0.5"
+VERSION = "0.1.0"
+
+# The output formats, i.e., repocollector.writers.WRITERS plus the indexed store queried by the query subcommand, and
+# the fields the store can sort on (repocollector.store.ORDER_BY). They are listed here, rather than imported, for the
+# same reason
+FORMATS = ('csv', 'json', 'jsonl', 'parquet', 'sqlite')
+ORDER_BY = ('id', 'stars', 'issues', 'releases', 'watchers', 'created_at', 'pushed_at', 'full_name')
 
 
 def date(x: str) -> datetime:
@@ -40,6 +44,18 @@ def unsigned_int(x: str) -> int:
     return x
 
 
+def positive_int(x: str) -> int:
+    """
+    Check the number is greater than zero
+    :param x: a number
+    :return: int(x); raise an ArgumentTypeError otherwise
+    """
+    x = int(x)
+    if x < 1:
+        raise argparse.ArgumentTypeError('Minimum bound is 1')
+    return x
+
+
 def valid_path(x: str) -> str:
     """
     Check the path exists
@@ -52,29 +68,23 @@ def valid_path(x: str) -> str:
     return x
 
 
-def get_parser():
-    description = 'A Python library to collect repositories metadata from GitHub.'
-
-    parser = argparse.ArgumentParser(prog='repositories-repocollector', description=description)
-    parser.add_argument('-v', '--version', action='version', version='%(prog)s ' + VERSION)
-
-    parser.add_argument(action='store',
-                        dest='since',
-                        type=date,
-                        default=datetime.strptime('2014-01-01', '%Y-%m-%d'),
-                        help='collect repositories created since this date (default: %(default)s)')
+def get_tokens() -> list:
+    """
+    :return: the tokens in GITHUB_ACCESS_TOKEN, or typed in: one or more, comma-separated, which requests are spread
+    across
+    """
+    token = os.getenv('GITHUB_ACCESS_TOKEN')
+    if not token:
+        from getpass import getpass
+        token = getpass('Github access token:')
 
-    parser.add_argument(action='store',
-                        dest='until',
-                        type=date,
-                        default=datetime.strptime('2014-01-01', '%Y-%m-%d'),
-                        help='collect repositories created up to this date (default: %(default)s)')
+    return [t.strip() for t in token.split(',') if t.strip()]
 
-    parser.add_argument(action='store',
-                        dest='dest',
-                        type=valid_path,
-                        help='destination folder for report')
 
+def add_criteria_arguments(parser):
+    """
+    Add the criteria of a harvest to a parser: push date, thresholds, languages and root directories
+    """
     parser.add_argument('--pushed-after',
                         action='store',
                         dest='date_push',
@@ -110,12 +120,505 @@ def get_parser():
                         default=0,
                         help='collect repositories with at least <min-watchers> watchers (default: %(default)s)')
 
+    parser.add_argument('--primary-language',
+                        action='append',
+                        dest='primary_languages',
+                        type=str,
+                        default=None,
+                        help='collect repositories written in this language; repeat the option, or separate the '
+                             'languages with commas, to collect several')
+
+    parser.add_argument('--no-dirs',
+                        action='store_false',
+                        dest='dirs',
+                        default=True,
+                        help='do not collect the root directories of the repositories, which saves requests')
+
+
+def add_connection_arguments(parser):
+    """
+    Add the options of the requests to GitHub to a parser: concurrency, batch size, endpoint and timeout
+    """
+    parser.add_argument('--concurrency',
+                        action='store',
+                        dest='concurrency',
+                        type=positive_int,
+                        default=1,
+                        help='number of created-at windows fetched in parallel (default: %(default)s)')
+
+    parser.add_argument('--batch-size',
+                        action='store',
+                        dest='batch_size',
+                        type=positive_int,
+                        default=1,
+                        help='number of created-at windows (or languages) fetched per request (default: %(default)s)')
+
+    parser.add_argument('--api-url',
+                        action='store',
+                        dest='api_url',
+                        type=str,
+                        default=GRAPHQL_URL,
+                        help='the GraphQL endpoint (default: %(default)s)')
+
+    parser.add_argument('--timeout',
+                        action='store',
+                        dest='timeout',
+                        type=positive_int,
+                        default=60,
+                        help='seconds to wait for a response before retrying the request (default: %(default)s)')
+
+
+def get_parser():
+    description = 'A Python library to collect repositories metadata from GitHub.'
+
+    parser = argparse.ArgumentParser(prog='repositories-repocollector', description=description)
+    parser.add_argument('-v', '--version', action='version', version='%(prog)s ' + VERSION)
+
+    parser.add_argument(action='store',
+                        dest='since',
+                        type=date,
+                        default=datetime.strptime('2014-01-01', '%Y-%m-%d'),
+                        help='collect repositories created since this date (default: %(default)s)')
+
+    parser.add_argument(action='store',
+                        dest='until',
+                        type=date,
+                        default=datetime.strptime('2014-01-01', '%Y-%m-%d'),
+                        help='collect repositories created up to this date (default: %(default)s)')
+
+    parser.add_argument(action='store',
+                        dest='dest',
+                        type=valid_path,
+                        help='destination folder for report')
+
+    add_criteria_arguments(parser)
+
+    parser.add_argument('--format',
+                        action='store',
+                        dest='formats',
+                        nargs='+',
+                        choices=FORMATS,
+                        default=['json'],
+                        help='formats of the repositories.<format> files written along the html report, while '
+                             'collecting (default: %(default)s)')
+
+    parser.add_argument('--paginated-report',
+                        action='store_true',
+                        dest='paginated_report',
+                        default=False,
+                        help='render the html report as a paginated table, suited for large results '
+                             '(default: %(default)s)')
+
+    add_connection_arguments(parser)
+
+    parser.add_argument('--incremental',
+                        action='store_true',
+                        dest='incremental',
+                        default=False,
+                        help='update the outputs in <dest> with the repositories pushed since they were collected '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--resume',
+                        action='store_true',
+                        dest='resume',
+                        default=False,
+                        help='resume the interrupted run with the same criteria in <dest> (default: %(default)s)')
+
+    parser.add_argument('--cache-dir',
+                        action='store',
+                        dest='cache_dir',
+                        type=str,
+                        default=None,
+                        help='cache the GraphQL responses in this folder, to re-run the same harvest without '
+                             'spending quota')
+
+    parser.add_argument('--cache-ttl',
+                        action='store',
+                        dest='cache_ttl',
+                        type=unsigned_int,
+                        default=86400,
+                        help='seconds a cached response is served without asking GitHub (default: %(default)s)')
+
+    parser.add_argument('--metrics',
+                        action='store',
+                        dest='metrics',
+                        choices=('json', 'prom'),
+                        default=None,
+                        help='dump the metrics of the run to <dest>/repositories.metrics.<metrics>, as JSON or as a '
+                             'Prometheus textfile')
+
+    parser.add_argument('--verbose',
+                        action='store_true',
+                        dest='verbose',
+                        default=False,
+                        help='show log (default: %(default)s)')
+
+    return parser
+
+
+def get_query_parser():
+    description = 'Query the repositories stored by a previous run (--format sqlite), without touching GitHub.'
+
+    parser = argparse.ArgumentParser(prog='repositories-collector query', description=description)
+
+    parser.add_argument(action='store',
+                        dest='store',
+                        type=str,
+                        help='the repositories.sqlite file, or the folder of a previous run')
+
     parser.add_argument('--primary-language',
                         action='store',
                         dest='primary_language',
                         type=str,
                         default=None,
-                        help='collect repositories written in this language')
+                        help='repositories written in this language')
+
+    for threshold in ('issues', 'releases', 'stars', 'watchers'):
+        parser.add_argument(f'--min-{threshold}',
+                            action='store',
+                            dest=f'min_{threshold}',
+                            type=unsigned_int,
+                            default=0,
+                            help=f'repositories with at least <min-{threshold}> {threshold} (default: %(default)s)')
+
+    parser.add_argument('--created-since',
+                        action='store',
+                        dest='created_since',
+                        type=date,
+                        default=None,
+                        help='repositories created since this date')
+
+    parser.add_argument('--created-until',
+                        action='store',
+                        dest='created_until',
+                        type=date,
+                        default=None,
+                        help='repositories created up to this date')
+
+    parser.add_argument('--pushed-after',
+                        action='store',
+                        dest='pushed_after',
+                        type=date,
+                        default=None,
+                        help='repositories pushed after this date')
+
+    parser.add_argument('--dir',
+                        action='append',
+                        dest='dirs',
+                        default=[],
+                        help='repositories with this root directory; can be repeated')
+
+    parser.add_argument('--text',
+                        action='store',
+                        dest='text',
+                        type=str,
+                        default=None,
+                        help='repositories whose description contains all these words')
+
+    parser.add_argument('--order-by',
+                        action='store',
+                        dest='order_by',
+                        choices=ORDER_BY,
+                        default='stars',
+                        help='sort the repositories by this field, descending (default: %(default)s)')
+
+    parser.add_argument('--limit',
+                        action='store',
+                        dest='limit',
+                        type=positive_int,
+                        default=None,
+                        help='return at most <limit> repositories')
+
+    parser.add_argument('--count',
+                        action='store_true',
+                        dest='count',
+                        default=False,
+                        help='print the number of matching repositories only (default: %(default)s)')
+
+    parser.add_argument('--verbose',
+                        action='store_true',
+                        dest='verbose',
+                        default=False,
+                        help='show the query time (default: %(default)s)')
+
+    return parser
+
+
+def get_jobs(args, pushed_after: datetime) -> list:
+    """
+    :param args: the parsed criteria of a harvest (see add_criteria_arguments())
+    :param pushed_after: the earliest push date
+    :return: the jobs of the harvest, as accepted by GithubRepositoriesCollector.collect_many(): one per language,
+    whose shards are batched together
+    """
+    # --primary-language is repeated, or comma-separated, for several languages; any language if it is not given
+    primary_languages = [language for value in args.primary_languages or [] for language in value.split(',')
+                         if language] or [None]
+
+    return [dict(since=args.since,
+                 until=args.until,
+                 pushed_after=pushed_after,
+                 min_stars=args.min_stars,
+                 min_releases=args.min_releases,
+                 min_watchers=args.min_watchers,
+                 min_issues=args.min_issues,
+                 primary_language=primary_language) for primary_language in primary_languages]
+
+
+def check_formats(formats: list):
+    """
+    Check the optional dependencies of the formats are installed, before any output is touched; exit with code 1
+    otherwise
+
+    :param formats: the formats of the repositories.<format> files
+    """
+    if 'parquet' in formats:
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            print('pyarrow is required to write Parquet files: pip install repositories-collector[parquet]')
+            exit(1)
+
+
+def get_writers(dest: str, formats: list, paginated_report: bool, suffix: str = '') -> list:
+    """
+    :param dest: the destination folder
+    :param formats: the formats of the repositories.<format> files
+    :param paginated_report: render the html report as a paginated table
+    :param suffix: write the outputs to repositories.<format><suffix> instead, to replace the outputs with them once
+    they are complete (see replace_outputs())
+    :return: the writers of the outputs, along with the html report. The outputs are rewritten from scratch: the
+    store would otherwise keep the repositories that are no longer collected
+    """
+    from repocollector.report import ReportWriter
+    from repocollector.store import RepositoryStore
+    from repocollector.writers import WRITERS
+
+    check_formats(formats)
+
+    writers = []
+    for fmt in formats:
+        filename = os.path.join(dest, f'repositories.{fmt}{suffix}')
+        if os.path.exists(filename):
+            os.remove(filename)
+
+        writers.append(RepositoryStore(filename) if fmt == 'sqlite' else WRITERS[fmt](filename))
+    writers.append(ReportWriter(os.path.join(dest, f'repositories.html{suffix}'), paginated=paginated_report))
+
+    return writers
+
+
+def replace_outputs(dest: str, formats: list, suffix: str):
+    """
+    Replace the outputs with the ones written by get_writers(..., suffix=suffix), atomically
+    """
+    for filename in [f'repositories.{fmt}' for fmt in formats] + ['repositories.html']:
+        os.replace(os.path.join(dest, f'{filename}{suffix}'), os.path.join(dest, filename))
+
+
+def get_coordinate_parser():
+    description = 'Plan the shards of a distributed harvest into a queue, for the workers to collect them.'
+
+    parser = argparse.ArgumentParser(prog='repositories-collector coordinate', description=description)
+
+    parser.add_argument(action='store',
+                        dest='since',
+                        type=date,
+                        help='collect repositories created since this date')
+
+    parser.add_argument(action='store',
+                        dest='until',
+                        type=date,
+                        help='collect repositories created up to this date')
+
+    parser.add_argument(action='store',
+                        dest='queue',
+                        type=str,
+                        help='the SQLite file of the queue, shared with the workers; it is created if it does not '
+                             'exist')
+
+    add_criteria_arguments(parser)
+    add_connection_arguments(parser)
+
+    parser.add_argument('--verbose',
+                        action='store_true',
+                        dest='verbose',
+                        default=False,
+                        help='show the progress of the queue (default: %(default)s)')
+
+    return parser
+
+
+def coordinate(argv: list):
+    """
+    Run the coordinate subcommand: plan the shards of the harvest into the queue, or retry its failed shards if it
+    already holds them
+
+    :param argv: the arguments following the subcommand
+    """
+    args = get_coordinate_parser().parse_args(argv)
+
+    from repocollector import distributed
+    from repocollector.github import GithubRepositoriesCollector, PlanningError, Transport
+
+    github = GithubRepositoriesCollector(access_token=get_tokens(),
+                                         concurrency=args.concurrency,
+                                         batch_size=args.batch_size,
+                                         transport=Transport(url=args.api_url, timeout=(10, args.timeout),
+                                                             pool_size=args.concurrency))
+
+    with distributed.ShardQueue(args.queue) as queue:
+        try:
+            shards = distributed.coordinate(github, queue, get_jobs(args, args.date_push), dirs=args.dirs)
+        except ValueError as e:
+            print(e)
+            exit(1)
+        except PlanningError as e:
+            print(f'{e}: the queue is left unplanned, run the same command to plan it')
+            exit(1)
+
+        print(f'{shards} shards queued in {args.queue}')
+
+        if args.verbose:
+            print(queue.progress())
+
+    exit(0)
+
+
+def get_work_parser():
+    description = 'Collect the shards of a distributed harvest, until its queue is finished.'
+
+    parser = argparse.ArgumentParser(prog='repositories-collector work', description=description)
+
+    parser.add_argument(action='store',
+                        dest='queue',
+                        type=str,
+                        help='the SQLite file of the queue, planned by the coordinate subcommand')
+
+    parser.add_argument(action='store',
+                        dest='partitions',
+                        type=valid_path,
+                        help='the folder of the partitions, shared by the workers')
+
+    parser.add_argument('--name',
+                        action='store',
+                        dest='name',
+                        type=str,
+                        default=None,
+                        help='the name of the worker and of its partition, unique across the harvest '
+                             '(default: <hostname>-<pid>)')
+
+    parser.add_argument('--lease',
+                        action='store',
+                        dest='lease',
+                        type=positive_int,
+                        default=300,
+                        help='seconds after which the shards of a worker that stopped renewing its leases are leased '
+                             'again (default: %(default)s)')
+
+    parser.add_argument('--max-leases',
+                        action='store',
+                        dest='max_leases',
+                        type=positive_int,
+                        default=5,
+                        help='times a shard is leased before it is failed; running coordinate again retries the '
+                             'failed shards (default: %(default)s)')
+
+    add_connection_arguments(parser)
+
+    parser.add_argument('--verbose',
+                        action='store_true',
+                        dest='verbose',
+                        default=False,
+                        help='show the progress of the queue (default: %(default)s)')
+
+    return parser
+
+
+def work(argv: list):
+    """
+    Run the work subcommand: lease and collect shards until the queue is finished
+
+    :param argv: the arguments following the subcommand
+    """
+    args = get_work_parser().parse_args(argv)
+
+    from repocollector import distributed
+    from repocollector.github import GithubRepositoriesCollector, Transport
+
+    if not os.path.isfile(args.queue):
+        print(f'{args.queue} does not exist: plan the harvest with the coordinate subcommand first')
+        exit(1)
+
+    github = GithubRepositoriesCollector(access_token=get_tokens(),
+                                         concurrency=args.concurrency,
+                                         batch_size=args.batch_size,
+                                         transport=Transport(url=args.api_url, timeout=(10, args.timeout),
+                                                             pool_size=args.concurrency))
+
+    with distributed.ShardQueue(args.queue, lease_seconds=args.lease, max_leases=args.max_leases) as queue:
+        worker = distributed.Worker(github, queue, args.partitions, name=args.name,
+                                    lease_size=args.concurrency * args.batch_size)
+        collected = worker.run(verbose=args.verbose)
+        failed = queue.progress()['failed']
+
+    print(f'{worker.name}: {collected} repositories written to {worker.path}')
+
+    if failed:
+        print(f'{failed} shards failed: run coordinate again to retry them')
+
+    exit(1 if failed else 0)
+
+
+def get_merge_parser():
+    description = 'Merge outputs of the collector (e.g., runs over different periods, the partitions of a distributed ' \
+                  'harvest) into the outputs of a run, keeping the most recently pushed version of every repository.'
+
+    parser = argparse.ArgumentParser(prog='repositories-collector merge', description=description)
+
+    parser.add_argument(action='store',
+                        dest='dest',
+                        type=valid_path,
+                        help='destination folder for report')
+
+    parser.add_argument(action='store',
+                        dest='inputs',
+                        nargs='+',
+                        type=str,
+                        help='repositories.<format> files of previous runs, partitions, or folders of partitions')
+
+    for threshold in ('issues', 'releases', 'stars', 'watchers'):
+        parser.add_argument(f'--min-{threshold}',
+                            action='store',
+                            dest=f'min_{threshold}',
+                            type=unsigned_int,
+                            default=0,
+                            help=f'keep the repositories with at least <min-{threshold}> {threshold} '
+                                 f'(default: %(default)s)')
+
+    parser.add_argument('--queue',
+                        action='store',
+                        dest='queue',
+                        type=str,
+                        default=None,
+                        help='refuse to merge until the shards of this queue are all done or failed; exit 1 after the '
+                             'merge if some failed')
+
+    parser.add_argument('--format',
+                        action='store',
+                        dest='formats',
+                        nargs='+',
+                        choices=FORMATS,
+                        default=['json'],
+                        help='formats of the repositories.<format> files written along the html report '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--paginated-report',
+                        action='store_true',
+                        dest='paginated_report',
+                        default=False,
+                        help='render the html report as a paginated table, suited for large results '
+                             '(default: %(default)s)')
 
     parser.add_argument('--verbose',
                         action='store_true',
@@ -126,44 +629,263 @@ def get_parser():
     return parser
 
 
+def merge(argv: list):
+    """
+    Run the merge subcommand: write the repositories of the inputs to the outputs, deduplicated on their id
+
+    :param argv: the arguments following the subcommand
+    """
+    args = get_merge_parser().parse_args(argv)
+    check_formats(args.formats)
+
+    from repocollector import dataset, distributed
+
+    failed = 0
+
+    if args.queue:
+        with distributed.ShardQueue(args.queue) as queue:
+            progress = queue.progress()
+
+        if not progress['planned']:
+            print(f'The harvest of {args.queue} is not planned yet')
+            exit(1)
+
+        if progress['leased'] or progress['pending']:
+            print(f'The harvest is not finished: {progress}')
+            exit(1)
+
+        failed = progress['failed']
+
+    paths = []
+    for path in args.inputs:
+        paths.extend(distributed.partitions(path) if os.path.isdir(path) else [path])
+
+    # The inputs are all indexed before the outputs are opened, so that an output of dest can be merged into itself
+    with dataset.MergeIndex(directory=args.dest) as index:
+        for path in paths:
+            try:
+                read = index.add(dataset.read(path))
+            except (OSError, ValueError) as e:
+                print(f'Cannot merge {path}: {e}')
+                exit(1)
+
+            if args.verbose:
+                print(f'Read {read} repositories from {path}, {len(index)} distinct so far')
+
+        writers = get_writers(args.dest, args.formats, args.paginated_report)
+        merged = 0
+
+        try:
+            for repository in index.repositories(min_stars=args.min_stars,
+                                                 min_releases=args.min_releases,
+                                                 min_watchers=args.min_watchers,
+                                                 min_issues=args.min_issues):
+                for writer in writers:
+                    writer.write(repository)
+
+                merged += 1
+        finally:
+            for writer in writers:
+                writer.close()
+
+    if args.verbose:
+        print(f'Merged {merged} repositories from {len(paths)} inputs into {args.dest}')
+
+    if failed:
+        print(f'{failed} shards of the harvest failed: their repositories are missing')
+
+    exit(1 if failed else 0)
+
+
+def query(argv: list):
+    """
+    Run the query subcommand: print the matching repositories as JSON lines
+
+    :param argv: the arguments following the subcommand
+    """
+    args = get_query_parser().parse_args(argv)
+
+    import json
+    import time
+
+    from repocollector.store import RepositoryStore
+
+    path = os.path.join(args.store, 'repositories.sqlite') if os.path.isdir(args.store) else args.store
+    if not os.path.isfile(path):
+        print(f'{path} does not exist: collect the repositories with --format sqlite first')
+        exit(1)
+
+    def day(x):
+        return x.strftime('%Y-%m-%d') if x else None
+
+    start = time.perf_counter()
+    matched = 0
+
+    with RepositoryStore(path) as store:
+        for repository in store.query(primary_language=args.primary_language,
+                                      min_stars=args.min_stars,
+                                      min_releases=args.min_releases,
+                                      min_watchers=args.min_watchers,
+                                      min_issues=args.min_issues,
+                                      created_since=day(args.created_since),
+                                      created_until=day(args.created_until),
+                                      pushed_after=day(args.pushed_after),
+                                      dirs=args.dirs,
+                                      text=args.text,
+                                      order_by=args.order_by,
+                                      limit=args.limit):
+            matched += 1
+
+            if not args.count:
+                print(json.dumps(dict(repository)))
+
+    if args.count:
+        print(matched)
+
+    if args.verbose:
+        print(f'{matched} repositories in {(time.perf_counter() - start) * 1000:.1f} ms', file=sys.stderr)
+
+    exit(0)
+
+
+SUBCOMMANDS = {'coordinate': coordinate, 'work': work, 'merge': merge, 'query': query}
+
+
 def main():
+    # Subcommands are dispatched on the first argument, which is the since date otherwise
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+
     args = get_parser().parse_args()
+    check_formats(args.formats)
 
-    token = os.getenv('GITHUB_ACCESS_TOKEN')
-    if not token:
-        token = getpass('Github access token:')
+    from repocollector import dataset
+    from repocollector.cache import ResponseCache
+    from repocollector.checkpoint import Checkpoint
+    from repocollector.github import GithubRepositoriesCollector, PlanningError, Transport
+    from repocollector.metrics import Metrics
 
-    github = GithubRepositoriesCollector(access_token=token)
+    tokens = get_tokens()
 
-    repositories = list()
-    for repository in github.collect_repositories(
-            since=args.since,
-            until=args.until,
-            pushed_after=args.date_push,
-            min_stars=args.min_stars,
-            min_releases=args.min_releases,
-            min_watchers=args.min_watchers,
-            min_issues=args.min_issues,
-            primary_language=args.primary_language):
+    cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl) if args.cache_dir else None
 
-        # Save repository to collection
-        repositories.append(copy.deepcopy(repository))
+    transport = Transport(url=args.api_url, timeout=(10, args.timeout), pool_size=args.concurrency)
 
-        if args.verbose:
-            print(f'Collected {repository["url"]}')
+    metrics = Metrics()
+
+    github = GithubRepositoriesCollector(access_token=tokens,
+                                         concurrency=args.concurrency,
+                                         batch_size=args.batch_size,
+                                         cache=cache,
+                                         transport=transport,
+                                         hooks=[metrics])
 
-    # Generate html report
-    html = create_report(repositories)
     html_filename = os.path.join(args.dest, 'repositories.html')
-    json_filename = os.path.join(args.dest, 'repositories.json')
 
-    with io.open(html_filename, "w", encoding="utf-8") as f:
-        f.write(html)
+    # In incremental mode, only the repositories pushed since the previous run are collected. The previous dataset is
+    # the first of the outputs of the run that exists, streamed from disk
+    pushed_after = args.date_push
+    previous_filename = None
+    if args.incremental:
+        previous_filename = next((filename for filename in (os.path.join(args.dest, f'repositories.{fmt}')
+                                                            for fmt in args.formats) if os.path.isfile(filename)), None)
+
+    if previous_filename:
+        last_push = dataset.watermark(dataset.read(previous_filename))
+
+        if last_push and last_push > pushed_after:
+            pushed_after = last_push
+
+        if args.verbose:
+            print(f'Updating {previous_filename} with the repositories pushed after {pushed_after}')
+
+    # Progress is recorded in <dest> until the reports are written, so that an interrupted run can be resumed
+    checkpoint_filename = os.path.join(args.dest, 'repositories.checkpoint.sqlite')
+    if not args.resume and os.path.exists(checkpoint_filename):
+        os.remove(checkpoint_filename)
 
-    with io.open(json_filename, "w") as f:
-        json.dump(repositories, f)
+    checkpoint = Checkpoint(checkpoint_filename)
+
+    # The checkpoint is checked against the criteria before the outputs are rewritten
+    try:
+        repositories = github.collect_many(get_jobs(args, pushed_after), dirs=args.dirs, checkpoint=checkpoint,
+                                           records=True)
+    except ValueError as e:
+        print(f'{e}: run the same command to resume it, or remove --resume to start over')
+        exit(1)
+
+    # The previous dataset is read while the updated one is written: the updated outputs are written aside, and only
+    # replace the previous ones once they are complete, so that an interrupted run leaves the previous ones intact
+    suffix = ''
+
+    if previous_filename:
+        repositories = dataset.merge(dataset.read(previous_filename),
+                                     repositories,
+                                     min_stars=args.min_stars,
+                                     min_releases=args.min_releases,
+                                     min_watchers=args.min_watchers,
+                                     min_issues=args.min_issues)
+        suffix = '.tmp'
+
+    # Stream the repositories to the outputs as they are collected
+    writers = get_writers(args.dest, args.formats, args.paginated_report, suffix=suffix)
+
+    try:
+        for repository in repositories:
+            with metrics.timer('write'):
+                for writer in writers:
+                    writer.write(repository)
+
+            if args.verbose:
+                print(f'Collected {repository["url"]}')
+    except PlanningError as e:
+        # Nothing was collected: the previous outputs, if any, are left in place in incremental mode
+        print(f'{e}: run the same command to plan the harvest again')
+        exit(1)
+    finally:
+        with metrics.timer('write'):
+            for writer in writers:
+                writer.close()
+
+    # Shards the collector gave up on are not done: the checkpoint is kept for --resume to collect them
+    unfinished = sum(1 for *_, done in checkpoint.shards() if not done)
+    checkpoint.close()
+
+    if unfinished:
+        # In incremental mode, the previous outputs are kept as well: they are the dataset --resume updates
+        print(f'{unfinished} shards could not be collected, the outputs are incomplete: run the same command with '
+              f'--resume to collect them')
+    else:
+        if suffix:
+            replace_outputs(args.dest, args.formats, suffix)
+
+        os.remove(checkpoint_filename)
+
+    if args.metrics:
+        metrics.write(os.path.join(args.dest, f'repositories.metrics.{args.metrics}'))
 
     if args.verbose:
         print(f'Report created at {html_filename}')
 
-    exit(0)
+        stats = github.stats
+        for stage in ('count', 'search', 'nodes', 'dirs'):
+            if stats.get(f'{stage}_requests'):
+                print(f'{stage}: {stats[f"{stage}_requests"]} requests, {stats.get(f"{stage}_points", 0)} points, '
+                      f'{stats[f"{stage}_bytes"]} bytes')
+
+        if cache:
+            print(f'Cache: {cache.hits} hits, {cache.misses} misses, {cache.size} bytes')
+
+        if stats['estimated_bytes_saved']:
+            print(f'Fetching the heavy fields only for the {stats.get("repositories_enriched", 0)} repositories '
+                  f'meeting the thresholds, out of {stats.get("repositories_scanned", 0)}, saved about '
+                  f'{stats["estimated_bytes_saved"]} bytes')
+
+        summary = metrics.summary()
+        print(f'Collected {summary["repositories_kept"]} repositories out of {summary["repositories_scanned"]} scanned '
+              f'in {summary["elapsed_seconds"]}s: {summary["repositories_per_second"]} repositories/s, '
+              f'{summary["points_per_repository"]} points per repository, {summary["retries"]} retries')
+        print('Time per stage: ' + ', '.join(f'{stage} {seconds}s'
+                                             for stage, seconds in sorted(summary['stage_seconds'].items())))
+
+    exit(1 if unfinished else 0)
@@ -0,0 +1,55 @@
+"""
+A module to encode and decode the JSON bodies of the GraphQL requests with the fastest backend available: orjson if it
+is installed, the standard library otherwise
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ('orjson', 'json')
+
+_backend = 'orjson' if orjson else 'json'
+
+
+def backend() -> str:
+    """
+    :return: the name of the backend in use
+    """
+    return _backend
+
+
+def use(name: str):
+    """
+    Select the backend
+
+    :param name: one of BACKENDS
+    """
+    global _backend
+
+    if name not in BACKENDS:
+        raise ValueError(f'the JSON backend must be one of {", ".join(BACKENDS)}')
+
+    if name == 'orjson' and not orjson:
+        raise ImportError('orjson is required to use the orjson backend: pip install orjson')
+
+    _backend = name
+
+
+def loads(data: bytes):
+    """
+    :param data: a UTF-8 encoded JSON document, e.g., the raw content of a response
+    :return: the decoded document
+    """
+    return orjson.loads(data) if _backend == 'orjson' else json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    """
+    :param obj: a JSON serializable object
+    :return: the UTF-8 encoded JSON document
+    """
+    return orjson.dumps(obj) if _backend == 'orjson' else json.dumps(obj).encode('utf-8')
@@ -0,0 +1,326 @@
+"""
+A module to handle datasets of collected repositories, e.g., to update them incrementally, or to merge the outputs of
+several runs
+"""
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+from datetime import datetime
+
+from repocollector import codec
+from repocollector.records import FIELDS, NUMERIC_FIELDS, Repository
+
+
+def watermark(repositories: list):
+    """
+    Find the most recent push among the repositories of a dataset. All the repositories that changed after the
+    dataset was collected were pushed at or after this date.
+
+    :param repositories: a list of repositories
+    :return: the most recent pushed_at datetime; None if unknown
+    """
+    latest = None
+
+    for repo in repositories:
+        try:
+            pushed_at = datetime.strptime(repo.get('pushed_at'), '%Y-%m-%dT%H:%M:%SZ')
+        except (TypeError, ValueError):
+            continue
+
+        if latest is None or pushed_at > latest:
+            latest = pushed_at
+
+    return latest
+
+
+def matches(repository: dict,
+            min_stars: int = 0,
+            min_releases: int = 0,
+            min_watchers: int = 0,
+            min_issues: int = 0) -> bool:
+    """
+    Check a collected repository still meets the thresholds of GithubRepositoriesCollector.collect_repositories
+
+    :return: True if the repository meets all the thresholds; False otherwise
+    """
+    return repository.get('stars', 0) >= min_stars \
+        and repository.get('releases', 0) >= min_releases \
+        and repository.get('watchers', 0) >= min_watchers \
+        and repository.get('issues', 0) >= min_issues
+
+
+def merge(previous, changed,
+          min_stars: int = 0,
+          min_releases: int = 0,
+          min_watchers: int = 0,
+          min_issues: int = 0):
+    """
+    Merge the repositories changed since a dataset was collected into the dataset, by repository id.
+    Repositories that no longer meet the thresholds are dropped.
+
+    :param previous: an iterable of the repositories of the dataset
+    :param changed: an iterable of the repositories collected since then
+    :return: a generator of the repositories of the updated dataset: the previous ones first, in their order, then the
+    new ones
+    """
+    changed = {repo['id']: repo for repo in changed}
+
+    def keep(repo):
+        return matches(repo,
+                       min_stars=min_stars,
+                       min_releases=min_releases,
+                       min_watchers=min_watchers,
+                       min_issues=min_issues)
+
+    for repo in previous:
+        repo = changed.pop(repo['id'], repo)
+
+        if keep(repo):
+            yield repo
+
+    for repo in changed.values():
+        if keep(repo):
+            yield repo
+
+
+def _read_json(path: str, chunk_size: int = 2 ** 20):
+    """
+    Stream the repositories of a JSON array, a chunk of the file at a time
+    """
+    decoder = json.JSONDecoder()
+
+    with io.open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f'{path} is not a JSON array')
+
+        position = 1
+
+        while True:
+            while position < len(buffer) and buffer[position] in ', \t\r\n':
+                position += 1
+
+            if buffer.startswith(']', position):
+                return
+
+            try:
+                repository, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The repository spans the end of the buffer
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    # An array left open by a run that was interrupted: its last repository may be truncated
+                    return
+
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield repository
+
+
+def _read_jsonl(path: str):
+    with io.open(path, 'rb') as f:
+        for line in f:
+            try:
+                yield codec.loads(line)
+            except ValueError:
+                # The last line of a writer killed while writing, e.g., a worker of a distributed harvest
+                continue
+
+
+def _read_csv(path: str):
+    with io.open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            # CSVWriter writes None as an empty string, and joins the root directories by semicolons. Descriptions
+            # are never None: filter_repositories replaces the missing ones with empty strings
+            yield {field: (value.split(';') if value else []) if field == 'dirs'
+                   else value if field == 'description'
+                   else None if not value
+                   else int(value) if field in NUMERIC_FIELDS
+                   else value for field, value in row.items()}
+
+
+def _read_parquet(path: str):
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is required to read Parquet files: pip install pyarrow')
+
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches():
+        yield from batch.to_pylist()
+
+
+def _read_sqlite(path: str):
+    from repocollector.store import RepositoryStore
+
+    store = RepositoryStore(path)
+
+    try:
+        yield from store.query(order_by='id')
+    finally:
+        store.close()
+
+
+# The readers by output format, i.e., the extension of the output file
+READERS = {
+    'json': _read_json,
+    'jsonl': _read_jsonl,
+    'csv': _read_csv,
+    'parquet': _read_parquet,
+    'sqlite': _read_sqlite
+}
+
+
+def read(path: str):
+    """
+    Stream the repositories of an output of the collector, without loading it in memory
+
+    :param path: the path to a repositories.<format> file, whose format is one of READERS, or to a partition of a
+    distributed harvest (.jsonl)
+    :return: a generator of the repositories in the file, as mappings
+    """
+    fmt = os.path.splitext(path)[1][1:].lower()
+
+    if fmt not in READERS:
+        raise ValueError(f'Cannot read {path}: the format must be one of {", ".join(READERS)}')
+
+    return READERS[fmt](path)
+
+
+class MergeIndex:
+    """
+    A disk-backed index of repositories by id, to merge outputs of any size in bounded memory: repositories are
+    upserted into a temporary SQLite table keyed on their id, which keeps the most recently pushed version of each
+    one, as a JSON array of its FIELDS. Memory is bounded by the page cache of SQLite and a batch of repositories,
+    whatever the number of repositories.
+    """
+
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS repositories (id INTEGER PRIMARY KEY, pushed_at TEXT, issues INTEGER, ' \
+             'releases INTEGER, stars INTEGER, watchers INTEGER, data BLOB)'
+
+    # Ties go to the repository added last, as in merge()
+    UPSERT = 'INSERT INTO repositories VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET ' \
+             'pushed_at = excluded.pushed_at, issues = excluded.issues, releases = excluded.releases, ' \
+             'stars = excluded.stars, watchers = excluded.watchers, data = excluded.data ' \
+             'WHERE excluded.pushed_at >= repositories.pushed_at'
+
+    def __init__(self, path: str = None, directory: str = None, batch_size: int = 10000, cache_size: int = 64):
+        """
+        :param path: the path to the SQLite file of the index; by default, a temporary file removed on close
+        :param directory: the folder of the temporary file (default: the temporary folder of the system)
+        :param batch_size: the number of repositories to upsert per statement
+        :param cache_size: the page cache of SQLite, in MiB
+        """
+        if path is None:
+            descriptor, path = tempfile.mkstemp(prefix='repositories.merge.', suffix='.sqlite', dir=directory)
+            os.close(descriptor)
+            self._temporary = True
+        else:
+            self._temporary = False
+
+        self.path = path
+        self._batch_size = batch_size
+
+        self._connection = sqlite3.connect(path)
+        # The index is scratch space: a crash loses it, and the merge is run again
+        self._connection.execute('PRAGMA journal_mode = OFF')
+        self._connection.execute('PRAGMA synchronous = OFF')
+        self._connection.execute(f'PRAGMA cache_size = {-cache_size * 1024}')
+        self._connection.execute(self.SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+        if self._temporary:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM repositories').fetchone()[0]
+
+    def _upsert(self, batch: list):
+        with self._connection:
+            self._connection.executemany(self.UPSERT, batch)
+
+    def add(self, repositories) -> int:
+        """
+        Add repositories to the index. A repository replaces the one with the same id unless it was pushed earlier.
+
+        :param repositories: an iterable of repositories, e.g., read() from an output
+        :return: the number of repositories read
+        """
+        batch = []
+        count = 0
+
+        for repository in repositories:
+            pushed_at = repository.get('pushed_at')
+            # Unknown push dates (None, or 'None' in older outputs) are the oldest
+            pushed_at = pushed_at if pushed_at and pushed_at[0].isdigit() else ''
+
+            batch.append((repository['id'], pushed_at, repository.get('issues'), repository.get('releases'),
+                          repository.get('stars'), repository.get('watchers'),
+                          codec.dumps([repository.get(field) for field in FIELDS])))
+
+            if len(batch) >= self._batch_size:
+                self._upsert(batch)
+                count += len(batch)
+                batch = []
+
+        self._upsert(batch)
+
+        return count + len(batch)
+
+    def repositories(self,
+                     min_stars: int = 0,
+                     min_releases: int = 0,
+                     min_watchers: int = 0,
+                     min_issues: int = 0):
+        """
+        Stream the repositories of the index, by id. The thresholds apply to the most recent version of every
+        repository: a repository that no longer meets them is dropped, even if an earlier version did.
+
+        :return: a generator of Repository records
+        """
+        rows = self._connection.execute('SELECT data FROM repositories WHERE COALESCE(stars, 0) >= ? '
+                                        'AND COALESCE(releases, 0) >= ? AND COALESCE(watchers, 0) >= ? '
+                                        'AND COALESCE(issues, 0) >= ? ORDER BY id',
+                                        (min_stars, min_releases, min_watchers, min_issues))
+
+        for data, in rows:
+            yield Repository(*codec.loads(data))
+
+
+def merge_outputs(paths: list,
+                  min_stars: int = 0,
+                  min_releases: int = 0,
+                  min_watchers: int = 0,
+                  min_issues: int = 0,
+                  directory: str = None):
+    """
+    Merge outputs of the collector (e.g., runs over different periods or languages, the partitions of a distributed
+    harvest) into a dataset, by repository id, in bounded memory: the most recently pushed version of every repository
+    is kept, and the repositories that do not meet the thresholds are dropped.
+
+    :param paths: the paths to the outputs, as accepted by read()
+    :param directory: the folder of the temporary index (default: the temporary folder of the system)
+    :return: a generator of Repository records, by id. The outputs are all read before the first one is yielded.
+    """
+    with MergeIndex(directory=directory) as index:
+        for path in paths:
+            index.add(read(path))
+
+        yield from index.repositories(min_stars=min_stars,
+                                      min_releases=min_releases,
+                                      min_watchers=min_watchers,
+                                      min_issues=min_issues)
@@ -0,0 +1,313 @@
+"""
+A module to spread a harvest across worker processes, on one or several machines: a coordinator plans the shards of the
+harvest into a ShardQueue, workers lease the shards and write their repositories to a partition each, and merge()
+deduplicates the partitions
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from repocollector import dataset
+from repocollector.checkpoint import ShardJournal, criteria
+from repocollector.writers import JSONLinesWriter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS shards (id INTEGER PRIMARY KEY, job INTEGER, since TEXT, until TEXT, end_cursor TEXT,
+                                   done INTEGER DEFAULT 0, worker TEXT, expires REAL, leases INTEGER DEFAULT 0);
+CREATE INDEX IF NOT EXISTS shards_done ON shards (done, expires);
+"""
+
+
+class ShardQueue(ShardJournal):
+    """
+    A durable queue of the shards of a harvest, in a SQLite file shared by the coordinator and the workers. Workers
+    lease shards for a while, renew their leases while they work on them, and record the endCursor of every page, so
+    that the shards of a worker that crashed are leased again, from their last page, once their leases expire.
+
+    The file can sit on a filesystem shared by several machines, provided it supports locks (SQLite does not use a
+    write-ahead log here for that reason). Leases are timestamped with the clock of the workers, which must agree
+    within a fraction of the lease duration.
+    """
+
+    kind = 'queue'
+
+    def __init__(self, path: str, lease_seconds: float = 300, max_leases: int = 5):
+        """
+        :param path: the path to the SQLite file; it is created if it does not exist
+        :param lease_seconds: how long a shard stays leased without a heartbeat of its worker
+        :param max_leases: how many times a shard is leased before it is failed, e.g., because GitHub keeps failing on
+        it or because it crashes its workers
+        """
+        # Transactions are explicit, and the connection is shared with the heartbeat thread of the worker
+        super().__init__(path, sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False))
+        self.lease_seconds = lease_seconds
+        self.max_leases = max_leases
+        self._lock = threading.Lock()
+
+        self._connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Run statements in a transaction holding the write lock of the file from the start, so that two workers never
+        lease the same shard
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+
+            self._connection.execute('COMMIT')
+
+    def lease(self, worker: str, count: int = 1) -> list:
+        """
+        Lease the next shards: the ones never leased, or whose lease expired, unless they failed
+
+        :param worker: the name of the worker
+        :param count: the maximum number of shards to lease
+        :return: a list of (id, job, since, until, end_cursor) tuples, as accepted by
+        GithubRepositoriesCollector.collect_shards(); empty if no shard is available
+        """
+        now = time.time()
+
+        with self._transaction() as connection:
+            rows = connection.execute('SELECT id, job, since, until, end_cursor FROM shards '
+                                      'WHERE done = 0 AND leases < ? AND (expires IS NULL OR expires < ?) '
+                                      'ORDER BY id LIMIT ?',
+                                      (self.max_leases, now, count)).fetchall()
+
+            connection.executemany('UPDATE shards SET worker = ?, expires = ?, leases = leases + 1 WHERE id = ?',
+                                   [(worker, now + self.lease_seconds, shard_id) for shard_id, *_ in rows])
+
+        return [(shard_id, job, datetime.fromisoformat(since), datetime.fromisoformat(until), end_cursor)
+                for shard_id, job, since, until, end_cursor in rows]
+
+    def heartbeat(self, worker: str) -> int:
+        """
+        Renew the leases of a worker
+
+        :param worker: the name of the worker
+        :return: the number of leases renewed
+        """
+        with self._transaction() as connection:
+            return connection.execute('UPDATE shards SET expires = ? WHERE worker = ? AND done = 0',
+                                      (time.time() + self.lease_seconds, worker)).rowcount
+
+    def save_page(self, shard_id: int, worker: str, end_cursor: str, has_next_page: bool) -> bool:
+        """
+        Record the progress of a shard
+
+        :param shard_id: the shard the page belongs to
+        :param worker: the name of the worker holding the lease
+        :param end_cursor: the endCursor of the page
+        :param has_next_page: whether the shard has more pages
+        :return: False if the worker lost the lease, i.e., the shard was leased by another worker in the meantime
+        """
+        with self._transaction() as connection:
+            return bool(connection.execute('UPDATE shards SET end_cursor = ?, done = ? WHERE id = ? AND worker = ?',
+                                           (end_cursor, int(not has_next_page), shard_id, worker)).rowcount)
+
+    def release(self, worker: str):
+        """
+        Give the unfinished shards of a worker back to the queue, e.g., when it stops
+
+        :param worker: the name of the worker
+        """
+        with self._transaction() as connection:
+            connection.execute('UPDATE shards SET worker = NULL, expires = NULL WHERE worker = ? AND done = 0',
+                               (worker,))
+
+    def retry_failed(self) -> int:
+        """
+        Give the failed shards another max_leases leases, e.g., once GitHub recovered
+
+        :return: the number of shards given back to the queue
+        """
+        with self._transaction() as connection:
+            return connection.execute('UPDATE shards SET leases = 0 WHERE done = 0 AND leases >= ? AND '
+                                      '(expires IS NULL OR expires < ?)', (self.max_leases, time.time())).rowcount
+
+    def progress(self) -> dict:
+        """
+        :return: whether the harvest is planned, and its number of shards, done, leased, failed (leased max_leases
+        times without being done) and pending
+        """
+        with self._lock:
+            planned = bool(self._connection.execute("SELECT COUNT(*) FROM meta WHERE key = 'criteria'").fetchone()[0])
+            total, done, leased, failed = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(done), 0), COALESCE(SUM(done = 0 AND expires >= ?), 0), '
+                'COALESCE(SUM(done = 0 AND leases >= ? AND (expires IS NULL OR expires < ?)), 0) FROM shards',
+                (time.time(), self.max_leases, time.time())).fetchone()
+
+        return dict(planned=planned, shards=total, done=done, leased=leased, failed=failed,
+                    pending=total - done - leased - failed)
+
+    def finished(self) -> bool:
+        """
+        :return: True if the harvest is planned and every shard is either done or failed
+        """
+        progress = self.progress()
+        return progress['planned'] and not progress['leased'] and not progress['pending']
+
+
+def coordinate(github, queue: ShardQueue, jobs: list, dirs: bool = True) -> int:
+    """
+    Plan the shards of a harvest into a queue, for workers to collect them. Planning a queue that already holds the
+    shards of the same harvest gives its failed shards another chance instead.
+
+    :param github: a GithubRepositoriesCollector, to count the repositories of the candidate shards
+    :param queue: the queue of the harvest
+    :param jobs: a list of dictionaries of criteria, as accepted by GithubRepositoriesCollector.collect_many()
+    :param dirs: collect the root directories of the repositories (default: True)
+    :return: the number of shards of the harvest
+    """
+    harvest = criteria(jobs, dirs)
+
+    # The criteria are recorded along with the shards, so that the queue never looks finished to the workers before
+    # the harvest is planned
+    if queue.start(harvest):
+        queue.retry_failed()
+    else:
+        queue.save_plans(harvest, github.plan_many(jobs))
+
+    return queue.progress()['shards']
+
+
+class Worker:
+    """
+    A worker of a distributed harvest: it leases shards from the queue, collects them and appends their repositories
+    to its partition, <dest>/<name>.jsonl, until the queue is finished. A thread renews its leases meanwhile.
+
+    Pages are written to the partition before they are recorded in the queue, so that a worker crashing in between
+    only causes the page to be collected again: partitions may overlap, and merge() deduplicates them.
+    """
+
+    def __init__(self, github, queue: ShardQueue, dest: str, name: str = None, lease_size: int = 1,
+                 poll_seconds: float = 1):
+        """
+        :param github: the GithubRepositoriesCollector of the worker, with its own token(s)
+        :param queue: the queue of the harvest, planned by coordinate()
+        :param dest: the folder of the partitions
+        :param name: the name of the worker, unique across the harvest (default: <hostname>-<pid>)
+        :param lease_size: the number of shards to lease at once, e.g., the concurrency times the batch size of github
+        :param poll_seconds: how long to wait for the leases of other workers to expire, when no shard is available
+        """
+        self.github = github
+        self.queue = queue
+        self.name = name or f'{socket.gethostname()}-{os.getpid()}'
+        self.path = os.path.join(dest, f'{self.name}.jsonl')
+        self.lease_size = lease_size
+        self.poll_seconds = poll_seconds
+
+        self.repositories = 0
+        self.pages = 0
+
+        self._stop = threading.Event()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            self.queue.heartbeat(self.name)
+
+    def run(self, verbose: bool = False) -> int:
+        """
+        Collect shards until the queue is finished, i.e., until every shard is done or failed. A worker started
+        before the harvest is planned waits for it.
+
+        :param verbose: print the progress of the queue after every lease
+        :return: the number of repositories written to the partition
+        """
+        harvest = self.queue.criteria()
+
+        while harvest is None:
+            # The coordinator is still planning the harvest
+            if verbose:
+                print(f'{self.name}: waiting for the harvest to be planned in {self.queue.path}')
+
+            time.sleep(self.poll_seconds)
+            harvest = self.queue.criteria()
+
+        jobs = [dict(job, **{key: datetime.fromisoformat(job[key]) for key in ('since', 'until', 'pushed_after')})
+                for job in harvest['jobs']]
+
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+
+        # The partition is appended to, so that a worker restarted under the same name keeps its previous pages
+        writer = JSONLinesWriter(self.path, append=True)
+
+        try:
+            while True:
+                windows = self.queue.lease(self.name, self.lease_size)
+
+                if not windows:
+                    if self.queue.finished():
+                        break
+
+                    # The shards left are leased by other workers: they come back if these crash
+                    time.sleep(self.poll_seconds)
+                    continue
+
+                done = 0
+
+                for shard_id, end_cursor, has_next_page, repositories in \
+                        self.github.collect_shards(jobs, windows, dirs=harvest['dirs'], records=True):
+                    for repository in repositories:
+                        writer.write(repository)
+                    writer.flush()
+
+                    self.repositories += len(repositories)
+                    self.pages += 1
+                    done += not has_next_page
+
+                    if not self.queue.save_page(shard_id, self.name, end_cursor, has_next_page):
+                        # The lease expired and the shard went to another worker: lease new shards instead
+                        break
+
+                # The shards the collector gave up on (e.g., GitHub kept failing) are still leased, and the heartbeat
+                # would renew their leases forever: give them back, to be collected again from their last page, until
+                # they run out of leases
+                self.queue.release(self.name)
+
+                if done < len(windows):
+                    time.sleep(self.poll_seconds)
+
+                if verbose:
+                    print(f'{self.name}: {self.repositories} repositories in {self.pages} pages, '
+                          f'{self.queue.progress()}')
+        finally:
+            self._stop.set()
+            writer.close()
+            self.queue.release(self.name)
+
+        return self.repositories
+
+
+def partitions(dest: str) -> list:
+    """
+    :param dest: the folder of the partitions
+    :return: the paths to the partitions written by the workers in the folder
+    """
+    return sorted(os.path.join(dest, filename) for filename in os.listdir(dest) if filename.endswith('.jsonl'))
+
+
+def merge(paths: list, directory: str = None):
+    """
+    Stream the repositories of several partitions, deduplicated on the repository id in bounded memory. The last line
+    of a worker killed while writing is skipped: its page was not recorded, and was collected again.
+
+    :param paths: the paths to the partitions, as JSON lines
+    :param directory: the folder of the temporary index (default: the temporary folder of the system)
+    :return: a generator of Repository records, by id
+    """
+    return dataset.merge_outputs(paths, directory=directory)
@@ -2,39 +2,180 @@
 A module to mine Github to extract relevant repositories based on given criteria
 """
 
-import re
-import requests
-from datetime import datetime
-
-QUERY_TEMPLATE = """{ search(query: "is:public stars:>=MIN_STARS mirror:false archived:false created:SINCE..UNTIL 
-pushed:>=PUSHED_AFTER LANGUAGE:LANGUAGE", type: REPOSITORY, first: 50 AFTER) { repositoryCount pageInfo { endCursor startCursor 
-hasNextPage } edges { node { ... on Repository { databaseId defaultBranchRef { name } owner { login } name url description 
-primaryLanguage { name } stargazers { totalCount } watchers { totalCount } releases { totalCount } issues { 
-totalCount } createdAt pushedAt updatedAt hasIssuesEnabled isArchived isDisabled isMirror isFork object(expression: 
-"master:") { ... on Tree { entries { name type } } } } } } } 
-
-    rateLimit {
-        limit
-        cost
-        remaining
-        resetAt
-    }
-}
-"""
+import queue
+import threading
+import time
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from repocollector import codec, queries
+from repocollector.cache import ResponseCache
+from repocollector.checkpoint import Checkpoint, criteria as harvest_criteria
+from repocollector.paging import AdaptivePageSize
+from repocollector.queries import DIRS_FIELDS, GRAPHQL_URL, HEAVY_FIELDS
+from repocollector.records import Repository, batches
+from repocollector.ratelimit import TokenPool, backoff
+
+# GitHub stops paginating a search after this number of results
+SEARCH_LIMIT = 1000
+
+# Units used to split a created-at window that exceeds SEARCH_LIMIT, from the coarsest to the finest
+SHARD_UNITS = (timedelta(days=1), timedelta(hours=1), timedelta(minutes=1))
+
+# nodes(ids:) accepts up to 100 ids
+MAX_NODES = 100
+
+# The status codes GitHub answers when a query is too heavy to complete in time, or is temporarily unavailable
+SERVER_ERRORS = (502, 503, 504)
+
+
+class TransportError(Exception):
+    """
+    Raised by Transport when a request fails before a response is received, e.g., on timeouts
+    """
+
+
+class ServerError(Exception):
+    """
+    Raised by GithubRepositoriesCollector._post when GitHub times out or fails with a 5xx, and the caller asked to
+    handle these failures itself (e.g., to retry with a smaller page)
+    """
+
+
+class PlanningError(Exception):
+    """
+    Raised by GithubRepositoriesCollector when a created-at window cannot be counted, even after retrying its probe:
+    the window cannot be planned, since it may hold more repositories than a single shard can return
+    """
+
+
+class Transport:
+    """
+    The HTTP transport of the GraphQL client: a persistent connection pool shared by all the requests (and threads) of
+    a collector, compressed responses, and connect/read timeouts.
+    """
+
+    def __init__(self,
+                 url: str = GRAPHQL_URL,
+                 timeout: tuple = (10, 60),
+                 pool_size: int = 10,
+                 http2: bool = False):
+        """
+        :param url: the GraphQL endpoint, e.g., a local stand-in server
+        :param timeout: the (connect, read) timeouts, in seconds
+        :param pool_size: the maximum number of connections kept alive, i.e., the concurrency of the collector
+        :param http2: multiplex the requests over HTTP/2 connections. Requires httpx[http2]
+        """
+        self.url = url
+        self._timeout = timeout
+        self._headers = {'Accept-Encoding': 'gzip, deflate', 'Content-Type': 'application/json'}
+
+        if http2:
+            try:
+                import httpx
+            except ImportError:
+                raise ImportError('httpx is required for HTTP/2: pip install httpx[http2]')
+
+            self._errors = httpx.HTTPError
+            self._client = httpx.Client(http2=True,
+                                        headers=self._headers,
+                                        timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+                                        limits=httpx.Limits(max_connections=pool_size))
+            self._session = None
+        else:
+            # Imported here, like httpx, so that importing the module (e.g., to run --help) stays fast
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self._errors = requests.RequestException
+            self._session = requests.Session()
+            self._session.headers.update(self._headers)
+            self._session.mount('https://', adapter)
+            self._session.mount('http://', adapter)
+            self._client = None
+
+    def post(self, body: bytes, headers: dict):
+        """
+        :param body: the JSON body of the request
+        :param headers: additional headers, e.g., Authorization
+        :return: the response, with status_code, headers, content, text and json(); raise a TransportError if no
+        response is received
+        """
+        try:
+            if self._client:
+                return self._client.post(self.url, content=body, headers=headers)
+
+            return self._session.post(self.url, data=body, headers=headers, timeout=self._timeout)
+        except self._errors as e:
+            raise TransportError(str(e)) from e
+
+    def close(self):
+        if self._client:
+            self._client.close()
+        else:
+            self._session.close()
 
 
 class GithubRepositoriesCollector:
 
-    def __init__(self, access_token):
+    def __init__(self,
+                 access_token,
+                 concurrency: int = 1,
+                 api_url: str = GRAPHQL_URL,
+                 max_retries: int = 10,
+                 dirs_batch_size: int = 50,
+                 cache: ResponseCache = None,
+                 transport: Transport = None,
+                 page_size: AdaptivePageSize = None,
+                 batch_size: int = 1,
+                 hooks: list = None):
         """
         Crawl GitHub to extract repositories
 
-        :param access_token: the token to query GraphQL (https://help.github.com/en/github/authenticating-to-github/creating-a-personal-access-token-for-the-command-line)
+        :param access_token: the token to query GraphQL (https://help.github.com/en/github/authenticating-to-github/creating-a-personal-access-token-for-the-command-line),
+        or a list of tokens to spread the requests across
+        :param concurrency: the number of shards fetched in parallel (default: 1, i.e., one page after another)
+        :param api_url: the GraphQL endpoint (default: https://api.github.com/graphql)
+        :param max_retries: the number of times a rate-limited request is retried before giving up
+        :param dirs_batch_size: the number of repositories whose root directories are fetched per request. Root trees
+        can be large: smaller batches keep the responses small (at most 100)
+        :param cache: serve the responses from this cache when possible, and store the new ones in it
+        :param transport: the HTTP transport (default: a Transport to api_url with a pool of <concurrency> connections)
+        :param page_size: the page size of the search queries, shared by all the shards (default: an AdaptivePageSize
+        from 100 down to 10 repositories per page)
+        :param batch_size: the number of shards (or count probes) sent per request, under GraphQL aliases (default: 1).
+        Larger batches save round trips and quota when many shards are collected, e.g., several languages at once
+        :param hooks: callbacks notified of the events of the collector (see add_hook())
         """
 
-        self._token = access_token
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+
+        if not 1 <= dirs_batch_size <= MAX_NODES:
+            raise ValueError(f'dirs_batch_size must be between 1 and {MAX_NODES}')
+
+        tokens = [access_token] if isinstance(access_token, str) else list(access_token)
+
+        self._tokens = TokenPool(tokens)
+        self._max_retries = max_retries
+        self._dirs_batch_size = dirs_batch_size
+        self._cache = cache
+        self._concurrency = concurrency
+        self._transport = transport or Transport(url=api_url, pool_size=concurrency)
+        self._page_size = page_size or AdaptivePageSize()
+        self._batch_size = batch_size
+        self._hooks = list(hooks or [])
         self._quota = 0
         self._quota_reset_at = None
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
 
     @property
     def quota(self):
@@ -44,6 +185,108 @@ class GithubRepositoriesCollector:
     def quota_reset_at(self):
         return self._quota_reset_at
 
+    @property
+    def stats(self) -> dict:
+        """
+        The counters of the requests sent so far: <stage>_requests, <stage>_bytes and <stage>_points for the count,
+        search, nodes and dirs stages, <stage>_cache_hits for the responses served from the cache, and
+        <stage>_server_errors for the timeouts and 5xx; repositories_scanned (returned by the search pages) and
+        repositories_enriched (whose heavy fields were fetched by the two-phase fetch); shards_failed, the shards given
+        up on after max_retries failures, whose remaining pages were not collected.
+        estimated_bytes_saved is the bandwidth the two-phase fetch saved by not fetching the heavy fields of the
+        repositories that failed the thresholds.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        discarded = stats.get('repositories_scanned', 0) - stats.get('repositories_enriched', 0)
+        if stats.get('repositories_enriched'):
+            stats['estimated_bytes_saved'] = int(discarded * stats.get('nodes_bytes', 0)
+                                                 / stats['repositories_enriched'])
+        else:
+            stats['estimated_bytes_saved'] = 0
+
+        return stats
+
+    def _increment(self, **counters):
+        with self._stats_lock:
+            self._stats.update(counters)
+
+    def add_hook(self, hook):
+        """
+        Register a callback, called as hook(event, **fields) for every event of the collector, from the threads the
+        events happen on (e.g., a repocollector.metrics.Metrics). The events are:
+        - request (stage, status, seconds, size, cost): an HTTP request and its latency, response size and points
+        - retry (stage, reason): a request retried after a transport_error, server_error or rate_limited, or a count
+          probe run again after it failed (probe_failed)
+        - cache_hit (stage): a response served from the cache
+        - page (shard, scanned, done): a search page and the number of repositories it returned
+        - shard_failed (shard, reason): a shard given up on after max_retries failures
+        - repositories (kept): the repositories of a page that met the criteria and were emitted
+        - stage (name, seconds): the time spent in the plan, decode, enrich, filter or checkpoint stage
+
+        :param hook: a callable; it must be thread-safe when concurrency > 1
+        """
+        self._hooks.append(hook)
+
+    def _emit(self, event: str, **fields):
+        for hook in self._hooks:
+            hook(event, **fields)
+
+    @contextmanager
+    def _timed(self, stage: str):
+        if not self._hooks:
+            yield
+            return
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self._emit('stage', name=stage, seconds=time.perf_counter() - start)
+
+    @staticmethod
+    def passes_thresholds(node: dict,
+                          min_issues: int = 0,
+                          min_releases: int = 0,
+                          min_watchers: int = 0) -> bool:
+        """
+        Check the predicates that cannot be expressed in the search string
+
+        :param node: a Repository node
+        :return: True if the repository meets the thresholds and is not a disabled, locked, template or fork
+        repository; False otherwise
+        """
+        has_issues_enabled = node.get('hasIssuesEnabled', True)
+        issues = node['issues']['totalCount'] if node['issues'] else 0
+        releases = node['releases']['totalCount'] if node['releases'] else 0
+        watchers = node['watchers']['totalCount'] if node['watchers'] else 0
+        is_disabled = node.get('isDisabled', False)
+        is_fork = node.get('isFork', False)
+        is_locked = node.get('isLocked', False)
+        is_template = node.get('isTemplate', False)
+
+        if min_issues and not has_issues_enabled:
+            return False
+
+        if issues < min_issues:
+            return False
+
+        if releases < min_releases:
+            return False
+
+        if watchers < min_watchers:
+            return False
+
+        if is_disabled or is_locked or is_template:
+            return False
+
+        if is_fork:
+            return False
+
+        return True
+
     @staticmethod
     def filter_repositories(edges,
                             min_issues: int = 0,
@@ -57,47 +300,29 @@ class GithubRepositoriesCollector:
             if not node:
                 continue
 
-            has_issues_enabled = node.get('hasIssuesEnabled', True)
+            if not GithubRepositoriesCollector.passes_thresholds(node,
+                                                                 min_issues=min_issues,
+                                                                 min_releases=min_releases,
+                                                                 min_watchers=min_watchers):
+                continue
+
             issues = node['issues']['totalCount'] if node['issues'] else 0
             releases = node['releases']['totalCount'] if node['releases'] else 0
             stars = node['stargazers']['totalCount'] if node['stargazers'] else 0
             watchers = node['watchers']['totalCount'] if node['watchers'] else 0
-            is_disabled = node.get('isDisabled', False)
-            is_fork = node.get('isFork', False)
-            is_locked = node.get('isLocked', False)
-            is_template = node.get('isTemplate', False)
             primary_language = node['primaryLanguage']['name'].lower() if node['primaryLanguage'] else ''
 
-            if min_issues and not has_issues_enabled:
-                continue
-
-            if issues < min_issues:
-                continue
-
-            if releases < min_releases:
-                continue
-
-            if watchers < min_watchers:
-                continue
-
-            if is_disabled or is_locked or is_template:
-                continue
-
-            if is_fork:
-                continue
-
-            object = node.get('object')
-            if not object:
-                continue
-
-            dirs = [entry.get('name') for entry in object.get('entries', []) if entry.get('type') == 'tree']
+            # The root tree is fetched by the directory enrichment (or by object(expression:) in custom queries)
+            default_branch = node.get('defaultBranchRef') or {}
+            tree = (default_branch.get('target') or {}).get('tree') or node.get('object') or {}
+            dirs = [entry.get('name') for entry in tree.get('entries') or [] if entry.get('type') == 'tree']
 
             owner = node.get('owner', {}).get('login', '')
             name = node.get('name', '')
 
-            yield dict(
+            yield Repository(
                 id=node.get('databaseId'),
-                default_branch=node.get('defaultBranchRef', {}).get('name'),
+                default_branch=default_branch.get('name'),
                 owner=owner,
                 name=name,
                 full_name=f'{owner}/{name}',
@@ -113,6 +338,584 @@ class GithubRepositoriesCollector:
                 dirs=dirs
             )
 
+    @staticmethod
+    def search_string(since: datetime,
+                      until: datetime,
+                      pushed_after: datetime,
+                      min_stars: int = 0,
+                      primary_language: str = None) -> str:
+        """
+        Build the GitHub search string for the given criteria
+
+        :return: a search string, e.g., "is:public stars:>=0 ... created:2020-01-01T00:00:00Z..2020-12-31T00:00:00Z ..."
+        """
+        return queries.search_string(since=since.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                     until=until.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                     pushed_after=pushed_after.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                     min_stars=min_stars,
+                                     primary_language=primary_language)
+
+    @staticmethod
+    def _job(since: datetime,
+             until: datetime,
+             pushed_after: datetime,
+             min_stars: int = 0,
+             min_releases: int = 0,
+             min_watchers: int = 0,
+             min_issues: int = 0,
+             primary_language: str = None) -> dict:
+        """
+        :return: the criteria of a job of collect_many(), with their defaults
+        """
+        return dict(since=since,
+                    until=until,
+                    pushed_after=pushed_after,
+                    min_stars=min_stars,
+                    min_releases=min_releases,
+                    min_watchers=min_watchers,
+                    min_issues=min_issues,
+                    primary_language=primary_language)
+
+    @staticmethod
+    def split_window(since: datetime, until: datetime):
+        """
+        Split a created-at window in two halves aligned to the coarsest unit (days, hours, minutes) that fits twice
+        in the window
+
+        :return: a pair of (since, until) windows; None if the window cannot be split further
+        """
+        span = until - since
+
+        for unit in SHARD_UNITS:
+            if span >= 2 * unit:
+                middle = since + unit * (span // unit // 2)
+                return (since, middle - timedelta(seconds=1)), (middle, until)
+
+        return None
+
+    def _post(self, query: str, variables: dict = None, stage: str = 'search', raise_server_errors: bool = False):
+        """
+        Run a GraphQL query and keep track of the remaining quota. Requests are paced so that the quota lasts until it
+        resets; rate-limited requests wait for the reset (primary limit) or back off (secondary limits) and are retried.
+        Timeouts and 5xx are retried with a backoff too, unless raise_server_errors is True.
+
+        :param query: the GraphQL document, built by repocollector.queries
+        :param variables: the values of the variables of the document
+        :param stage: the stage the query belongs to (count, search, nodes, dirs), to account for its requests in stats
+        :param raise_server_errors: raise a ServerError on the first timeout or 5xx instead of retrying the query
+        :return: the data of the response; None if the query failed
+        """
+        key = self._cache.key(self._transport.url, query, variables) if self._cache else None
+        cached = self._cache.get(key) if self._cache else None
+
+        if cached and cached.fresh:
+            self._increment(**{f'{stage}_cache_hits': 1})
+            self._emit('cache_hit', stage=stage)
+            return codec.loads(cached.body).get('data')
+
+        # Expired responses with an ETag are revalidated rather than downloaded again
+        headers = {'If-None-Match': cached.etag} if cached and cached.etag else {}
+
+        body = codec.dumps({'query': query, 'variables': variables} if variables else {'query': query})
+
+        for attempt in range(self._max_retries + 1):
+            token = self._tokens.acquire()
+
+            start = time.perf_counter()
+
+            try:
+                response = self._transport.post(body, headers={'Authorization': f'token {token}', **headers})
+            except TransportError as e:
+                self._increment(**{f'{stage}_server_errors': 1})
+                self._emit('request', stage=stage, status='error', seconds=time.perf_counter() - start, size=0)
+
+                if raise_server_errors:
+                    raise ServerError(str(e))
+
+                if attempt < self._max_retries:
+                    self._emit('retry', stage=stage, reason='transport_error')
+                    time.sleep(backoff(attempt))
+                    continue
+
+                print(f'Query failed to run: {e}')
+                return None
+
+            seconds = time.perf_counter() - start
+
+            if response.status_code != 200:
+                self._emit('request', stage=stage, status=response.status_code, seconds=seconds,
+                           size=len(response.content))
+
+            if response.status_code == 304 and cached:
+                self._cache.refresh(key)
+                self._increment(**{f'{stage}_cache_hits': 1})
+                self._emit('cache_hit', stage=stage)
+                return codec.loads(cached.body).get('data')
+
+            if response.status_code in (403, 429) and attempt < self._max_retries:
+                wait = self._rate_limited(token, response, attempt)
+
+                if wait is not None:
+                    self._emit('retry', stage=stage, reason='rate_limited')
+                    time.sleep(wait)
+                    continue
+
+            if response.status_code in SERVER_ERRORS:
+                self._increment(**{f'{stage}_server_errors': 1})
+
+                if raise_server_errors:
+                    raise ServerError(f'status code {response.status_code}')
+
+                if attempt < self._max_retries:
+                    self._emit('retry', stage=stage, reason='server_error')
+                    time.sleep(backoff(attempt))
+                    continue
+
+            if response.status_code != 200:
+                print("Query failed to run and returned status code {}: {} {}".format(response.status_code, query,
+                                                                                     variables))
+                return None
+
+            self._increment(**{f'{stage}_requests': 1, f'{stage}_bytes': len(response.content)})
+
+            # Decoded straight from the raw bytes, skipping the text decoding (and charset detection) of requests
+            with self._timed('decode'):
+                result = codec.loads(response.content)
+
+            self._emit('request', stage=stage, status=200, seconds=seconds, size=len(response.content),
+                       cost=((result.get('data') or {}).get('rateLimit') or {}).get('cost'))
+
+            if any(error.get('type') == 'RATE_LIMITED' for error in result.get('errors') or []) \
+                    and attempt < self._max_retries:
+                # The next acquire() waits for the reset, or picks another token
+                reset_at = response.headers.get('X-RateLimit-Reset')
+                self._tokens.limiter(token).exhaust(float(reset_at) if reset_at else None)
+                self._emit('retry', stage=stage, reason='rate_limited')
+                continue
+
+            data = result.get('data')
+
+            if not data and any('timeout' in (error.get('message') or '') for error in result.get('errors') or []):
+                # GitHub answers 200 with a null data when the query timed out on its side
+                self._increment(**{f'{stage}_server_errors': 1})
+
+                if raise_server_errors:
+                    raise ServerError(result['errors'][0]['message'])
+
+                if attempt < self._max_retries:
+                    self._emit('retry', stage=stage, reason='server_error')
+                    time.sleep(backoff(attempt))
+                    continue
+
+            if not data:
+                return None
+
+            if data.get('rateLimit'):
+                self._tokens.limiter(token).update(limit=data['rateLimit']['limit'],
+                                                   cost=data['rateLimit']['cost'],
+                                                   remaining=data['rateLimit']['remaining'],
+                                                   reset_at=data['rateLimit']['resetAt'])
+                self._quota = self._tokens.remaining
+                self._quota_reset_at = data['rateLimit']['resetAt']
+                self._increment(**{f'{stage}_points': int(data['rateLimit']['cost'])})
+
+            if self._cache and not result.get('errors'):
+                self._cache.put(key, response.content, etag=response.headers.get('ETag'))
+
+            return data
+
+        return None
+
+    def _rate_limited(self, token: str, response, attempt: int):
+        """
+        Inspect a response rejected by GitHub
+
+        :return: the seconds to wait before retrying; None if the response is not due to a rate limit
+        """
+        headers = response.headers
+
+        if headers.get('Retry-After'):
+            return backoff(attempt, retry_after=float(headers['Retry-After']))
+
+        if headers.get('X-RateLimit-Remaining') == '0':
+            # Primary rate limit
+            reset_at = headers.get('X-RateLimit-Reset')
+            self._tokens.limiter(token).exhaust(float(reset_at) if reset_at else None)
+            return 0
+
+        if response.status_code == 429 or 'rate limit' in response.text.lower():
+            return backoff(attempt)
+
+        return None
+
+    def count_repositories(self, search: str):
+        """
+        Run a count-only probe query, which costs far less than fetching a page of repositories
+
+        :param search: a search string, as returned by search_string()
+        :return: the number of repositories matching the search; None if the query failed
+        """
+        return self._count_many([search])[0]
+
+    def _count_many(self, searches: list) -> list:
+        """
+        Run count-only probes, <batch_size> per request. With concurrency > 1, the requests run in parallel.
+
+        :param searches: a list of search strings
+        :return: the number of repositories matching each search, in order; None where a query failed
+        """
+        def count(batch):
+            data = self._post(queries.count_query(len(batch)),
+                              {f'query{i}': search for i, search in enumerate(batch)},
+                              stage='count')
+
+            return [int(data[f'c{i}']['repositoryCount']) if data and data.get(f'c{i}') else None
+                    for i in range(len(batch))]
+
+        batches = [searches[i:i + self._batch_size] for i in range(0, len(searches), self._batch_size)]
+
+        if self._concurrency > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+                counts = list(executor.map(count, batches))
+        else:
+            counts = [count(batch) for batch in batches]
+
+        return [window_count for batch_counts in counts for window_count in batch_counts]
+
+    def plan_shards(self,
+                    since: datetime,
+                    until: datetime,
+                    pushed_after: datetime,
+                    min_stars: int = 0,
+                    primary_language: str = None) -> list:
+        """
+        Split the created-at window [since, until] into shards whose results fit under the search limit.
+        Windows exceeding the limit are split (days, then hours, then minutes) until each shard fits, or cannot be
+        split further; empty windows are dropped.
+
+        :return: a chronologically ordered list of (since, until) windows
+        """
+        return self._plan([self._job(since=since,
+                                     until=until,
+                                     pushed_after=pushed_after,
+                                     min_stars=min_stars,
+                                     primary_language=primary_language)])[0]
+
+    def _plan(self, jobs: list) -> list:
+        """
+        Plan the shards of several jobs at once (see plan_shards()). The windows are probed level by level, and the
+        probes of a level are batched together, whatever job they belong to.
+
+        :param jobs: a list of jobs, as returned by _job()
+        :return: a list of chronologically ordered lists of (since, until) windows, one per job; raise a PlanningError
+        if a window cannot be counted after max_retries more probes
+        """
+        shards = [[] for _ in jobs]
+        failures = Counter()
+        windows = [(job, job_criteria['since'], job_criteria['until']) for job, job_criteria in enumerate(jobs)]
+
+        while windows:
+            counts = self._count_many([self.search_string(since=window_since,
+                                                          until=window_until,
+                                                          pushed_after=jobs[job]['pushed_after'],
+                                                          min_stars=jobs[job]['min_stars'],
+                                                          primary_language=jobs[job]['primary_language'])
+                                       for job, window_since, window_until in windows])
+
+            halves = []
+
+            for (job, window_since, window_until), window_count in zip(windows, counts):
+                if window_count is None:
+                    # An unprobed window may exceed the search limit: it is probed again with the next level, rather
+                    # than planned as a single shard
+                    failures[job, window_since, window_until] += 1
+
+                    if failures[job, window_since, window_until] > self._max_retries:
+                        raise PlanningError(f'Window {window_since}..{window_until} could not be counted after '
+                                            f'{failures[job, window_since, window_until]} probes')
+
+                    self._emit('retry', stage='count', reason='probe_failed')
+                    halves.append((job, window_since, window_until))
+                    continue
+
+                if window_count == 0:
+                    continue
+
+                split = self.split_window(window_since, window_until) if window_count > SEARCH_LIMIT else None
+
+                if split:
+                    halves.extend((job, half_since, half_until) for half_since, half_until in split)
+                    continue
+
+                if window_count > SEARCH_LIMIT:
+                    print(f'Window {window_since}..{window_until} has {window_count} repositories and cannot be '
+                          f'split further: only the first {SEARCH_LIMIT} will be collected')
+
+                shards[job].append((window_since, window_until))
+
+            windows = halves
+
+        for job_shards in shards:
+            job_shards.sort()
+
+        return shards
+
+    def _enrich(self, nodes: list, heavy: bool, dirs: bool):
+        """
+        Fetch the fields missing from search pages for the given repositories, in batches
+
+        :param nodes: the Repository nodes meeting the thresholds, from one or more search pages
+        :param heavy: fetch HEAVY_FIELDS, i.e., the pages come from LIGHT_SEARCH_FIELD
+        :param dirs: fetch the root directories (DIRS_FIELDS)
+        :return: a dictionary of the fetched fields by node id; None if a query failed
+        """
+        fields = ' '.join(([HEAVY_FIELDS] if heavy else []) + ([DIRS_FIELDS] if dirs else []))
+        batch_size = self._dirs_batch_size if dirs else MAX_NODES
+        stage = 'nodes' if heavy else 'dirs'
+
+        enriched = {}
+
+        for i in range(0, len(nodes), batch_size):
+            batch = nodes[i:i + batch_size]
+            data = self._post(queries.nodes_query(fields), {'ids': [node['id'] for node in batch]}, stage=stage)
+
+            if not data or data.get('nodes') is None:
+                return None
+
+            enriched.update((node['id'], node) for node in data['nodes'] if node)
+
+        if heavy:
+            self._increment(repositories_enriched=len(nodes))
+
+        return enriched
+
+    def _pages(self, shards, dirs: bool):
+        """
+        Follow the cursor chains of shards, <batch_size> shards at a time: the next pages of the active shards are
+        fetched by a single request, each under its own alias, and a shard is replaced by the next one when it is done.
+        Pages are sized by the AdaptivePageSize of the collector: when GitHub times out or fails with a 5xx, the page
+        size shrinks and the same cursors are retried, so that heavy shards are not truncated. A batch still failing
+        after max_retries is retried one shard at a time, and a shard still failing on its own is given up on (see
+        _fail_shard()), so that a bad shard does not take the rest of its batch down with it.
+        For the shards with thresholds, pages are fetched in two phases (see LIGHT_SEARCH_FIELD). When dirs is True,
+        the root directories of the repositories meeting the thresholds are fetched in batches (see DIRS_FIELDS).
+
+        :param shards: an iterable of (shard id, search string, endCursor to start after, thresholds) tuples, where
+        thresholds are accepted by passes_thresholds()
+        :param dirs: whether to fetch the root directories
+        :return: a generator of (shard id, edges, endCursor, hasNextPage) tuples, one per page
+        """
+        shards = iter(shards)
+        active = []
+        failures = 0
+        # The shards of a batch that kept failing, retried one at a time so that only the culprit is given up on
+        isolated = []
+        attempts = Counter()
+
+        def give_up(batch, reason):
+            if len(batch) > 1:
+                isolated.extend(batch)
+            else:
+                self._fail_shard(batch[0], reason)
+
+        while True:
+            if not active and isolated:
+                active = [isolated.pop(0)]
+
+            while not isolated and len(active) < self._batch_size:
+                shard = next(shards, None)
+
+                if shard is None:
+                    break
+
+                active.append(list(shard))
+
+            if not active:
+                return
+
+            # The document only depends on which searches are light: pages only change the variables
+            query = queries.search_query(tuple(any(thresholds.values()) for _, _, _, thresholds in active))
+            variables = {'first': self._page_size.size}
+
+            for i, (_, search, end_cursor, _) in enumerate(active):
+                variables[f'query{i}'] = search
+                variables[f'after{i}'] = end_cursor
+
+            try:
+                data = self._post(query, variables, raise_server_errors=True)
+            except ServerError as e:
+                if failures >= self._max_retries:
+                    give_up(active, str(e))
+                    failures = 0
+                    active = []
+                    continue
+
+                # Retry the same cursors with smaller pages; once at the minimum size, back off instead
+                self._emit('retry', stage='search', reason='server_error')
+
+                if self._page_size.at_minimum:
+                    time.sleep(backoff(failures))
+
+                self._page_size.shrink()
+                failures += 1
+                continue
+
+            if not data:
+                give_up(active, 'the query failed')
+                failures = 0
+                active = []
+                continue
+
+            failures = 0
+            self._page_size.succeeded(cost=(data.get('rateLimit') or {}).get('cost', 1))
+
+            pages = []
+            pending = []
+
+            for i, shard in enumerate(active):
+                search = data.get(f's{i}')
+
+                if not search:
+                    # The search failed on its own (e.g., an error of its alias): retry it at the same cursor
+                    attempts[shard[0]] += 1
+
+                    if attempts[shard[0]] > self._max_retries:
+                        self._fail_shard(shard, 'no search results')
+                    else:
+                        self._emit('retry', stage='search', reason='server_error')
+                        pending.append(shard)
+
+                    continue
+
+                edges = search.get('edges', [])
+                self._increment(repositories_scanned=len(edges))
+                self._emit('page', shard=shard[0], scanned=len(edges),
+                           done=not search['pageInfo'].get('hasNextPage'))
+
+                two_phase = any(shard[3].values())
+
+                if two_phase or dirs:
+                    edges = [edge for edge in edges
+                             if edge.get('node') and self.passes_thresholds(edge['node'], **shard[3])]
+
+                pages.append((shard, search, edges, two_phase))
+
+            # The missing fields of the pages of a batch are fetched together: the two-phase pages need the heavy
+            # fields, the others only the root directories
+            enriched = {}
+
+            with self._timed('enrich'):
+                for heavy in (True, False):
+                    nodes = [edge['node'] for _, _, edges, two_phase in pages if two_phase == heavy and (heavy or dirs)
+                             for edge in edges]
+
+                    enriched[heavy] = self._enrich(nodes, heavy=heavy, dirs=dirs) if nodes else {}
+
+            for shard, search, edges, two_phase in pages:
+                if two_phase or dirs:
+                    fields = enriched.get(two_phase)
+
+                    if fields is None:
+                        # The enrichment failed: fetch the page again, from the previous cursor of the shard
+                        attempts[shard[0]] += 1
+
+                        if attempts[shard[0]] > self._max_retries:
+                            self._fail_shard(shard, 'the enrichment of its page failed')
+                        else:
+                            pending.append(shard)
+
+                        continue
+
+                    edges = [{'node': dict(edge['node'], **fields[edge['node']['id']])}
+                             for edge in edges if edge['node']['id'] in fields]
+
+                shard_id = shard[0]
+                attempts.pop(shard_id, None)
+                has_next_page = bool(search['pageInfo'].get('hasNextPage'))
+                shard[2] = str(search['pageInfo'].get('endCursor'))
+
+                if has_next_page:
+                    pending.append(shard)
+
+                yield shard_id, edges, shard[2], has_next_page
+
+            active = pending
+
+    def _fail_shard(self, shard: list, reason: str):
+        """
+        Give up on a shard: the rest of its pages are not collected. It is counted in stats (shards_failed), so that
+        callers can tell the harvest is incomplete, and it is left unfinished in the checkpoint, if any, to be resumed.
+        """
+        print(f'Shard {shard[0]} failed at cursor {shard[2]}: {reason}')
+        self._increment(shards_failed=1)
+        self._emit('shard_failed', shard=shard[0], reason=reason)
+
+    def _pages_concurrently(self, shards: list, dirs: bool):
+        """
+        Follow the cursor chains of several shards in parallel, using a pool of <concurrency> workers that take the
+        next shard from a shared queue. Pages are merged in the order they are received.
+
+        :param shards: a list of shards, as accepted by _pages()
+        :param dirs: whether to fetch the root directories
+        :return: a generator of pages, as returned by _pages()
+        """
+        done = object()
+        pages = queue.Queue(maxsize=2 * self._concurrency)
+        stop = threading.Event()
+
+        todo = queue.SimpleQueue()
+        for shard in shards:
+            todo.put(shard)
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def take():
+            while not stop.is_set():
+                try:
+                    yield todo.get_nowait()
+                except queue.Empty:
+                    return
+
+        def fetch():
+            try:
+                for page in self._pages(take(), dirs):
+                    put(page)
+
+                    if stop.is_set():
+                        return
+
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        workers = min(self._concurrency, len(shards))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(fetch)
+
+            try:
+                pending = workers
+                while pending:
+                    item = pages.get()
+
+                    if item is done:
+                        pending -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                # Let the workers exit if the caller stops early or a worker failed
+                stop.set()
+
     def collect_repositories(self,
                              since: datetime,
                              until: datetime,
@@ -121,8 +924,18 @@ class GithubRepositoriesCollector:
                              min_releases: int = 0,
                              min_watchers: int = 0,
                              min_issues: int = 0,
-                             primary_language: str = None):
+                             primary_language: str = None,
+                             dirs: bool = True,
+                             checkpoint: Checkpoint = None,
+                             records: bool = False):
         """
+        Collect the repositories matching the given criteria. The created-at window is first split into shards that
+        fit under the search limit (see plan_shards()), then every shard is paged through. With concurrency > 1,
+        shards are fetched in parallel and repositories are yielded in the order their pages are received.
+        With min_issues, min_releases or min_watchers, which cannot be expressed in the search string, only the fields
+        needed to check them are fetched with the search pages; the other fields are fetched for the repositories
+        meeting the thresholds only.
+
         :param since: search for repositories created from since
         :param until: search for repositories created up to until
         :param pushed_after: datetime to filter out repositories. Repositories older than pushed_after are ignored.
@@ -131,54 +944,168 @@ class GithubRepositoriesCollector:
         :param min_watchers: the minimum number of watchers the repositories must have
         :param min_issues: the minimum number of issues the repositories must have
         :param primary_language: get repositories written in this language
+        :param dirs: fetch the root directories of the repositories (default: True). Without them, dirs is empty and
+        the collection costs fewer requests
+        :param checkpoint: record the progress of the harvest in this checkpoint. If the checkpoint already holds
+        progress for the same criteria, the repositories it recorded are yielded first, and the harvest resumes from
+        the last endCursor of each shard. A ValueError is raised by the call itself if it belongs to a harvest with
+        different criteria.
+        :param records: yield Repository records (read-only mappings taking a fraction of the memory of dictionaries)
+        instead of dictionaries (default: False)
 
-        :return: a generator of dictionary objects
+        :return: a generator of repositories, as dictionaries or as Repository records, deduplicated on the repository
+        id
         """
+        # Returned rather than yielded from, so that the checkpoint is checked by the call itself, like collect_many()
+        return self.collect_many([dict(since=since,
+                                       until=until,
+                                       pushed_after=pushed_after,
+                                       min_stars=min_stars,
+                                       min_releases=min_releases,
+                                       min_watchers=min_watchers,
+                                       min_issues=min_issues,
+                                       primary_language=primary_language)],
+                                 dirs=dirs,
+                                 checkpoint=checkpoint,
+                                 records=records)
 
-        query = re.sub('MIN_STARS', str(min_stars), QUERY_TEMPLATE)
-        query = re.sub('SINCE', since.strftime('%Y-%m-%dT%H:%M:%SZ'), query)
-        query = re.sub('UNTIL', until.strftime('%Y-%m-%dT%H:%M:%SZ'), query)
-        query = re.sub('PUSHED_AFTER', pushed_after.strftime('%Y-%m-%dT%H:%M:%SZ'), query)
+    def collect_many(self, jobs: list, dirs: bool = True, checkpoint: Checkpoint = None, records: bool = False):
+        """
+        Collect the repositories of several jobs, e.g., one per language, in a single harvest: the count probes and
+        the shards of all the jobs are batched together (see batch_size), so that a sweep costs about as many
+        round trips as its largest job would.
 
-        if primary_language:
-            query = re.sub('LANGUAGE:LANGUAGE', f'language:{primary_language}', query)
-        else:
-            query = re.sub('LANGUAGE:LANGUAGE', '', query)
+        :param jobs: a list of dictionaries of criteria, as accepted by collect_repositories() (since, until,
+        pushed_after, min_stars, min_releases, min_watchers, min_issues, primary_language)
+        :param dirs: fetch the root directories of the repositories (default: True)
+        :param checkpoint: record the progress of the harvest in this checkpoint (see collect_repositories()). It is
+        bound to the harvest right away: a ValueError is raised by the call itself, before any repository is
+        collected, if it belongs to a harvest with different criteria
+        :param records: yield Repository records instead of dictionaries (default: False)
 
-        has_next_page = True
-        end_cursor = None
+        :return: a generator of repositories, as dictionaries or as Repository records, deduplicated on the repository
+        id across all the jobs
+        """
+        jobs = [self._job(**job) for job in jobs]
 
-        while has_next_page:
+        resumed = checkpoint.start(harvest_criteria(jobs, dirs)) if checkpoint else False
+        repositories = self._collect_many(jobs, dirs, checkpoint, resumed)
 
-            tmp_query = re.sub('AFTER', '', query) if not end_cursor else re.sub('AFTER',
-                                                                                 f', after: "{end_cursor}"',
-                                                                                 query)
+        return repositories if records else (repo.as_dict() for repo in repositories)
 
-            response = requests.post('https://api.github.com/graphql', json={'query': tmp_query},
-                                     headers={'Authorization': f'token {self._token}'})
+    def _collect_many(self, jobs: list, dirs: bool, checkpoint: Checkpoint, resumed: bool):
+        """
+        The harvest of collect_many(), once the checkpoint is bound to it
 
-            if response.status_code != 200:
-                print("Query failed to run and returned status code {}: {}".format(response.status_code, tmp_query))
-                break
+        :param jobs: a list of jobs, as returned by _job()
+        :param resumed: whether the checkpoint already holds progress for the harvest
+        """
+        seen = set()
 
-            query_result = response.json()
+        if resumed:
+            for repo in checkpoint.repositories():
+                seen.add(repo['id'])
+                yield repo
 
-            if not query_result.get('data'):
-                break
+            windows = [(shard_id, job, shard_since, shard_until, end_cursor)
+                       for shard_id, job, shard_since, shard_until, end_cursor, done in checkpoint.shards() if not done]
+        else:
+            plans = self.plan_many(jobs)
+
+            if checkpoint:
+                checkpoint.save_plans(harvest_criteria(jobs, dirs), plans)
+
+                windows = [(shard_id, job, shard_since, shard_until, end_cursor)
+                           for shard_id, job, shard_since, shard_until, end_cursor, _ in checkpoint.shards()]
+            else:
+                windows = [(shard_id, job, shard_since, shard_until, None)
+                           for shard_id, (job, (shard_since, shard_until)) in
+                           enumerate((job, window) for job, job_windows in enumerate(plans) for window in job_windows)]
+
+        for shard_id, end_cursor, has_next_page, page in self.collect_shards(jobs, windows, dirs, records=True):
+            repositories = []
 
-            if not query_result['data'].get('search'):
-                break
+            for repo in page:
+                if repo['id'] in seen:
+                    continue
 
-            self._quota = int(query_result['data']['rateLimit']['remaining'])
-            self._quota_reset_at = query_result['data']['rateLimit']['resetAt']
+                seen.add(repo['id'])
+                repositories.append(repo)
 
-            has_next_page = bool(query_result['data']['search']['pageInfo'].get('hasNextPage'))
-            end_cursor = str(query_result['data']['search']['pageInfo'].get('endCursor'))
+            self._emit('repositories', kept=len(repositories))
 
-            edges = query_result['data']['search'].get('edges', [])
+            if checkpoint:
+                with self._timed('checkpoint'):
+                    checkpoint.save_page(shard_id, end_cursor, has_next_page, repositories)
 
-            for repo in self.filter_repositories(edges,
-                                                 min_issues=min_issues,
-                                                 min_releases=min_releases,
-                                                 min_watchers=min_watchers):
+            for repo in repositories:
                 yield repo
+
+    def plan_many(self, jobs: list) -> list:
+        """
+        Split the created-at windows of several jobs into shards, as collect_many() does, batching the count probes of
+        all the jobs together
+
+        :param jobs: a list of dictionaries of criteria, as accepted by collect_many()
+        :return: a list with the (since, until) windows of each job
+        """
+        with self._timed('plan'):
+            return self._plan([self._job(**job) for job in jobs])
+
+    def collect_shards(self, jobs: list, windows: list, dirs: bool = True, records: bool = False):
+        """
+        Collect the repositories of shards already planned, page by page, e.g., the shards leased from a ShardQueue by
+        a worker (see repocollector.distributed)
+
+        :param jobs: a list of dictionaries of criteria, as accepted by collect_many()
+        :param windows: a list of (shard id, job, since, until, end_cursor) shards, where job is the index of the job
+        of the shard, and end_cursor the cursor to resume the shard from (None to start from its first page)
+        :param dirs: fetch the root directories of the repositories (default: True)
+        :param records: return Repository records instead of dictionaries (default: False)
+
+        :return: a generator of (shard id, end_cursor, has_next_page, repositories) pages, where repositories are the
+        repositories of the page meeting the criteria of the job, not deduplicated
+        """
+        jobs = [self._job(**job) for job in jobs]
+
+        thresholds = [dict(min_issues=job['min_issues'],
+                           min_releases=job['min_releases'],
+                           min_watchers=job['min_watchers']) for job in jobs]
+
+        shards = [(shard_id,
+                   self.search_string(since=shard_since,
+                                      until=shard_until,
+                                      pushed_after=jobs[job]['pushed_after'],
+                                      min_stars=jobs[job]['min_stars'],
+                                      primary_language=jobs[job]['primary_language']),
+                   end_cursor,
+                   thresholds[job])
+                  for shard_id, job, shard_since, shard_until, end_cursor in windows]
+
+        shard_jobs = {shard_id: job for shard_id, job, _, _, _ in windows}
+
+        if self._concurrency > 1 and len(shards) > 1:
+            pages = self._pages_concurrently(shards, dirs)
+        else:
+            pages = self._pages(shards, dirs)
+
+        for shard_id, edges, end_cursor, has_next_page in pages:
+            with self._timed('filter'):
+                repositories = [repo if records else repo.as_dict()
+                                for repo in self.filter_repositories(edges, **thresholds[shard_jobs[shard_id]])]
+
+            yield shard_id, end_cursor, has_next_page, repositories
+
+    def collect_batches(self, jobs: list, size: int = 10000, dirs: bool = True, checkpoint: Checkpoint = None):
+        """
+        Collect the repositories of several jobs, like collect_many(), in columnar batches. Batches take far less
+        memory than as many records, and convert to Arrow without copying their numeric columns.
+
+        :param jobs: a list of dictionaries of criteria, as accepted by collect_many()
+        :param size: the number of repositories per batch
+        :param dirs: fetch the root directories of the repositories (default: True)
+        :param checkpoint: record the progress of the harvest in this checkpoint (see collect_repositories())
+
+        :return: a generator of RepositoryBatch
+        """
+        yield from batches(self.collect_many(jobs, dirs=dirs, checkpoint=checkpoint, records=True), size=size)
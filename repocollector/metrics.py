@@ -0,0 +1,265 @@
+"""
+A module to instrument the collector: the metrics of a run, fed by the events of GithubRepositoriesCollector, exported
+as a Prometheus textfile or as JSON
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets, in seconds for latencies and in pages for shards
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PAGES_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+PREFIX = 'repocollector_'
+
+# The metrics, with their type and help text
+METRICS = {
+    'requests_total': ('counter', 'HTTP requests sent to GitHub, by stage and status'),
+    'request_seconds': ('histogram', 'Latency of the HTTP requests, by stage'),
+    'response_bytes_total': ('counter', 'Bytes of the response bodies, by stage'),
+    'points_total': ('counter', 'rateLimit.cost of the queries, by stage'),
+    'retries_total': ('counter', 'Retried requests, by stage and reason'),
+    'cache_hits_total': ('counter', 'Responses served from the cache, by stage'),
+    'pages_total': ('counter', 'Search pages received'),
+    'shard_pages': ('histogram', 'Search pages per shard'),
+    'shards_failed_total': ('counter', 'Shards given up on, whose remaining pages were not collected'),
+    'repositories_scanned_total': ('counter', 'Repositories returned by the search pages'),
+    'repositories_kept_total': ('counter', 'Repositories meeting the criteria, after deduplication'),
+    'stage_seconds_total': ('counter', 'Time spent in each stage, summed across threads'),
+}
+
+
+class Histogram:
+    """
+    A histogram with fixed buckets, as in Prometheus
+    """
+
+    def __init__(self, buckets: tuple):
+        """
+        :param buckets: the upper bounds of the buckets, in increasing order; a last +Inf bucket is implicit
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """
+        :return: a list of (upper bound, number of observations up to it) pairs, ending with +Inf
+        """
+        total = 0
+        cumulative = []
+
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+
+        return cumulative
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: a quantile between 0 and 1
+        :return: the upper bound of the bucket the quantile falls in; None without observations
+        """
+        if not self.count:
+            return None
+
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound if bound != float('inf') else self.buckets[-1]
+
+
+class Metrics:
+    """
+    The metrics of a run. A Metrics is a hook: pass it to GithubRepositoriesCollector.add_hook() to record the events of
+    the collector; timer() records the stages run by the caller (e.g., writing the outputs). It is thread-safe.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+
+        self._counters = Counter()
+        self._histograms = {}
+        self._shard_pages = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, **fields):
+        """
+        Record an event of the collector. Unknown events are ignored.
+
+        :param event: request, retry, cache_hit, page, shard_failed, repositories or stage
+        :param fields: the fields of the event
+        """
+        handler = getattr(self, f'_on_{event}', None)
+
+        if handler:
+            with self._lock:
+                handler(**fields)
+
+    def _on_request(self, stage: str, status, seconds: float, size: int, cost: int = None):
+        self._counters['requests_total', (('stage', stage), ('status', str(status)))] += 1
+        self._observe('request_seconds', seconds, LATENCY_BUCKETS, stage=stage)
+        self._counters['response_bytes_total', (('stage', stage),)] += size
+
+        if cost is not None:
+            self._counters['points_total', (('stage', stage),)] += cost
+
+    def _on_retry(self, stage: str, reason: str):
+        self._counters['retries_total', (('stage', stage), ('reason', reason))] += 1
+
+    def _on_cache_hit(self, stage: str):
+        self._counters['cache_hits_total', (('stage', stage),)] += 1
+
+    def _on_page(self, shard, scanned: int, done: bool):
+        self._counters['pages_total', ()] += 1
+        self._counters['repositories_scanned_total', ()] += scanned
+        self._shard_pages[shard] += 1
+
+        if done:
+            self._observe('shard_pages', self._shard_pages.pop(shard), PAGES_BUCKETS)
+
+    def _on_shard_failed(self, shard, reason: str):
+        self._counters['shards_failed_total', ()] += 1
+        self._shard_pages.pop(shard, None)
+
+    def _on_repositories(self, kept: int):
+        self._counters['repositories_kept_total', ()] += kept
+
+    def _on_stage(self, name: str, seconds: float):
+        self._counters['stage_seconds_total', (('stage', name),)] += seconds
+
+    def _observe(self, name: str, value: float, buckets: tuple, **labels):
+        key = name, tuple(sorted(labels.items()))
+
+        if key not in self._histograms:
+            self._histograms[key] = Histogram(buckets)
+
+        self._histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Time a stage, e.g., with metrics.timer('write'): ...
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self('stage', name=stage, seconds=time.perf_counter() - start)
+
+    def total(self, name: str, **labels) -> float:
+        """
+        :param name: the name of a counter
+        :param labels: the labels to match; the others are summed over
+        :return: the value of the counter
+        """
+        with self._lock:
+            return sum(value for (counter, counter_labels), value in self._counters.items()
+                       if counter == name and set(labels.items()) <= set(counter_labels))
+
+    def summary(self) -> dict:
+        """
+        :return: the throughput of the run so far: elapsed seconds, the shards given up on, repositories kept per
+        second, quota points per repository, the ratio of kept to scanned repositories, the time per stage, and the
+        median and 95th percentile latency of the requests of each stage
+        """
+        elapsed = time.time() - self.started_at
+        kept = self.total('repositories_kept_total')
+        scanned = self.total('repositories_scanned_total')
+        points = self.total('points_total')
+
+        with self._lock:
+            stages = {dict(labels)['stage']: round(value, 3) for (name, labels), value in self._counters.items()
+                      if name == 'stage_seconds_total'}
+            latency = {dict(labels)['stage']: {'p50': histogram.quantile(0.5), 'p95': histogram.quantile(0.95)}
+                       for (name, labels), histogram in self._histograms.items() if name == 'request_seconds'}
+
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'requests': self.total('requests_total'),
+            'retries': self.total('retries_total'),
+            'shards_failed': self.total('shards_failed_total'),
+            'points': points,
+            'repositories_scanned': scanned,
+            'repositories_kept': kept,
+            'kept_ratio': round(kept / scanned, 4) if scanned else None,
+            'repositories_per_second': round(kept / elapsed, 2) if elapsed else None,
+            'points_per_repository': round(points / kept, 4) if kept else None,
+            'stage_seconds': stages,
+            'request_seconds': latency,
+        }
+
+    def to_dict(self) -> dict:
+        """
+        :return: the counters, histograms and summary, JSON serializable
+        """
+        with self._lock:
+            counters = [dict(name=name, labels=dict(labels), value=value)
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [dict(name=name, labels=dict(labels), count=histogram.count, sum=histogram.sum,
+                               buckets={str(bound): total for bound, total in histogram.cumulative()})
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+
+        return dict(counters=counters, histograms=histograms, summary=self.summary())
+
+    def to_prometheus(self) -> str:
+        """
+        :return: the metrics in the Prometheus text exposition format, e.g., for the textfile collector
+        """
+        def format_labels(labels, **extra):
+            labels = list(labels) + list(extra.items())
+            return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        lines = []
+
+        for name, (kind, description) in METRICS.items():
+            if kind == 'counter':
+                samples = [f'{PREFIX}{name}{format_labels(labels)} {value}'
+                           for (counter, labels), value in counters if counter == name]
+            else:
+                samples = []
+
+                for (histogram_name, labels), histogram in histograms:
+                    if histogram_name != name:
+                        continue
+
+                    for bound, total in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else bound
+                        samples.append(f'{PREFIX}{name}_bucket{format_labels(labels, le=le)} {total}')
+
+                    samples.append(f'{PREFIX}{name}_sum{format_labels(labels)} {histogram.sum}')
+                    samples.append(f'{PREFIX}{name}_count{format_labels(labels)} {histogram.count}')
+
+            if samples:
+                lines.extend([f'# HELP {PREFIX}{name} {description}', f'# TYPE {PREFIX}{name} {kind}'] + samples)
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """
+        Dump the metrics, atomically: as JSON if the path ends with .json, in the Prometheus text format otherwise
+
+        :param path: the path to the output file
+        """
+        content = json.dumps(self.to_dict(), indent=2) if path.endswith('.json') else self.to_prometheus()
+
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            f.write(content)
+
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,68 @@
+"""
+A module to adapt the page size of search queries to how GitHub copes with them
+"""
+
+import threading
+
+# GitHub returns at most 100 results per page
+MAX_PAGE_SIZE = 100
+
+
+class AdaptivePageSize:
+    """
+    The page size of the search queries of a harvest. It starts from the maximum, to minimize the number of round
+    trips, is halved when GitHub times out, fails with a 5xx, or a page costs too many points, and doubles back after
+    consecutive successes.
+    """
+
+    def __init__(self,
+                 maximum: int = MAX_PAGE_SIZE,
+                 minimum: int = 10,
+                 grow_after: int = 5,
+                 max_cost: int = 10):
+        """
+        :param maximum: the initial and maximum page size
+        :param minimum: the minimum page size
+        :param grow_after: the number of consecutive successful pages after which the page size is doubled
+        :param max_cost: the rateLimit.cost above which a page is considered too heavy, and the page size is halved
+        """
+        if not 1 <= minimum <= maximum <= MAX_PAGE_SIZE:
+            raise ValueError(f'page sizes must satisfy 1 <= minimum <= maximum <= {MAX_PAGE_SIZE}')
+
+        self.size = maximum
+
+        self._maximum = maximum
+        self._minimum = minimum
+        self._grow_after = grow_after
+        self._max_cost = max_cost
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def at_minimum(self) -> bool:
+        return self.size == self._minimum
+
+    def shrink(self):
+        """
+        Halve the page size, e.g., after a timeout or a 5xx
+        """
+        with self._lock:
+            self.size = max(self._minimum, self.size // 2)
+            self._successes = 0
+
+    def succeeded(self, cost: int = 1):
+        """
+        Account for a successful page
+
+        :param cost: the rateLimit.cost of the page
+        """
+        if cost > self._max_cost:
+            self.shrink()
+            return
+
+        with self._lock:
+            self._successes += 1
+
+            if self._successes >= self._grow_after:
+                self.size = min(self._maximum, self.size * 2)
+                self._successes = 0
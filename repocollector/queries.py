@@ -0,0 +1,99 @@
+"""
+A module to build the GraphQL documents of the collector. The documents are constant: the search strings, cursors, page
+size and node ids are GraphQL variables, so that a document is built once per shape (e.g., the number of searches of a
+batch) and every page only changes its variables
+"""
+
+import functools
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+
+RATE_LIMIT_FIELD = 'rateLimit { limit cost remaining resetAt }'
+
+# Every predicate GitHub search supports is applied server-side. The others (issues, releases, watchers, disabled and
+# locked repositories) are applied by filter_repositories
+SEARCH_TEMPLATE = 'is:public stars:>={min_stars} mirror:false archived:false fork:false template:false ' \
+                  'created:{since}..{until} pushed:>={pushed_after}{language}'
+
+SEARCH_FIELD = 'search(query: $query, type: REPOSITORY, first: $first, after: $after) { repositoryCount pageInfo { ' \
+               'endCursor startCursor hasNextPage } edges { node { ... on Repository { id databaseId ' \
+               'defaultBranchRef { name } owner { login } name url description primaryLanguage { name } stargazers { ' \
+               'totalCount } watchers { totalCount } releases { totalCount } issues { totalCount } createdAt pushedAt ' \
+               'updatedAt hasIssuesEnabled isArchived isDisabled isMirror isFork isLocked isTemplate } } } }'
+
+# Two-phase fetch, used when client-side thresholds are given: a search page only asks for the fields the thresholds
+# are checked on (LIGHT_SEARCH_FIELD), then the other fields (HEAVY_FIELDS) are fetched for the survivors only
+LIGHT_SEARCH_FIELD = 'search(query: $query, type: REPOSITORY, first: $first, after: $after) { repositoryCount ' \
+                     'pageInfo { endCursor startCursor hasNextPage } edges { node { ... on Repository { id ' \
+                     'databaseId watchers { totalCount } releases { totalCount } issues { totalCount } ' \
+                     'hasIssuesEnabled isDisabled isFork isLocked isTemplate } } } }'
+
+HEAVY_FIELDS = 'defaultBranchRef { name } owner { login } name url description primaryLanguage { name } ' \
+               'stargazers { totalCount } createdAt pushedAt updatedAt isArchived isMirror'
+
+# Directory enrichment: the root entries of the default branch, whatever its name, fetched for the survivors only
+DIRS_FIELDS = 'defaultBranchRef { name target { ... on Commit { tree { entries { name type } } } } }'
+
+COUNT_FIELD = 'search(query: $query, type: REPOSITORY, first: 1) { repositoryCount }'
+
+NODES_QUERY = 'query($ids: [ID!]!) { nodes(ids: $ids) { ... on Repository { id FIELDS } } ' + RATE_LIMIT_FIELD + ' }'
+
+
+def search_string(since: str, until: str, pushed_after: str, min_stars: int = 0, primary_language: str = None) -> str:
+    """
+    :param since: the earliest creation date, formatted as GitHub expects (e.g., 2020-01-01T00:00:00Z)
+    :param until: the latest creation date
+    :param pushed_after: the earliest push date
+    :param min_stars: the minimum number of stars
+    :param primary_language: the primary language; None for any language
+    :return: the GitHub search string for these criteria
+    """
+    return SEARCH_TEMPLATE.format(min_stars=min_stars,
+                                  since=since,
+                                  until=until,
+                                  pushed_after=pushed_after,
+                                  language=f' language:{primary_language}' if primary_language else '')
+
+
+def _alias(prefix: str, i: int, field: str) -> str:
+    """
+    :return: the field under the alias <prefix><i>, with its own $query<i> and $after<i> variables
+    """
+    return f'{prefix}{i}: ' + field.replace('$query', f'$query{i}').replace('$after', f'$after{i}')
+
+
+@functools.lru_cache(maxsize=256)
+def search_query(light: tuple) -> str:
+    """
+    Alias batching: the searches of several shards, each under its own alias (s0, s1, ...), in a single document.
+    GitHub charges a document by the connections it requests, so a batch usually costs a single point.
+
+    :param light: for each search of the batch, whether it asks for the LIGHT_SEARCH_FIELD (shards with thresholds)
+    :return: the document, whose variables are $first, the page size shared by the searches, and $query<i> and
+    $after<i>, the search string and the cursor to start after (null for the first page) of each search
+    """
+    declarations = ['$first: Int!'] + [f'$query{i}: String!, $after{i}: String' for i in range(len(light))]
+    fields = [_alias('s', i, LIGHT_SEARCH_FIELD if is_light else SEARCH_FIELD) for i, is_light in enumerate(light)]
+
+    return f'query({", ".join(declarations)}) {{ {" ".join(fields)} {RATE_LIMIT_FIELD} }}'
+
+
+@functools.lru_cache(maxsize=256)
+def count_query(size: int) -> str:
+    """
+    :param size: the number of count probes of the batch
+    :return: the document of the probes, each under its own alias (c0, c1, ...), whose variables are $query<i>
+    """
+    declarations = [f'$query{i}: String!' for i in range(size)]
+    fields = [_alias('c', i, COUNT_FIELD) for i in range(size)]
+
+    return f'query({", ".join(declarations)}) {{ {" ".join(fields)} {RATE_LIMIT_FIELD} }}'
+
+
+@functools.lru_cache(maxsize=8)
+def nodes_query(fields: str) -> str:
+    """
+    :param fields: the fields to fetch for each repository (e.g., HEAVY_FIELDS)
+    :return: the document fetching them for the repositories whose ids are the $ids variable
+    """
+    return NODES_QUERY.replace('FIELDS', fields)
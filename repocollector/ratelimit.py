@@ -0,0 +1,187 @@
+"""
+A module to pace GraphQL requests according to the rateLimit block GitHub returns with every response
+"""
+
+import random
+import threading
+import time
+
+from datetime import datetime, timezone
+
+
+def parse_reset_at(reset_at: str) -> float:
+    """
+    :param reset_at: a rateLimit.resetAt value, e.g., 2020-12-31T23:59:59Z
+    :return: the corresponding UNIX timestamp
+    """
+    return datetime.strptime(reset_at, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()
+
+
+def backoff(attempt: int, retry_after: float = None, base: float = 1.0, cap: float = 300.0) -> float:
+    """
+    Compute how long to wait before retrying a request rejected by a secondary rate limit
+
+    :param attempt: the number of attempts already failed, starting from 0
+    :param retry_after: the Retry-After header of the response, if any
+    :param base: the wait of the first attempt, in seconds
+    :param cap: the maximum wait, in seconds
+    :return: the seconds to wait: Retry-After when given, an exponential backoff otherwise, both jittered
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+
+    wait = min(cap, base * 2 ** attempt)
+    return wait / 2 + random.uniform(0, wait / 2)
+
+
+class RateLimiter:
+    """
+    A token bucket for a single access token. The bucket refills at the rate that makes the remaining points last
+    until the quota resets, so that the hourly budget is spread over the whole job rather than spent in bursts.
+    """
+
+    def __init__(self, burst: int = 100):
+        """
+        :param burst: the number of points that can be spent at once before pacing kicks in
+        """
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.cost = 1
+
+        self._burst = burst
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, limit: int, cost: int, remaining: int, reset_at: str):
+        """
+        Synchronize the bucket with the rateLimit block of a response
+        """
+        with self._lock:
+            self.limit = int(limit)
+            self.cost = max(int(cost), 1)
+            self.remaining = int(remaining)
+            self.reset_at = parse_reset_at(reset_at)
+
+    def exhaust(self, reset_at: float = None):
+        """
+        Mark the quota as exhausted, e.g., after a RATE_LIMITED error
+
+        :param reset_at: the UNIX timestamp the quota resets at, if known
+        """
+        with self._lock:
+            self.remaining = 0
+            self.reset_at = reset_at or self.reset_at or time.time() + 60
+
+    def _rate(self, now: float) -> float:
+        """
+        :return: the points per second that make the remaining points last until the reset
+        """
+        return max(self.remaining, 0) / max(self.reset_at - now, 1.0)
+
+    def _refill(self, now: float):
+        if self.reset_at is not None and now >= self.reset_at:
+            # The quota has been reset: it is known again with the next response
+            self.remaining = self.limit
+            self.reset_at = None
+
+        monotonic = time.monotonic()
+
+        if self.remaining is not None and self.reset_at is not None:
+            elapsed = monotonic - self._refilled_at
+            self._tokens = min(self._burst, self._tokens + elapsed * self._rate(now))
+        else:
+            self._tokens = self._burst
+
+        self._refilled_at = monotonic
+
+    def delay(self, cost: int = None) -> float:
+        """
+        :param cost: the points the next request is expected to cost (default: the cost of the last request)
+        :return: the seconds to wait before the next request, without reserving anything
+        """
+        cost = cost or self.cost
+
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            return self._wait(now, cost, self._tokens)
+
+    def _wait(self, now: float, cost: int, tokens: float) -> float:
+        if self.remaining is None or self.reset_at is None:
+            return 0.0
+
+        if self.remaining < cost:
+            return self.reset_at - now + 1
+
+        if tokens >= cost:
+            return 0.0
+
+        return (cost - tokens) / self._rate(now)
+
+    def reserve(self, cost: int = None) -> float:
+        """
+        Reserve the points for the next request
+
+        :param cost: the points the next request is expected to cost (default: the cost of the last request)
+        :return: the seconds to wait before sending the request
+        """
+        cost = cost or self.cost
+
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            wait = self._wait(now, cost, self._tokens)
+
+            self._tokens -= cost
+            if self.remaining is not None:
+                self.remaining -= cost
+
+            return wait
+
+
+class TokenPool:
+    """
+    Spread requests across several access tokens, each with its own RateLimiter
+    """
+
+    def __init__(self, tokens: list, burst: int = 100):
+        """
+        :param tokens: one or more access tokens
+        :param burst: see RateLimiter
+        """
+        if not tokens:
+            raise ValueError('at least one access token is required')
+
+        self._limiters = {token: RateLimiter(burst=burst) for token in tokens}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._limiters)
+
+    @property
+    def remaining(self):
+        """
+        :return: the points left across all tokens, or None if no response has been received yet
+        """
+        known = [limiter.remaining for limiter in self._limiters.values() if limiter.remaining is not None]
+        return sum(max(remaining, 0) for remaining in known) if known else None
+
+    def limiter(self, token: str) -> RateLimiter:
+        return self._limiters[token]
+
+    def acquire(self) -> str:
+        """
+        Pick the token that can be used the soonest, and wait until it can
+
+        :return: the token to send the next request with
+        """
+        with self._lock:
+            token = min(self._limiters, key=lambda t: self._limiters[t].delay())
+            wait = self._limiters[token].reserve()
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return token
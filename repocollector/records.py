@@ -0,0 +1,184 @@
+"""
+A module to represent collected repositories compactly, one by one or by columnar batches
+"""
+
+import sys
+
+from array import array
+from collections.abc import Mapping
+
+# The fields of a collected repository, in output order
+FIELDS = ('id', 'default_branch', 'owner', 'name', 'full_name', 'url', 'description', 'issues', 'releases', 'stars',
+          'watchers', 'primary_language', 'created_at', 'pushed_at', 'dirs')
+
+# The fields stored as 64-bit integers by RepositoryBatch
+NUMERIC_FIELDS = ('id', 'issues', 'releases', 'stars', 'watchers')
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Repository(Mapping):
+    """
+    A collected repository. It is a read-only mapping of FIELDS, so it can be used wherever a dictionary is expected
+    (e.g., repo['stars'], repo.get('dirs'), dict(repo)), but it takes a fraction of the memory: the fields are slots,
+    the languages, branch and directory names are interned, and dirs is a tuple.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self,
+                 id: int,
+                 default_branch: str,
+                 owner: str,
+                 name: str,
+                 full_name: str,
+                 url: str,
+                 description: str,
+                 issues: int,
+                 releases: int,
+                 stars: int,
+                 watchers: int,
+                 primary_language: str,
+                 created_at: str,
+                 pushed_at: str,
+                 dirs=()):
+        set_field = object.__setattr__
+
+        set_field(self, 'id', id)
+        set_field(self, 'default_branch', _intern(default_branch))
+        set_field(self, 'owner', owner)
+        set_field(self, 'name', name)
+        set_field(self, 'full_name', full_name)
+        set_field(self, 'url', url)
+        set_field(self, 'description', description)
+        set_field(self, 'issues', issues)
+        set_field(self, 'releases', releases)
+        set_field(self, 'stars', stars)
+        set_field(self, 'watchers', watchers)
+        set_field(self, 'primary_language', _intern(primary_language))
+        set_field(self, 'created_at', created_at)
+        set_field(self, 'pushed_at', pushed_at)
+        set_field(self, 'dirs', tuple(_intern(directory) for directory in dirs or ()))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Repository records are read-only')
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def as_dict(self) -> dict:
+        """
+        :return: the repository as a plain dictionary, JSON serializable, with dirs as a list
+        """
+        return {field: list(self.dirs) if field == 'dirs' else getattr(self, field) for field in FIELDS}
+
+    def __reduce__(self):
+        return Repository, tuple(getattr(self, field) for field in FIELDS)
+
+    def __repr__(self):
+        return f'Repository({self.full_name!r}, id={self.id!r})'
+
+
+class RepositoryBatch:
+    """
+    A columnar batch of repositories: the numeric fields (NUMERIC_FIELDS) are arrays of 64-bit integers, the others
+    lists. Iterating a batch yields Repository records; to_arrow() converts it to a pyarrow Table, sharing the memory of
+    the numeric columns.
+    """
+
+    def __init__(self, repositories=()):
+        """
+        :param repositories: an iterable of repositories (Repository records or dictionaries) to add to the batch
+        """
+        self.columns = {field: array('q') if field in NUMERIC_FIELDS else [] for field in FIELDS}
+
+        for repository in repositories:
+            self.append(repository)
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, index: int) -> Repository:
+        return Repository(**{field: column[index] for field, column in self.columns.items()})
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, repository):
+        """
+        :param repository: a Repository record, or a dictionary with the same fields
+        """
+        for field, column in self.columns.items():
+            value = repository[field]
+            column.append(tuple(_intern(directory) for directory in value or ()) if field == 'dirs'
+                          else _intern(value) if field in ('default_branch', 'primary_language')
+                          else value)
+
+    @staticmethod
+    def arrow_schema():
+        """
+        :return: the pyarrow schema of the batches. Requires pyarrow.
+        """
+        pyarrow = _import_pyarrow()
+        return pyarrow.schema([(field, pyarrow.int64()) if field in NUMERIC_FIELDS
+                               else (field, pyarrow.list_(pyarrow.string())) if field == 'dirs'
+                               else (field, pyarrow.string()) for field in FIELDS])
+
+    def to_arrow(self):
+        """
+        :return: the batch as a pyarrow Table. The numeric columns are not copied: the batch cannot grow while the
+        table is alive. Requires pyarrow.
+        """
+        pyarrow = _import_pyarrow()
+        schema = self.arrow_schema()
+
+        arrays = [pyarrow.Array.from_buffers(pyarrow.int64(), len(self), [None, pyarrow.py_buffer(column)])
+                  if field in NUMERIC_FIELDS else pyarrow.array(column, type=schema.field(field).type)
+                  for field, column in self.columns.items()]
+
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def batches(repositories, size: int = 10000):
+    """
+    Group repositories into columnar batches
+
+    :param repositories: an iterable of repositories
+    :param size: the number of repositories per batch
+    :return: a generator of RepositoryBatch; the last one may be smaller
+    """
+    batch = RepositoryBatch()
+
+    for repository in repositories:
+        batch.append(repository)
+
+        if len(batch) >= size:
+            yield batch
+            batch = RepositoryBatch()
+
+    if len(batch):
+        yield batch
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('pyarrow is required to convert batches to Arrow: pip install pyarrow')
+
+    return pyarrow
@@ -1,30 +1,17 @@
-import statistics
-import datetime
-
-
-def create_report(repositories: list) -> str:
-    """
+"""
+A module to generate the HTML report of the collected repositories, in a single pass and with bounded memory
+"""
 
-    :param repositories: a list of dictionaries containing repositories metadata
-    :return: the generated HTML report
-    """
+import datetime
+import html
+import io
+import json
+import shutil
+import tempfile
 
-    """
-    Generate an HTML report for the crawled repositories
-    """
-    now = datetime.datetime.now()
-    generation_date = datetime.date(now.year, now.month, now.day)
-    avg_repos = len(repositories)
-    avg_issues = int(statistics.mean([d['issues'] for d in repositories]))
-    avg_releases = int(statistics.mean([d['releases'] for d in repositories]))
-    avg_stars = int(statistics.mean([d['stars'] for d in repositories]))
-    avg_watchers = int(statistics.mean([d['watchers'] for d in repositories]))
-
-    accordion = ''
-    for item in repositories:
-        accordion += '{0}\n'.format(__generate_card(item))
+from repocollector.writers import Writer
 
-    return """
+HEADER = """
         <!doctype html>
         <html lang="en">
             <header>
@@ -83,25 +70,194 @@ def create_report(repositories: list) -> str:
                     </div>
                 </div>
                 <br/>
-                <div class="accordion" id="accordion">
-                {6}  <!-- Accordion: list of cards containing repos'information -->
+"""
+
+ACCORDION = """                <div class="accordion" id="accordion">
+                {0}  <!-- Accordion: list of cards containing repos'information -->
                 </div>
-              <script src="https://code.jquery.com/jquery-3.3.1.slim.min.js" integrity="sha384-q8i/X+965DzO0rT7abK41JStQIAqVgRVzpbzo5smXKp4YfRvH+8abtTE1Pi6jizo" crossorigin="anonymous"></script>
+"""
+
+# Paginated mode: the repositories are embedded as compact JSON rows and rendered a page at a time
+TABLE = """                <div class="container-fluid">
+                    <input id="filter" class="form-control" type="search" placeholder="Filter by name, description or language"/>
+                    <table class="table table-sm table-striped">
+                        <thead>
+                            <tr>
+                                <th>Repository</th><th>Description</th><th>Language</th><th>Default branch</th>
+                                <th>Issues</th><th>Releases</th><th>Stars</th><th>Watchers</th>
+                                <th>Created at</th><th>Pushed at</th>
+                            </tr>
+                        </thead>
+                        <tbody id="rows"></tbody>
+                    </table>
+                    <div class="text-center">
+                        <button id="previous" class="btn btn-link" type="button">Previous</button>
+                        <span id="page" class="font-weight-light"></span>
+                        <button id="next" class="btn btn-link" type="button">Next</button>
+                    </div>
+                </div>
+                <script type="application/json" id="repositories">[{0}]</script>
+                <script>
+                    (function () {
+                        var PAGE_SIZE = 100;
+                        var data = JSON.parse(document.getElementById('repositories').textContent);
+                        var rows = data;
+                        var page = 0;
+
+                        function escape(value) {
+                            return String(value).replace(/[&<>"']/g, function (c) { return '&#' + c.charCodeAt(0) + ';'; });
+                        }
+
+                        function render() {
+                            var pages = Math.max(1, Math.ceil(rows.length / PAGE_SIZE));
+                            var html = rows.slice(page * PAGE_SIZE, (page + 1) * PAGE_SIZE).map(function (r) {
+                                // r: [id, owner, name, url, description, created_at, pushed_at, default_branch,
+                                //     issues, releases, stars, watchers, primary_language]
+                                return '<tr><td><a href="' + escape(r[3]) + '">' + escape(r[1] + '/' + r[2]) + '</a></td>'
+                                    + '<td>' + escape(r[4]) + '</td><td>' + escape(r[12]) + '</td><td>' + escape(r[7]) + '</td>'
+                                    + '<td>' + r[8] + '</td><td>' + r[9] + '</td><td>' + r[10] + '</td><td>' + r[11] + '</td>'
+                                    + '<td>' + escape(r[5]) + '</td><td>' + escape(r[6]) + '</td></tr>';
+                            });
+                            document.getElementById('rows').innerHTML = html.join('');
+                            document.getElementById('page').textContent = 'Page ' + (page + 1) + ' of ' + pages;
+                        }
+
+                        document.getElementById('previous').onclick = function () {
+                            page = Math.max(0, page - 1);
+                            render();
+                        };
+                        document.getElementById('next').onclick = function () {
+                            page = Math.min(Math.max(0, Math.ceil(rows.length / PAGE_SIZE) - 1), page + 1);
+                            render();
+                        };
+                        document.getElementById('filter').oninput = function () {
+                            var text = this.value.toLowerCase();
+                            rows = !text ? data : data.filter(function (r) {
+                                return (r[1] + '/' + r[2] + ' ' + r[4] + ' ' + r[12]).toLowerCase().indexOf(text) !== -1;
+                            });
+                            page = 0;
+                            render();
+                        };
+                        render();
+                    })();
+                </script>
+"""
+
+FOOTER = """              <script src="https://code.jquery.com/jquery-3.3.1.slim.min.js" integrity="sha384-q8i/X+965DzO0rT7abK41JStQIAqVgRVzpbzo5smXKp4YfRvH+8abtTE1Pi6jizo" crossorigin="anonymous"></script>
               <script src="https://cdnjs.cloudflare.com/ajax/libs/popper.js/1.14.3/umd/popper.min.js" integrity="sha384-ZMP7rVo3mIykV+2+9J3UJ46jBk0WLaUAdn689aCwoqbBJiSnjAK/l8WvCWPIPm49" crossorigin="anonymous"></script>
               <script src="https://stackpath.bootstrapcdn.com/bootstrap/4.1.3/js/bootstrap.min.js" integrity="sha384-ChfqqxuZUCnJSK3+MXmPNIyE6ZbWh2IMqE241rYiqJxyMiZ6OW/JmZQ5stwEULTy" crossorigin="anonymous"></script>
             </body>
         </html> 
-        """.format(
-        generation_date,
-        avg_repos,
-        avg_issues,
-        avg_releases,
-        avg_stars,
-        avg_watchers,
-        accordion)
+        """
+
+
+def create_report(repositories, paginated: bool = False) -> str:
+    """
+    Generate an HTML report for the crawled repositories
+
+    :param repositories: an iterable of dictionaries containing repositories metadata
+    :param paginated: render the repositories as a paginated table instead of an accordion of cards (see ReportWriter)
+    :return: the generated HTML report
+    """
+    report = ReportWriter(path=None, paginated=paginated)
+
+    for repository in repositories:
+        report.write(repository)
+
+    output = io.StringIO()
+    report.render(output)
+    report.close()
+
+    return output.getvalue()
+
+
+class ReportWriter(Writer):
+    """
+    Write the HTML report of the repositories. The summary statistics are computed in a single pass, while the body
+    of the report is spooled to a temporary file; the report is assembled when the writer is closed.
+    The paginated mode embeds the repositories as compact JSON and renders them a page at a time, which keeps the
+    report usable in the browser with 100k+ repositories.
+    """
+
+    def __init__(self, path: str, paginated: bool = False, batch_size: int = 100):
+        """
+        :param path: the path to the report; None not to write it on close (see render())
+        :param paginated: render the repositories as a paginated table instead of an accordion of cards
+        :param batch_size: the number of repositories to buffer before spooling them
+        """
+        super().__init__(path, batch_size)
+        self._paginated = paginated
+        self._body = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._count = 0
+        self._totals = dict(issues=0, releases=0, stars=0, watchers=0)
+
+    def _write_batch(self, batch: list):
+        for repository in batch:
+            for key in self._totals:
+                self._totals[key] += repository[key]
+
+        if self._paginated:
+            rows = ','.join(_generate_row(repository) for repository in batch)
+            self._body.write(rows if not self._count else ',' + rows)
+        else:
+            self._body.write(''.join('{0}\n'.format(_generate_card(repository)) for repository in batch))
+
+        self._count += len(batch)
+
+    def render(self, f):
+        """
+        Write the report
+
+        :param f: a text file object
+        """
+        self.flush()
+
+        now = datetime.datetime.now()
+        averages = {key: int(total / self._count) if self._count else 0 for key, total in self._totals.items()}
+
+        f.write(HEADER.format(datetime.date(now.year, now.month, now.day),
+                              self._count,
+                              averages['issues'],
+                              averages['releases'],
+                              averages['stars'],
+                              averages['watchers']))
+
+        before, after = (TABLE if self._paginated else ACCORDION).split('{0}')
+        f.write(before)
+        self._body.seek(0)
+        shutil.copyfileobj(self._body, f)
+        self._body.seek(0, io.SEEK_END)
+        f.write(after)
+        f.write(FOOTER)
+
+    def close(self):
+        if self.path:
+            with io.open(self.path, 'w', encoding='utf-8') as f:
+                self.render(f)
+
+        self._body.close()
+
+
+def _generate_row(metadata: dict) -> str:
+    row = [metadata.get('id'),
+           metadata.get('owner'),
+           metadata.get('name'),
+           metadata.get('url'),
+           metadata.get('description'),
+           metadata.get('created_at'),
+           metadata.get('pushed_at'),
+           metadata.get('default_branch'),
+           metadata.get('issues'),
+           metadata.get('releases'),
+           metadata.get('stars'),
+           metadata.get('watchers'),
+           metadata.get('primary_language')]
+
+    # Escape the closing tags, which would end the script element the rows are embedded in
+    return json.dumps(row, separators=(',', ':')).replace('</', '<\\/')
 
 
-def __generate_card(metadata: dict) -> str:
+def _generate_card(metadata: dict) -> str:
 
     return """
         <div class=\"card\">
@@ -127,10 +283,10 @@ def __generate_card(metadata: dict) -> str:
             </div>
         </div>
         """.format(metadata.get('id'),
-                   metadata.get('owner'),
-                   metadata.get('name'),
+                   html.escape(metadata.get('owner')),
+                   html.escape(metadata.get('name')),
                    metadata.get('url'),
-                   metadata.get('description'),
+                   html.escape(metadata.get('description')),
                    metadata.get('created_at'),
                    metadata.get('pushed_at'),
                    metadata.get('default_branch'),
@@ -0,0 +1,166 @@
+"""
+A module to store collected repositories in an indexed SQLite database, and to query them without touching GitHub
+"""
+
+import json
+import sqlite3
+
+from repocollector.records import FIELDS, Repository
+from repocollector.writers import Writer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repositories (id INTEGER PRIMARY KEY, default_branch TEXT, owner TEXT, name TEXT,
+                                         full_name TEXT, url TEXT, description TEXT, issues INTEGER, releases INTEGER,
+                                         stars INTEGER, watchers INTEGER, primary_language TEXT, created_at TEXT,
+                                         pushed_at TEXT, dirs TEXT);
+CREATE INDEX IF NOT EXISTS repositories_language_stars ON repositories (primary_language, stars);
+CREATE INDEX IF NOT EXISTS repositories_stars ON repositories (stars);
+CREATE INDEX IF NOT EXISTS repositories_pushed_at ON repositories (pushed_at);
+CREATE INDEX IF NOT EXISTS repositories_created_at ON repositories (created_at);
+CREATE TABLE IF NOT EXISTS dirs (name TEXT, repository INTEGER, PRIMARY KEY (name, repository)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dirs_repository ON dirs (repository);
+"""
+
+# Full-text index of the descriptions, keyed on the repository id. Not every SQLite build has FTS5: without it,
+# descriptions are matched with LIKE
+FTS_SCHEMA = 'CREATE VIRTUAL TABLE IF NOT EXISTS descriptions USING fts5(description)'
+
+# The fields query() can sort on
+ORDER_BY = ('id', 'stars', 'issues', 'releases', 'watchers', 'created_at', 'pushed_at', 'full_name')
+
+
+def _fts_query(text: str) -> str:
+    """
+    :param text: words, as typed by a user (e.g., c++ "infrastructure as code")
+    :return: an FTS5 query matching the descriptions containing all the words, whatever FTS5 operators or punctuation
+    they contain
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+class RepositoryStore(Writer):
+    """
+    A SQLite store of repositories, indexed on language, stars, push and creation dates, with a full-text index of the
+    descriptions and an inverted index of the root directories. It is a Writer: repositories are inserted (or
+    replaced, by id) in a transaction per batch while they are collected, and can be queried in the meantime.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000):
+        """
+        :param path: the path to the SQLite file; it is created if it does not exist
+        :param batch_size: the number of repositories to buffer before writing them
+        """
+        super().__init__(path, batch_size)
+
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(SCHEMA)
+
+        try:
+            self._connection.execute(FTS_SCHEMA)
+            self._fts = True
+        except sqlite3.OperationalError:
+            self._fts = False
+
+    def _write_batch(self, batch: list):
+        # The dirs are stored as a JSON list too, to return them in their order
+        rows = [[repository[field] for field in FIELDS[:-1]] + [json.dumps(list(repository['dirs'] or []))]
+                for repository in batch]
+
+        with self._connection:
+            self._connection.executemany(f'INSERT OR REPLACE INTO repositories VALUES ({", ".join("?" * len(FIELDS))})',
+                                         rows)
+
+            ids = [(repository['id'],) for repository in batch]
+            self._connection.executemany('DELETE FROM dirs WHERE repository = ?', ids)
+            self._connection.executemany('INSERT OR IGNORE INTO dirs VALUES (?, ?)',
+                                         [(directory, repository['id'])
+                                          for repository in batch for directory in repository['dirs'] or []])
+
+            if self._fts:
+                self._connection.executemany('DELETE FROM descriptions WHERE rowid = ?', ids)
+                self._connection.executemany('INSERT INTO descriptions (rowid, description) VALUES (?, ?)',
+                                             [(repository['id'], repository['description']) for repository in batch
+                                              if repository['description']])
+
+    def close(self):
+        super().close()
+        self._connection.close()
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM repositories').fetchone()[0]
+
+    def query(self,
+              primary_language: str = None,
+              min_stars: int = 0,
+              min_releases: int = 0,
+              min_watchers: int = 0,
+              min_issues: int = 0,
+              created_since: str = None,
+              created_until: str = None,
+              pushed_after: str = None,
+              dirs=(),
+              text: str = None,
+              order_by: str = 'stars',
+              limit: int = None):
+        """
+        Find the stored repositories matching all the given filters
+
+        :param primary_language: the primary language of the repositories, lowercase (e.g., python)
+        :param min_stars: the minimum number of stars
+        :param min_releases: the minimum number of releases
+        :param min_watchers: the minimum number of watchers
+        :param min_issues: the minimum number of issues
+        :param created_since: the earliest creation date, as an ISO 8601 string (e.g., 2020-01-01)
+        :param created_until: the latest creation date, as an ISO 8601 string
+        :param pushed_after: the earliest push date, as an ISO 8601 string
+        :param dirs: root directories the repositories must all have (e.g., ['tests'])
+        :param text: words the descriptions must all contain
+        :param order_by: the field to sort by, descending (one of ORDER_BY)
+        :param limit: the maximum number of repositories to return
+        :return: a generator of Repository records
+        """
+        if order_by not in ORDER_BY:
+            raise ValueError(f'order_by must be one of {", ".join(ORDER_BY)}')
+
+        conditions = ['stars >= ?', 'releases >= ?', 'watchers >= ?', 'issues >= ?']
+        parameters = [min_stars, min_releases, min_watchers, min_issues]
+
+        if primary_language:
+            conditions.append('primary_language = ?')
+            parameters.append(primary_language.lower())
+
+        if created_since:
+            conditions.append('created_at >= ?')
+            parameters.append(created_since)
+
+        if created_until:
+            # Dates without a time include the whole day
+            conditions.append('created_at <= ?')
+            parameters.append(created_until if 'T' in created_until else f'{created_until}T23:59:59Z')
+
+        if pushed_after:
+            conditions.append('pushed_at >= ?')
+            parameters.append(pushed_after)
+
+        for directory in dirs:
+            conditions.append('id IN (SELECT repository FROM dirs WHERE name = ?)')
+            parameters.append(directory)
+
+        words = text.split() if text else []
+
+        if words and self._fts:
+            conditions.append('id IN (SELECT rowid FROM descriptions WHERE descriptions MATCH ?)')
+            parameters.append(_fts_query(text))
+        else:
+            for word in words:
+                conditions.append('description LIKE ?')
+                parameters.append(f'%{word}%')
+
+        sql = f'SELECT * FROM repositories WHERE {" AND ".join(conditions)} ORDER BY {order_by} DESC'
+
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+
+        for row in self._connection.execute(sql, parameters):
+            yield Repository(*row[:-1], dirs=json.loads(row[-1]))
@@ -0,0 +1,149 @@
+"""
+A module to stream collected repositories to disk as they are collected, in several formats
+"""
+
+import csv
+import io
+import json
+
+from repocollector.records import FIELDS, RepositoryBatch
+
+
+class Writer:
+    """
+    Base class of the writers. Repositories are buffered and flushed to disk in batches, so that the output can be
+    read (e.g., tailed) while the collection is still running, and memory use does not grow with the result size.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100):
+        """
+        :param path: the path to the output file
+        :param batch_size: the number of repositories to buffer before writing them
+        """
+        self.path = path
+        self._batch_size = batch_size
+        self._batch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, repository):
+        """
+        :param repository: a repository, as returned by GithubRepositoriesCollector.collect_repositories
+        """
+        self._batch.append(repository)
+
+        if len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            self._write_batch(self._batch)
+            self._batch = []
+
+    def close(self):
+        self.flush()
+
+    def _write_batch(self, batch: list):
+        raise NotImplementedError
+
+
+class JSONLinesWriter(Writer):
+    """
+    Write a repository per line, as JSON
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, append: bool = False):
+        """
+        :param path: the path to the output file
+        :param batch_size: the number of repositories to buffer before writing them
+        :param append: append to the file instead of overwriting it
+        """
+        super().__init__(path, batch_size)
+        self._file = io.open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def _write_batch(self, batch: list):
+        self._file.write(''.join(json.dumps(dict(repository)) + '\n' for repository in batch))
+        self._file.flush()
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class JSONArrayWriter(Writer):
+    """
+    Write the repositories as a JSON array, incrementally. The array is closed when the writer is closed.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100):
+        super().__init__(path, batch_size)
+        self._file = io.open(path, 'w', encoding='utf-8')
+        self._file.write('[')
+        self._empty = True
+
+    def _write_batch(self, batch: list):
+        items = ', '.join(json.dumps(dict(repository)) for repository in batch)
+        self._file.write(items if self._empty else ', ' + items)
+        self._file.flush()
+        self._empty = False
+
+    def close(self):
+        super().close()
+        self._file.write(']')
+        self._file.close()
+
+
+class CSVWriter(Writer):
+    """
+    Write a repository per row. The root directories are joined by semicolons.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100):
+        super().__init__(path, batch_size)
+        self._file = io.open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write_batch(self, batch: list):
+        self._writer.writerows(dict(repository, dirs=';'.join(repository['dirs'] or [])) for repository in batch)
+        self._file.flush()
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class ParquetWriter(Writer):
+    """
+    Write the repositories as a Parquet file, a row group per batch. Requires pyarrow.
+    """
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        super().__init__(path, batch_size)
+
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('pyarrow is required to write Parquet files: pip install pyarrow')
+
+        self._writer = pyarrow.parquet.ParquetWriter(path, RepositoryBatch.arrow_schema())
+
+    def _write_batch(self, batch: list):
+        self._writer.write_table(RepositoryBatch(batch).to_arrow())
+
+    def close(self):
+        super().close()
+        self._writer.close()
+
+
+# The writers by output format, i.e., the extension of the output file
+WRITERS = {
+    'json': JSONArrayWriter,
+    'jsonl': JSONLinesWriter,
+    'csv': CSVWriter,
+    'parquet': ParquetWriter
+}
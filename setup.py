@@ -8,7 +8,7 @@ with open("requirements.txt", "r") as reqs_file:
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
-VERSION = "0.0.5"
+VERSION = "0.1.0"
 
 setup(name='repositories_collector',
       version=VERSION,
@@ -20,7 +20,7 @@ setup(name='repositories_collector',
       author_email='stefano.dallapalma0@gmail.com',
       url='https://github.com/radon-h2020/radon-repositories-collector',
       download_url=f'https://github.com/radon-h2020/radon-repositories-collector/archive/{VERSION}.tar.gz',
-      packages=find_packages(exclude=('tests',)),
+      packages=find_packages(exclude=('tests', 'benchmarks')),
       entry_points={
           'console_scripts': ['repositories-collector=repocollector.cli:main'],
       },
@@ -32,5 +32,10 @@ setup(name='repositories_collector',
           "Topic :: Software Development :: Libraries :: Python Modules",
           "Operating System :: OS Independent"
       ],
-      install_requires=requirements
+      install_requires=requirements,
+      extras_require={
+          'parquet': ['pyarrow'],
+          'orjson': ['orjson'],
+          'http2': ['httpx[http2]'],
+      }
 )
@@ -0,0 +1,115 @@
+import tempfile
+import unittest
+
+from datetime import datetime
+from unittest import mock
+
+from benchmarks.stub_server import serve
+from repocollector.cache import ResponseCache
+from repocollector.github import GithubRepositoriesCollector, Transport
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        self.now += 1
+        return self.now
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.clock = Clock()
+
+        patcher = mock.patch('repocollector.cache.time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def cache(self, **kwargs) -> ResponseCache:
+        cache = ResponseCache(self.folder.name, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_key_ignores_whitespace_but_not_variables(self):
+        key = ResponseCache.key('url', 'query { a }', {'after': 'x'})
+
+        self.assertEqual(key, ResponseCache.key('url', 'query {\n  a\n}', {'after': 'x'}))
+        self.assertNotEqual(key, ResponseCache.key('url', 'query { a }', {'after': 'y'}))
+        self.assertNotEqual(key, ResponseCache.key('other', 'query { a }', {'after': 'x'}))
+
+    def test_hits_and_misses(self):
+        cache = self.cache()
+        cache.put('a', b'body', etag='"etag"')
+
+        self.assertIsNone(cache.get('b'))
+        cached = cache.get('a')
+
+        self.assertEqual((cached.body, cached.etag, cached.fresh), (b'body', '"etag"', True))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_expired_entries_are_kept_for_revalidation(self):
+        cache = self.cache(ttl=10)
+        cache.put('a', b'body', etag='"etag"')
+
+        self.clock.now += 100
+        cached = cache.get('a')
+        self.assertFalse(cached.fresh)
+        self.assertEqual(cached.etag, '"etag"')
+
+        cache.refresh('a')
+        self.assertTrue(cache.get('a').fresh)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.cache(max_size=30)
+
+        for key in ('a', 'b', 'c'):
+            cache.put(key, b'0123456789')
+
+        cache.get('a')
+        cache.put('d', b'0123456789')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertTrue(all(cache.get(key) for key in ('a', 'c', 'd')))
+        self.assertEqual(cache.size, 30)
+
+    def test_size_survives_reopening(self):
+        self.cache().put('a', b'0123456789')
+
+        self.assertEqual(self.cache().size, 10)
+
+
+class CachedHarvestTestCase(unittest.TestCase):
+
+    def test_second_harvest_is_served_from_the_cache(self):
+        job = dict(since=datetime(2020, 1, 1), until=datetime(2020, 1, 31), pushed_after=datetime(2014, 1, 1))
+        server = serve(size=500, since=job['since'], until=job['until'])
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = ResponseCache(folder)
+            self.addCleanup(cache.close)
+
+            runs = []
+            requests = []
+
+            for _ in range(2):
+                github = GithubRepositoriesCollector('token', cache=cache, transport=Transport(url=server.url))
+                runs.append([repo['id'] for repo in github.collect_repositories(**job)])
+                requests.append(server.stats()['requests'])
+
+            self.assertEqual(runs[0], runs[1])
+            self.assertEqual(requests[0], requests[1])
+            self.assertEqual(github.stats.get('search_requests', 0), 0)
+            self.assertGreater(github.stats['search_cache_hits'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
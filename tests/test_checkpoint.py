@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from datetime import datetime
+
+from benchmarks.stub_server import serve
+from repocollector.checkpoint import Checkpoint, criteria
+from repocollector.github import GithubRepositoriesCollector, Transport
+
+JOB = dict(since=datetime(2020, 1, 1), until=datetime(2020, 3, 31), pushed_after=datetime(2014, 1, 1))
+
+
+class CheckpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = serve(size=3000, since=JOB['since'], until=JOB['until'])
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'checkpoint.sqlite')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.folder.cleanup()
+
+    def github(self):
+        return GithubRepositoriesCollector('token', transport=Transport(url=self.server.url))
+
+    def test_resume_skips_the_pages_already_collected(self):
+        expected = {repo['id'] for repo in self.github().collect_repositories(**JOB, dirs=False)}
+
+        with Checkpoint(self.path) as checkpoint:
+            repositories = self.github().collect_repositories(**JOB, dirs=False, checkpoint=checkpoint)
+            first = [repo['id'] for _, repo in zip(range(1500), repositories)]
+            repositories.close()
+
+            unfinished = [shard for shard in checkpoint.shards() if not shard[-1]]
+            self.assertTrue(unfinished)
+
+        github = self.github()
+
+        with Checkpoint(self.path) as checkpoint:
+            resumed = [repo['id'] for repo in github.collect_repositories(**JOB, dirs=False, checkpoint=checkpoint)]
+
+            self.assertTrue(all(done for *_, done in checkpoint.shards()))
+
+        self.assertEqual(len(resumed), len(set(resumed)))
+        self.assertEqual(set(resumed), expected)
+        self.assertLessEqual(set(first), set(resumed))
+
+        # Neither the plan nor the pages of the first run are fetched again
+        self.assertNotIn('count_requests', github.stats)
+        self.assertLess(github.stats['search_requests'], len(unfinished) + len(expected) / 100)
+
+    def test_checkpoint_of_other_criteria_is_refused(self):
+        with Checkpoint(self.path) as checkpoint:
+            list(self.github().collect_repositories(**JOB, dirs=False, checkpoint=checkpoint))
+
+        with Checkpoint(self.path) as checkpoint, self.assertRaises(ValueError):
+            self.github().collect_repositories(**dict(JOB, min_stars=10), dirs=False, checkpoint=checkpoint)
+
+    def test_criteria_are_saved_with_the_shards(self):
+        harvest = criteria([JOB], dirs=False)
+
+        with Checkpoint(self.path) as checkpoint:
+            self.assertFalse(checkpoint.start(harvest))
+            self.assertIsNone(checkpoint.criteria())
+
+            checkpoint.save_plans(harvest, [[(JOB['since'], JOB['until'])]])
+
+            self.assertTrue(checkpoint.start(harvest))
+            self.assertEqual(checkpoint.criteria(), harvest)
+            self.assertEqual(checkpoint.shards(), [(1, 0, JOB['since'], JOB['until'], None, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
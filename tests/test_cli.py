@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from datetime import datetime
+from unittest import mock
+
+from repocollector import cli, store, writers
+
+
+class CliTestCase(unittest.TestCase):
+
+    def test_formats_and_order_by_match_the_writers_and_the_store(self):
+        self.assertEqual(set(cli.FORMATS), set(writers.WRITERS) | {'sqlite'})
+        self.assertEqual(cli.ORDER_BY, store.ORDER_BY)
+
+    def test_import_does_not_load_the_writers_nor_the_store(self):
+        script = 'import sys, repocollector.cli; print(" ".join(sorted(sys.modules)))'
+        modules = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, text=True,
+                                 check=True).stdout.split()
+
+        for module in ('repocollector.store', 'repocollector.writers', 'sqlite3', 'csv', 'requests'):
+            self.assertNotIn(module, modules)
+
+    def test_primary_languages_do_not_consume_the_positional_arguments(self):
+        args = cli.get_parser().parse_args(['--primary-language', 'python', '2020-01-01', '2020-02-01', '/tmp'])
+
+        self.assertEqual((args.since, args.until, args.dest), (datetime(2020, 1, 1), datetime(2020, 2, 1), '/tmp'))
+        self.assertEqual([job['primary_language'] for job in cli.get_jobs(args, args.date_push)], ['python'])
+
+    def test_primary_languages_are_repeated_or_comma_separated(self):
+        args = cli.get_parser().parse_args(['2020-01-01', '2020-02-01', '/tmp', '--primary-language', 'python,java',
+                                            '--primary-language', 'go'])
+        self.assertEqual([job['primary_language'] for job in cli.get_jobs(args, args.date_push)],
+                         ['python', 'java', 'go'])
+
+        args = cli.get_parser().parse_args(['2020-01-01', '2020-02-01', '/tmp'])
+        self.assertEqual([job['primary_language'] for job in cli.get_jobs(args, args.date_push)], [None])
+
+    @mock.patch.dict(sys.modules, {'pyarrow': None, 'pyarrow.parquet': None})
+    def test_missing_dependencies_leave_the_outputs_untouched(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'repositories.json')
+            with open(path, 'w') as f:
+                f.write('[]')
+
+            with self.assertRaises(SystemExit) as raised, mock.patch('sys.stdout'):
+                cli.get_writers(folder, ['json', 'parquet'], paginated_report=False)
+
+            self.assertEqual(raised.exception.code, 1)
+            self.assertEqual(os.listdir(folder), ['repositories.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
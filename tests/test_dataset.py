@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+
+from datetime import datetime
+
+from repocollector import dataset
+from repocollector.writers import WRITERS
+
+
+def repository(id: int, pushed_at: str = '2020-06-01T00:00:00Z', stars: int = 0, **fields) -> dict:
+    return dict(dict(id=id, default_branch='main', owner='owner', name=f'repo{id}', full_name=f'owner/repo{id}',
+                     url=f'https://github.com/owner/repo{id}', description=f'Repository {id}', issues=0, releases=0,
+                     stars=stars, watchers=0, primary_language='python', created_at='2020-01-01T00:00:00Z',
+                     pushed_at=pushed_at, dirs=['src']), **fields)
+
+
+class IncrementalTestCase(unittest.TestCase):
+
+    def test_watermark_is_the_most_recent_push(self):
+        repositories = [repository(1, '2020-06-01T00:00:00Z'), repository(2, '2021-01-02T03:04:05Z'),
+                        repository(3, None), repository(4, 'not a date')]
+
+        self.assertEqual(dataset.watermark(repositories), datetime(2021, 1, 2, 3, 4, 5))
+        self.assertIsNone(dataset.watermark([]))
+
+    def test_matches(self):
+        self.assertTrue(dataset.matches(repository(1, stars=10), min_stars=10))
+        self.assertFalse(dataset.matches(repository(1, stars=9), min_stars=10))
+        self.assertFalse(dataset.matches(repository(1), min_releases=1))
+
+    def test_merge_updates_the_changed_repositories_in_place_and_appends_the_new_ones(self):
+        previous = [repository(1, stars=5), repository(2, stars=5), repository(3, stars=5)]
+        changed = [repository(4, '2021-01-01T00:00:00Z', stars=5), repository(2, '2021-01-01T00:00:00Z', stars=8)]
+
+        merged = list(dataset.merge(previous, changed))
+
+        self.assertEqual([repo['id'] for repo in merged], [1, 2, 3, 4])
+        self.assertEqual(merged[1]['stars'], 8)
+
+    def test_merge_drops_the_repositories_below_the_thresholds(self):
+        previous = [repository(1, stars=5), repository(2, stars=5)]
+        changed = [repository(2, '2021-01-01T00:00:00Z', stars=1), repository(3, '2021-01-01T00:00:00Z', stars=1)]
+
+        self.assertEqual([repo['id'] for repo in dataset.merge(previous, changed, min_stars=5)], [1])
+
+
+class MergeIndexTestCase(unittest.TestCase):
+
+    def test_the_most_recent_push_wins(self):
+        with dataset.MergeIndex(batch_size=2) as index:
+            read = index.add([repository(1, '2020-06-01T00:00:00Z', stars=1),
+                              repository(2, '2020-06-01T00:00:00Z', stars=1),
+                              repository(1, '2021-01-01T00:00:00Z', stars=2),
+                              repository(1, '2020-01-01T00:00:00Z', stars=3),
+                              repository(2, None, stars=4),
+                              repository(3, 'None', stars=5),
+                              repository(3, '2020-06-01T00:00:00Z', stars=6)])
+
+            self.assertEqual((read, len(index)), (7, 3))
+            self.assertEqual([(repo['id'], repo['stars']) for repo in index.repositories()], [(1, 2), (2, 1), (3, 6)])
+
+    def test_ties_go_to_the_repository_added_last(self):
+        with dataset.MergeIndex() as index:
+            index.add([repository(1, stars=1)])
+            index.add([repository(1, stars=2)])
+
+            self.assertEqual([repo['stars'] for repo in index.repositories()], [2])
+
+    def test_thresholds_apply_to_the_most_recent_version(self):
+        with dataset.MergeIndex() as index:
+            index.add([repository(1, '2020-01-01T00:00:00Z', stars=10), repository(1, '2021-01-01T00:00:00Z', stars=1),
+                       repository(2, stars=10)])
+
+            self.assertEqual([repo['id'] for repo in index.repositories(min_stars=5)], [2])
+
+    def test_temporary_index_is_removed_on_close(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with dataset.MergeIndex(directory=folder) as index:
+                index.add([repository(1)])
+                self.assertTrue(os.path.exists(index.path))
+
+            self.assertEqual(os.listdir(folder), [])
+
+
+class MergeOutputsTestCase(unittest.TestCase):
+
+    def test_outputs_of_any_format_are_merged_by_id(self):
+        outputs = {'csv': [repository(1, '2020-01-01T00:00:00Z', stars=1), repository(2, stars=1)],
+                   'json': [repository(1, '2021-01-01T00:00:00Z', stars=2), repository(3, stars=1)],
+                   'jsonl': [repository(3, '2019-01-01T00:00:00Z', stars=3), repository(4, stars=0)]}
+
+        with tempfile.TemporaryDirectory() as folder:
+            paths = [os.path.join(folder, f'repositories.{fmt}') for fmt in outputs]
+
+            for path, (fmt, repositories) in zip(paths, outputs.items()):
+                with WRITERS[fmt](path) as writer:
+                    for repo in repositories:
+                        writer.write(repo)
+
+            merged = [(repo['id'], repo['stars']) for repo in dataset.merge_outputs(paths, min_stars=1,
+                                                                                     directory=folder)]
+
+            self.assertEqual(merged, [(1, 2), (2, 1), (3, 1)])
+            self.assertEqual(sorted(os.listdir(folder)), ['repositories.csv', 'repositories.json',
+                                                          'repositories.jsonl'])
+
+
+if __name__ == '__main__':
+    unittest.main()
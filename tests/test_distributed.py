@@ -0,0 +1,85 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from datetime import datetime
+
+from benchmarks.stub_server import serve
+from repocollector import distributed
+from repocollector.github import GithubRepositoriesCollector, Transport
+
+JOB = dict(since=datetime(2020, 1, 1), until=datetime(2020, 3, 31), pushed_after=datetime(2014, 1, 1))
+
+
+class WorkerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = serve(size=2000, since=JOB['since'], until=JOB['until'])
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.folder.cleanup()
+
+    def github(self):
+        return GithubRepositoriesCollector('token', max_retries=0, transport=Transport(url=self.server.url))
+
+    def test_run_collects_the_shards_given_up_on_once_github_recovers(self):
+        queue = distributed.ShardQueue(os.path.join(self.folder.name, 'queue.sqlite'), lease_seconds=1.5,
+                                       max_leases=1000)
+        self.addCleanup(queue.close)
+
+        expected = {repository['id'] for repository in self.github().collect_many([JOB], dirs=False)}
+        self.assertGreater(distributed.coordinate(self.github(), queue, [JOB], dirs=False), 1)
+
+        # Every search page fails, and the collector gives up on the shards at the first failure
+        self.server.error_rate = 1.0
+
+        worker = distributed.Worker(self.github(), queue, self.folder.name, name='worker', poll_seconds=0.1)
+        thread = threading.Thread(target=worker.run, daemon=True)
+        thread.start()
+
+        time.sleep(2)
+        self.server.error_rate = 0.0
+        thread.join(timeout=30)
+
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(queue.finished())
+        self.assertEqual({repository['id'] for repository in distributed.merge([worker.path])}, expected)
+
+    def test_run_fails_the_shards_out_of_leases(self):
+        queue = distributed.ShardQueue(os.path.join(self.folder.name, 'queue.sqlite'), max_leases=2)
+        self.addCleanup(queue.close)
+
+        shards = distributed.coordinate(self.github(), queue, [JOB], dirs=False)
+        self.server.error_rate = 1.0
+
+        worker = distributed.Worker(self.github(), queue, self.folder.name, name='worker', poll_seconds=0.01)
+        worker.run()
+
+        self.assertTrue(queue.finished())
+        self.assertEqual(queue.progress(), dict(planned=True, shards=shards, done=0, leased=0, failed=shards,
+                                                pending=0))
+
+        # Coordinating the harvest again retries the failed shards
+        self.server.error_rate = 0.0
+        self.assertEqual(distributed.coordinate(self.github(), queue, [JOB], dirs=False), shards)
+        self.assertEqual(queue.progress()['pending'], shards)
+
+    def test_unplanned_queue_is_not_finished(self):
+        queue = distributed.ShardQueue(os.path.join(self.folder.name, 'queue.sqlite'))
+        self.addCleanup(queue.close)
+
+        self.assertFalse(queue.finished())
+        self.assertFalse(queue.progress()['planned'])
+
+        distributed.coordinate(self.github(), queue, [JOB], dirs=False)
+        self.assertTrue(queue.progress()['planned'])
+        self.assertFalse(queue.finished())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import contextlib
+import io
+import threading
+import unittest
+
+from datetime import datetime
+from unittest import mock
+
+from benchmarks.stub_server import Index, generate, serve
+from repocollector.github import SEARCH_LIMIT, GithubRepositoriesCollector, PlanningError, Transport
+
+JOB = dict(since=datetime(2020, 1, 1), until=datetime(2020, 3, 31), pushed_after=datetime(2014, 1, 1))
+
+
+class Response:
+    status_code = 502
+    content = b''
+    headers = {}
+    text = ''
+
+
+class FailingCounts(Transport):
+    """
+    A transport answering the first <failures> count probes with a 502
+    """
+
+    def __init__(self, failures: int, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+
+    def post(self, body: bytes, headers: dict):
+        if self.failures and b'repositoryCount' in body:
+            self.failures -= 1
+            return Response()
+
+        return super().post(body, headers)
+
+
+@mock.patch('repocollector.github.backoff', lambda attempt, **kwargs: 0)
+class PlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = serve(size=3000, since=JOB['since'], until=JOB['until'])
+
+        # The collector reports the failed queries on stdout
+        redirect = contextlib.redirect_stdout(io.StringIO())
+        redirect.__enter__()
+        self.addCleanup(redirect.__exit__, None, None, None)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def github(self, failures: int = 0, max_retries: int = 1):
+        return GithubRepositoriesCollector('token', max_retries=max_retries,
+                                           transport=FailingCounts(failures, url=self.server.url))
+
+    def test_failed_probes_are_run_again(self):
+        events = []
+        github = self.github(failures=2)
+        github.add_hook(lambda event, **fields: events.append((event, fields)))
+
+        self.assertEqual(github.plan_many([JOB]), self.github().plan_many([JOB]))
+        self.assertIn(('retry', dict(stage='count', reason='probe_failed')), events)
+
+    def test_windows_never_counted_are_not_planned(self):
+        with self.assertRaises(PlanningError):
+            self.github(failures=1000).plan_many([JOB])
+
+
+class ShardingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.repos = generate(5000, JOB['since'], JOB['until'])
+        self.server = serve(size=5000, since=JOB['since'], until=JOB['until'])
+        self.github = GithubRepositoriesCollector('token', transport=Transport(url=self.server.url))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def matching(self, since: datetime, until: datetime) -> list:
+        return Index(self.repos).search(GithubRepositoriesCollector.search_string(since=since, until=until,
+                                                                                 pushed_after=JOB['pushed_after']))
+
+    def test_shards_fit_under_the_search_limit_and_cover_the_window(self):
+        shards = self.github.plan_shards(**JOB)
+
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(shards, sorted(shards))
+        self.assertEqual((shards[0][0], shards[-1][1]), (JOB['since'], JOB['until']))
+
+        for (_, until), (since, _) in zip(shards, shards[1:]):
+            self.assertLess(until, since)
+
+        for since, until in shards:
+            self.assertLessEqual(len(self.matching(since, until)), SEARCH_LIMIT)
+
+        self.assertEqual(sum(len(self.matching(since, until)) for since, until in shards),
+                         len(self.matching(JOB['since'], JOB['until'])))
+
+    def test_collects_every_repository_once(self):
+        ids = [repo['id'] for repo in self.github.collect_repositories(**JOB, dirs=False)]
+
+        self.assertGreater(len(ids), SEARCH_LIMIT)
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), {repo['databaseId'] for repo in self.matching(JOB['since'], JOB['until'])})
+
+    def test_jobs_with_overlapping_windows_are_deduplicated(self):
+        first = dict(JOB, until=datetime(2020, 2, 29))
+        second = dict(JOB, since=datetime(2020, 2, 1))
+        ids = [repo['id'] for repo in self.github.collect_many([first, second], dirs=False)]
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), {repo['databaseId'] for repo in self.matching(JOB['since'], JOB['until'])})
+
+
+class ConcurrencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = serve(size=5000, since=JOB['since'], until=JOB['until'], latency=0.001)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def github(self, concurrency: int) -> GithubRepositoriesCollector:
+        return GithubRepositoriesCollector('token', concurrency=concurrency,
+                                           transport=Transport(url=self.server.url, pool_size=concurrency))
+
+    def test_concurrent_shards_are_merged_without_losses_nor_duplicates(self):
+        sequential = [repo['id'] for repo in self.github(1).collect_repositories(**JOB, dirs=False)]
+        concurrent = [repo['id'] for repo in self.github(4).collect_repositories(**JOB, dirs=False)]
+
+        self.assertEqual(len(concurrent), len(set(concurrent)))
+        self.assertEqual(set(concurrent), set(sequential))
+
+    def test_stopping_early_stops_the_workers(self):
+        threads = threading.active_count()
+        repositories = self.github(4).collect_repositories(**JOB, dirs=False)
+
+        for _ in zip(range(10), repositories):
+            pass
+        repositories.close()
+
+        for _ in range(50):
+            if threading.active_count() <= threads:
+                break
+            threading.Event().wait(0.1)
+
+        self.assertLessEqual(threading.active_count(), threads)
+
+
+class FailingSearch(Transport):
+    """
+    A transport answering the search pages of a given shard with a 502
+    """
+
+    def __init__(self, search: str, **kwargs):
+        super().__init__(**kwargs)
+        self.search = search.encode()
+
+    def post(self, body: bytes, headers: dict):
+        if self.search in body and b'edges' in body:
+            return Response()
+
+        return super().post(body, headers)
+
+
+@mock.patch('repocollector.github.backoff', lambda attempt, **kwargs: 0)
+class BatchingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = serve(size=5000, since=JOB['since'], until=JOB['until'])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def github(self, batch_size: int, transport: Transport = None) -> GithubRepositoriesCollector:
+        return GithubRepositoriesCollector('token', batch_size=batch_size, max_retries=1,
+                                           transport=transport or Transport(url=self.server.url))
+
+    def test_batched_shards_cost_fewer_requests(self):
+        single, batched = self.github(1), self.github(4)
+
+        self.assertEqual(sorted(repo['id'] for repo in batched.collect_repositories(**JOB, dirs=False)),
+                         sorted(repo['id'] for repo in single.collect_repositories(**JOB, dirs=False)))
+        self.assertLess(batched.stats['search_requests'], single.stats['search_requests'] / 2)
+        self.assertLess(batched.stats['count_requests'], single.stats['count_requests'])
+
+    def test_jobs_are_batched_together(self):
+        jobs = [dict(JOB, primary_language=language) for language in ('python', 'java', 'go')]
+
+        separately = {repo['id'] for job in jobs for repo in self.github(1).collect_many([job], dirs=False)}
+        together = [repo['id'] for repo in self.github(3).collect_many(jobs, dirs=False)]
+
+        self.assertEqual(len(together), len(set(together)))
+        self.assertEqual(set(together), separately)
+
+    def test_a_failing_shard_does_not_fail_its_batch(self):
+        shards = self.github(1).plan_shards(**JOB)
+        since, until = shards[len(shards) // 2]
+        failing = GithubRepositoriesCollector.search_string(since=since, until=until,
+                                                            pushed_after=JOB['pushed_after'])
+        github = self.github(4, FailingSearch(failing, url=self.server.url))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            ids = {repo['id'] for repo in github.collect_repositories(**JOB, dirs=False)}
+
+        missing = {repo['databaseId'] for repo in Index(generate(5000, JOB['since'], JOB['until'])).search(failing)}
+
+        self.assertEqual(github.stats['shards_failed'], 1)
+        self.assertFalse(ids & missing)
+        self.assertEqual(len(ids) + len(missing), len(list(self.github(1).collect_repositories(**JOB, dirs=False))))
+
+
+if __name__ == '__main__':
+    unittest.main()
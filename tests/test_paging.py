@@ -0,0 +1,84 @@
+import unittest
+
+from datetime import datetime
+
+from benchmarks.stub_server import serve
+from repocollector.github import GithubRepositoriesCollector, Transport
+from repocollector.paging import AdaptivePageSize
+
+
+class AdaptivePageSizeTestCase(unittest.TestCase):
+
+    def test_bounds_are_checked(self):
+        for minimum, maximum in ((0, 100), (50, 10), (10, 101)):
+            with self.assertRaises(ValueError):
+                AdaptivePageSize(maximum=maximum, minimum=minimum)
+
+    def test_shrinks_down_to_the_minimum(self):
+        page_size = AdaptivePageSize(maximum=100, minimum=10)
+        sizes = []
+
+        for _ in range(5):
+            page_size.shrink()
+            sizes.append(page_size.size)
+
+        self.assertEqual(sizes, [50, 25, 12, 10, 10])
+        self.assertTrue(page_size.at_minimum)
+
+    def test_grows_back_after_consecutive_successes(self):
+        page_size = AdaptivePageSize(maximum=100, minimum=10, grow_after=3)
+        page_size.shrink()
+        page_size.shrink()
+
+        for _ in range(2):
+            page_size.succeeded()
+        self.assertEqual(page_size.size, 25)
+
+        page_size.succeeded()
+        self.assertEqual(page_size.size, 50)
+
+        for _ in range(6):
+            page_size.succeeded()
+        self.assertEqual(page_size.size, 100)
+
+    def test_failures_restart_the_count_of_successes(self):
+        page_size = AdaptivePageSize(maximum=100, minimum=10, grow_after=3)
+        page_size.shrink()
+        page_size.succeeded()
+        page_size.succeeded()
+        page_size.shrink()
+        page_size.succeeded()
+        page_size.succeeded()
+
+        self.assertEqual(page_size.size, 25)
+
+    def test_costly_pages_shrink(self):
+        page_size = AdaptivePageSize(max_cost=10)
+        page_size.succeeded(cost=11)
+
+        self.assertEqual(page_size.size, 50)
+
+
+class AdaptivePagingTestCase(unittest.TestCase):
+
+    def test_heavy_pages_are_retried_smaller_instead_of_truncated(self):
+        job = dict(since=datetime(2020, 1, 1), until=datetime(2020, 2, 29), pushed_after=datetime(2014, 1, 1))
+        collected = []
+
+        for max_page_size in (None, 30):
+            server = serve(size=2000, since=job['since'], until=job['until'], max_page_size=max_page_size)
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+
+            page_size = AdaptivePageSize(grow_after=1000)
+            github = GithubRepositoriesCollector('token', page_size=page_size, transport=Transport(url=server.url))
+            collected.append(sorted(repo['id'] for repo in github.collect_repositories(**job, dirs=False)))
+
+        self.assertEqual(collected[0], collected[1])
+        self.assertLessEqual(page_size.size, 30)
+        self.assertFalse(github.stats.get('shards_failed'))
+        self.assertGreater(github.stats['search_server_errors'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import time
+import unittest
+
+from datetime import datetime, timezone
+
+from repocollector.ratelimit import RateLimiter, TokenPool, backoff, parse_reset_at
+
+
+def reset_in(seconds: float) -> str:
+    return datetime.fromtimestamp(time.time() + seconds, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class RateLimiterTestCase(unittest.TestCase):
+
+    def test_parse_reset_at(self):
+        self.assertEqual(parse_reset_at('1970-01-01T00:01:00Z'), 60)
+
+    def test_no_wait_before_the_first_response(self):
+        limiter = RateLimiter(burst=1)
+
+        self.assertEqual([limiter.reserve() for _ in range(5)], [0.0] * 5)
+
+    def test_burst_then_pace_the_remaining_points_until_the_reset(self):
+        limiter = RateLimiter(burst=2)
+        limiter.update(limit=5000, cost=1, remaining=100, reset_at=reset_in(1000))
+
+        self.assertEqual([limiter.reserve(), limiter.reserve()], [0.0, 0.0])
+
+        # 98 points left for about 1000 seconds: about 10 seconds per point
+        self.assertAlmostEqual(limiter.reserve(), 10, delta=1)
+        self.assertGreater(limiter.delay(), 10)
+
+    def test_wait_for_the_reset_when_the_quota_is_exhausted(self):
+        limiter = RateLimiter()
+        limiter.update(limit=5000, cost=1, remaining=0, reset_at=reset_in(600))
+
+        self.assertAlmostEqual(limiter.delay(), 600, delta=5)
+
+    def test_exhaust(self):
+        limiter = RateLimiter()
+        limiter.exhaust(time.time() + 120)
+
+        self.assertAlmostEqual(limiter.delay(cost=1), 120, delta=5)
+
+
+class TokenPoolTestCase(unittest.TestCase):
+
+    def test_requires_a_token(self):
+        with self.assertRaises(ValueError):
+            TokenPool([])
+
+    def test_acquire_avoids_the_exhausted_tokens(self):
+        pool = TokenPool(['a', 'b'])
+        pool.limiter('a').update(limit=5000, cost=1, remaining=0, reset_at=reset_in(600))
+        pool.limiter('b').update(limit=5000, cost=1, remaining=4000, reset_at=reset_in(600))
+
+        self.assertEqual([pool.acquire() for _ in range(3)], ['b'] * 3)
+        self.assertEqual(pool.remaining, 3997)
+
+
+class BackoffTestCase(unittest.TestCase):
+
+    def test_exponential_and_capped(self):
+        for attempt in range(10):
+            wait = backoff(attempt, base=1, cap=30)
+            self.assertLessEqual(min(30, 2 ** attempt) / 2, wait)
+            self.assertLessEqual(wait, min(30, 2 ** attempt))
+
+    def test_retry_after(self):
+        self.assertTrue(5 <= backoff(3, retry_after=5, base=1) <= 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
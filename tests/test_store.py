@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+
+from repocollector.store import RepositoryStore
+
+
+def repository(id: int, description: str, **fields) -> dict:
+    return dict(dict(id=id, default_branch='main', owner='owner', name=f'repo{id}', full_name=f'owner/repo{id}',
+                     url=f'https://github.com/owner/repo{id}', description=description, issues=0, releases=0,
+                     stars=0, watchers=0, primary_language='python', created_at='2020-01-01T00:00:00Z',
+                     pushed_at='2020-06-01T00:00:00Z', dirs=['src']), **fields)
+
+
+class StoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.store = RepositoryStore(os.path.join(self.folder.name, 'repositories.sqlite'))
+
+        for repo in (repository(1, 'A C++ compiler'), repository(2, 'Infrastructure as code, in "YAML"'),
+                     repository(3, 'A python library')):
+            self.store.write(repo)
+        self.store.flush()
+
+    def tearDown(self):
+        self.store.close()
+        self.folder.cleanup()
+
+    def ids(self, **filters) -> list:
+        return sorted(repo['id'] for repo in self.store.query(**filters))
+
+    def test_text_matches_all_the_words(self):
+        self.assertEqual(self.ids(text='infrastructure code'), [2])
+        self.assertEqual(self.ids(text='infrastructure python'), [])
+
+    def test_text_with_fts_syntax_is_matched_as_words(self):
+        self.assertEqual(self.ids(text='c++'), [1])
+        self.assertEqual(self.ids(text='"yaml'), [2])
+        self.assertEqual(self.ids(text='python AND OR NOT'), [])
+        self.assertEqual(self.ids(text='library NEAR('), [])
+
+
+class QueryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.store = RepositoryStore(os.path.join(self.folder.name, 'repositories.sqlite'), batch_size=2)
+
+        for repo in (repository(1, 'One', stars=50, primary_language='python', dirs=['src', 'tests'],
+                                created_at='2020-01-01T10:00:00Z', pushed_at='2020-03-01T00:00:00Z'),
+                     repository(2, 'Two', stars=10, primary_language='java', dirs=['src'],
+                                created_at='2020-01-02T10:00:00Z', pushed_at='2020-06-01T00:00:00Z'),
+                     repository(3, 'Three', stars=30, releases=2, primary_language='python', dirs=['tests'],
+                                created_at='2020-01-03T10:00:00Z', pushed_at='2020-09-01T00:00:00Z')):
+            self.store.write(repo)
+        self.store.flush()
+
+    def tearDown(self):
+        self.store.close()
+        self.folder.cleanup()
+
+    def ids(self, **filters) -> list:
+        return [repo['id'] for repo in self.store.query(**filters)]
+
+    def test_filters(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.ids(), [1, 3, 2])
+        self.assertEqual(self.ids(primary_language='Python'), [1, 3])
+        self.assertEqual(self.ids(min_stars=30), [1, 3])
+        self.assertEqual(self.ids(min_releases=1), [3])
+        self.assertEqual(self.ids(created_since='2020-01-02'), [3, 2])
+        self.assertEqual(self.ids(created_until='2020-01-02'), [1, 2])
+        self.assertEqual(self.ids(pushed_after='2020-05-01'), [3, 2])
+        self.assertEqual(self.ids(dirs=['src']), [1, 2])
+        self.assertEqual(self.ids(dirs=['src', 'tests']), [1])
+        self.assertEqual(self.ids(primary_language='python', dirs=['tests'], min_stars=40), [1])
+
+    def test_order_and_limit(self):
+        self.assertEqual(self.ids(order_by='created_at'), [3, 2, 1])
+        self.assertEqual(self.ids(order_by='id', limit=2), [3, 2])
+
+        with self.assertRaises(ValueError):
+            self.ids(order_by='stars; DROP TABLE repositories')
+
+    def test_repositories_are_replaced_by_id(self):
+        self.store.write(repository(1, 'Renamed', stars=5, dirs=['docs']))
+        self.store.flush()
+
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.ids(dirs=['tests']), [3])
+        self.assertEqual(self.ids(dirs=['docs']), [1])
+        self.assertEqual(self.ids(text='one'), [])
+        self.assertEqual(self.ids(text='renamed'), [1])
+
+    def test_records_are_returned(self):
+        repo = next(self.store.query(min_stars=50))
+
+        self.assertEqual((repo['full_name'], repo['dirs']), ('owner/repo1', ('src', 'tests')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+from repocollector import dataset
+from repocollector.records import Repository
+from repocollector.store import RepositoryStore
+from repocollector.writers import WRITERS, JSONLinesWriter
+
+REPOSITORIES = [
+    dict(id=1, default_branch='main', owner='owner', name='repo1', full_name='owner/repo1',
+         url='https://github.com/owner/repo1', description='A "quoted", multi-line\ndescription; with ümlauts',
+         issues=1, releases=2, stars=3, watchers=4, primary_language='python', created_at='2020-01-01T00:00:00Z',
+         pushed_at='2020-06-01T00:00:00Z', dirs=['src', 'tests']),
+    dict(id=2, default_branch='master', owner='owner', name='repo2', full_name='owner/repo2',
+         url='https://github.com/owner/repo2', description='', issues=0, releases=0, stars=0, watchers=0,
+         primary_language=None, created_at='2020-01-02T00:00:00Z', pushed_at='2020-06-02T00:00:00Z', dirs=[]),
+]
+
+
+def normalized(repositories) -> list:
+    return [{field: list(value) if field == 'dirs' else value for field, value in dict(repository).items()}
+            for repository in repositories]
+
+
+class RoundTripTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def round_trip(self, fmt: str, repositories: list) -> list:
+        path = os.path.join(tempfile.mkdtemp(dir=self.folder.name), f'repositories.{fmt}')
+
+        with (RepositoryStore(path) if fmt == 'sqlite' else WRITERS[fmt](path, batch_size=1)) as writer:
+            for repository in repositories:
+                writer.write(repository)
+
+        # The store is read by id, descending
+        return sorted(normalized(dataset.read(path)), key=lambda repository: repository['id'])
+
+    def test_round_trips(self):
+        formats = ['json', 'jsonl', 'csv', 'sqlite']
+        if importlib.util.find_spec('pyarrow'):
+            formats.append('parquet')
+
+        for fmt in formats:
+            with self.subTest(format=fmt):
+                self.assertEqual(self.round_trip(fmt, REPOSITORIES), REPOSITORIES)
+
+            with self.subTest(format=fmt, records=True):
+                records = [Repository(**repository) for repository in REPOSITORIES]
+                self.assertEqual(self.round_trip(fmt, records), REPOSITORIES)
+
+            with self.subTest(format=fmt, empty=True):
+                self.assertEqual(self.round_trip(fmt, []), [])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            dataset.read(os.path.join(self.folder.name, 'repositories.xml'))
+
+    def test_appended_lines_and_truncated_last_line(self):
+        path = os.path.join(self.folder.name, 'worker.jsonl')
+
+        with JSONLinesWriter(path) as writer:
+            writer.write(REPOSITORIES[0])
+
+        with JSONLinesWriter(path, append=True) as writer:
+            writer.write(REPOSITORIES[1])
+
+        with open(path, 'a') as f:
+            f.write('{"id": 3, "default_br')
+
+        self.assertEqual(normalized(dataset.read(path)), REPOSITORIES)
+
+
+if __name__ == '__main__':
+    unittest.main()